@@ -0,0 +1,248 @@
+#############################################################################################################
+# File:        ltebench.py
+# Description: Benchmark ltemodem.py against the ltesim.py fake modem, machine readable result
+#              ----------------------------------------------------------------------------------------------
+# Notes      : Measured for each network option method (qmicli and QUECTOPT):
+#              ----------------------------------------------------------------------------------------------
+#              connect    - Cold boot time to connect, from the daemon start until the MONITOR state, and the
+#                           time to connect reported by the daemon itself
+#              idle       - Steady state network monitoring cost over the measurement window, scaled per hour:
+#                           forks (external commands from the daemon metrics), CPU seconds (daemon and its
+#                           children from /proc) and ICMP probes sent
+#              recover    - Outage to recovery time for each failure pattern, from the fault injection until
+#                           the daemon report RECOVERED, and the recovery rung that brought the network back
+#              ----------------------------------------------------------------------------------------------
+#              Failure patterns:
+#              ----------------------------------------------------------------------------------------------
+#              bearer-drop - Bearer lost with WDS packet service status indication
+#              dhcp-loss   - wwan0 address flushed while the DHCP server not answering for holdTime
+#              hung-qmicli - Bearer lost while WDS start network (qmi-network start for QUECTOPT) hung for
+#                            holdTime
+#              ----------------------------------------------------------------------------------------------
+# Usage  : python ltebench.py [OUT=ltebench.json] [WINDOW=120] [ROUNDS=3] [BACKEND=qmicli,quectopt] [RUNDIR=path]
+#          Root and iproute2 needed, see ltesim.py
+#
+# Author : Ahmad Bahari Nizam B. Abu Bakar.
+#
+# Version: 1.0.1
+#
+# Date   : 18/10/2026 (INITIAL RELEASE DATE)
+#############################################################################################################
+
+import os, sys, time
+import thread
+import threading
+import platform
+import signal
+import socket
+import json
+import subprocess
+import ltesim
+
+# Global variable declaration
+benchOut           = 'ltebench.json' # Machine readable result
+benchWindow        = 120.0    # Steady state measurement window in sec
+benchRounds        = 3        # Recovery samples per failure pattern
+benchBackends      = ['qmicli', 'quectopt'] # Network option methods to benchmark
+backendMacros      = {'qmicli'   : [],      # ltemodem.py macros per network option method
+                      'quectopt' : ['QUECTOPT']}
+forkCmds           = ['qmi-network', 'other'] # Metrics commands run as process
+connectTimeOut     = 120.0    # Cold boot connect timeout in sec
+recoverTimeOut     = 180.0    # Outage to recovery timeout in sec
+quietTime          = 5.0      # No state change for this long before the next measurement in sec
+holdTime           = 10.0     # Fault kept for this long before cleared in sec
+hungCmds           = {'qmicli'   : 'qmi wds 0x0020', # Start network request hung per network option method
+                      'quectopt' : 'qmi-network start'}
+clockTicks         = os.sysconf('SC_CLK_TCK')
+
+# Check for macro arguments
+if (len(sys.argv) > 1):
+    for x in sys.argv:
+        # Optional macro to override result file, e.g. OUT=/tmp/ltebench.json
+        if x.startswith("OUT="):
+            benchOut = x[len("OUT="):]
+        # Optional macro to override steady state window in sec, e.g. WINDOW=600
+        elif x.startswith("WINDOW="):
+            benchWindow = float(x[len("WINDOW="):])
+        # Optional macro to override recovery samples per failure pattern, e.g. ROUNDS=5
+        elif x.startswith("ROUNDS="):
+            benchRounds = int(x[len("ROUNDS="):])
+        # Optional macro to select network option methods, e.g. BACKEND=qmicli
+        elif x.startswith("BACKEND="):
+            benchBackends = [a for a in x[len("BACKEND="):].split(',') if a in backendMacros]
+
+# Daemon under test, its log lines timestamped on arrival
+class DaemonRun(object):
+    def __init__(self, runDir, macros):
+        self.runDir = runDir
+        self.cond = threading.Condition()
+        self.lines = []             # [(timestamp, log line)]
+        self.lastState = time.time() # Last state transition timestamp
+        self.startTime = time.time()
+        self.proc = ltesim.simDaemon(runDir, macros, subprocess.PIPE)
+        self.log = open(os.path.join(runDir, 'daemon.log'), 'w')
+        thread.start_new_thread(self.reader, ("[daemonReader]",))
+
+    # Daemon output reader thread
+    def reader(self, threadname):
+        for line in iter(self.proc.stdout.readline, ''):
+            now = time.time()
+            self.log.write('%.3f %s' % (now, line))
+            with self.cond:
+                self.lines.append((now, line.rstrip('\n')))
+                if ' STATE ' in line:
+                    self.lastState = now
+                self.cond.notifyAll()
+        self.log.close()
+
+    # Wait for the log line containing the text after the start timestamp, return (timestamp, line) or None
+    def waitLine(self, text, startTime, timeOut):
+        deadline = time.time() + timeOut
+        with self.cond:
+            while True:
+                for ts,line in self.lines:
+                    if ts >= startTime and text in line:
+                        return ts,line
+                remain = deadline - time.time()
+                if remain <= 0 or self.proc.poll() != None:
+                    return None
+                self.cond.wait(min(remain, 1.0))
+
+    # Wait until no state transition for quietTime, return False on timeout
+    def waitQuiet(self, timeOut):
+        deadline = time.time() + timeOut
+        while time.time() < deadline:
+            if time.time() - self.lastState >= quietTime:
+                return True
+            time.sleep(0.2)
+        return False
+
+    # Daemon and its children CPU time in sec
+    def cpuTime(self):
+        fields = open('/proc/%d/stat' % self.proc.pid).read().rsplit(')', 1)[1].split()
+        return float(sum([int(a) for a in fields[11:15]])) / clockTicks
+
+    # Scrape the daemon metrics exporter, return {metric line name: value}
+    def metrics(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(5.0)
+        data = ''
+        try:
+            sock.connect(os.path.join(self.runDir, 'metrics.sock'))
+            while True:
+                chunk = sock.recv(65536)
+                if chunk == '':
+                    break
+                data += chunk
+        finally:
+            sock.close()
+        return dict([a.rsplit(' ', 1) for a in data.split('\n') if a != '' and not a.startswith('#')])
+
+    # External commands run by the daemon so far
+    def forkCnt(self, metrics):
+        return sum([int(metrics['ltemodem_command_duration_seconds_count{command="%s"}' % a]) for a in forkCmds])
+
+    def stop(self):
+        if self.proc.poll() == None:
+            self.proc.send_signal(signal.SIGTERM)
+            self.proc.wait()
+
+# Median of the samples, None when no sample
+def median(samples):
+    samples = sorted([a for a in samples if a != None])
+    if not samples:
+        return None
+    return samples[len(samples) / 2]
+
+# Cold boot time to connect
+def benchConnect(daemon):
+    found = daemon.waitLine('-> MONITOR', daemon.startTime, connectTimeOut)
+    reported = daemon.waitLine('Time to connect', daemon.startTime, 0)
+    result = {'wall': None, 'reported': None}
+    if found != None:
+        result['wall'] = round(found[0] - daemon.startTime, 3)
+    if reported != None:
+        result['reported'] = float(reported[1].split('Time to connect ')[1].split()[0])
+    return result
+
+# Steady state monitoring cost over the window, scaled per hour
+def benchIdle(daemon):
+    daemon.waitQuiet(recoverTimeOut)
+    startMetrics = daemon.metrics()
+    startCpu = daemon.cpuTime()
+    startTime = time.time()
+    time.sleep(benchWindow)
+    cpu = daemon.cpuTime() - startCpu
+    endMetrics = daemon.metrics()
+    scale = 3600.0 / (time.time() - startTime)
+    probes = int(endMetrics['ltemodem_probe_sent_total']) - int(startMetrics['ltemodem_probe_sent_total'])
+    return {'window': round(time.time() - startTime, 3),
+            'forksPerHour': round((daemon.forkCnt(endMetrics) - daemon.forkCnt(startMetrics)) * scale, 1),
+            'cpuPerHour': round(cpu * scale, 3),
+            'probesPerHour': round(probes * scale, 1)}
+
+# Inject the failure pattern, return the fault clear function
+def injectFault(runDir, backend, pattern):
+    if pattern == 'bearer-drop':
+        ltesim.simFault(runDir, {'bearer': 'drop'})
+        return None
+    if pattern == 'dhcp-loss':
+        ltesim.simFault(runDir, {'dhcp': 'drop'})
+        ltesim.simCommand(['ip', 'netns', 'exec', ltesim.simNs, 'ip', 'addr', 'flush', 'dev', 'wwan0'])
+        return lambda: ltesim.simFault(runDir, {'dhcp': 'ok'})
+    # Hang first, so the bearer restart after the drop is the one that hang
+    ltesim.simFault(runDir, {'hang': {hungCmds[backend]: True}})
+    ltesim.simFault(runDir, {'bearer': 'drop'})
+    return lambda: ltesim.simFault(runDir, {'hang': {}})
+
+# Outage to recovery time for the failure pattern, benchRounds samples
+def benchRecover(daemon, backend, pattern):
+    samples = []
+    rungs = []
+    for i in range(benchRounds):
+        daemon.waitQuiet(recoverTimeOut)
+        startTime = time.time()
+        clear = injectFault(daemon.runDir, backend, pattern)
+        if clear != None:
+            time.sleep(holdTime)
+            clear()
+        found = daemon.waitLine('RECOVERED by rung', startTime, recoverTimeOut)
+        if found == None:
+            samples.append(None)
+            rungs.append(None)
+            continue
+        samples.append(round(found[0] - startTime, 3))
+        rungs.append(found[1].split('(')[1].split(')')[0])
+    return {'samples': samples, 'median': median(samples), 'max': max([a for a in samples if a != None] or [None]), \
+            'rungs': rungs}
+
+# Run every measurement for one network option method against a fresh fake modem
+def benchBackend(runDir, backend):
+    ltesim.simDown(runDir)
+    ltesim.simUp(runDir)
+    daemon = DaemonRun(runDir, backendMacros[backend])
+    try:
+        result = {'connect': benchConnect(daemon)}
+        result['idle'] = benchIdle(daemon)
+        result['recover'] = {}
+        for pattern in ['bearer-drop', 'dhcp-loss', 'hung-qmicli']:
+            result['recover'][pattern] = benchRecover(daemon, backend, pattern)
+        result['watchdogKills'] = int(daemon.metrics()['ltemodem_watchdog_kills_total'])
+    finally:
+        daemon.stop()
+        ltesim.simDown(runDir)
+    return result
+
+if __name__ == "__main__":
+    report = {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'host': platform.node(), 'kernel': platform.release(), \
+              'python': platform.python_version(), 'window': benchWindow, 'rounds': benchRounds, 'backends': {}}
+    for backend in benchBackends:
+        report['backends'][backend] = benchBackend(ltesim.simRunDir, backend)
+        result = report['backends'][backend]
+        print "%s: connect %s sec, idle %s forks/h %s CPU sec/h, recover %s" % (backend, result['connect']['wall'], \
+              result['idle']['forksPerHour'], result['idle']['cpuPerHour'], \
+              ', '.join(['%s %s sec' % (a, b['median']) for a,b in sorted(result['recover'].items())]))
+
+    with open(benchOut, 'w') as f:
+        json.dump(report, f, indent=1, sort_keys=True)
+        f.write('\n')
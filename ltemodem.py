@@ -33,6 +33,58 @@
 #              0010     - Improve a script logics on the QUECTOPT 4G LTE modem start and restart network process.
 #              0011     - Improve a script logics on the QUECTOPT 4G LTE modem error handling on each start and
 #                         restart modem process.
+#              0012     - Replace ps aux polling inside qmicli command timeout thread with per command deadline
+#                         watchdog. Each external command process group will be killed once its own deadline
+#                         passed.
+#              0013     - Replace ping command with native ICMP echo prober bound to wwan0, report RTT and loss.
+#              0014     - Probe multiple targets concurrently on each cycle, 4G network declared down only when
+#                         the failed targets reach the quorum.
+#              0015     - Listen to rtnetlink wwan0 link and address events, initiate restart process immediately
+#                         on link loss. The 1 sec loop remain as a fallback.
+#              0016     - Listen to QMI WDS packet service status indication through qmi-proxy, initiate restart
+#                         process immediately once the bearer disconnected.
+#              0017     - Replace qmicli commands with in-process QMI client over one persistent QMI channel.
+#              0018     - Allocate one QMI client per DMS/NAS/WDS service at startup, reuse and persist it across
+#                         daemon restart. Reuse the running bearer packet data handle on PolicyMismatch.
+#              0019     - Replace fixed 1 sec delay between bring-up steps with bounded readiness wait, measure and
+#                         report time to connect.
+#              0020     - Start 4G LTE modem process sequence as soon as the modem arrived (kernel uevent), the 1
+#                         minute boot up delay remain as an upper bound.
+#              0021     - Stream external command output, return on the first success or failure output line
+#                         instead of waiting for the command to exit.
+#              0022     - Replace the boot, monitor and restart nested process sequence with a table driven state
+#                         machine shared by both network option methods. Each state has its own timeout and retry
+#                         policy, every transition timestamped.
+#              0023     - Recover the 4G network with an escalation ladder, cheapest action first: DHCP renew,
+#                         WDS stop/start, operating mode low power/online, modem reset, USB/PCIe rebind. Mean time
+#                         to recover tracked per rung.
+#              0024     - Adaptive probe cadence, relaxed while the 4G network stable and tightened on loss or RTT
+#                         degradation. Restart attempts back off exponentially with jitter. Status output with
+#                         every knob written on SIGUSR1.
+#              0025     - Passive 4G network health check from wwan0 traffic counters, active probe only sent when
+#                         wwan0 received nothing since the last check.
+#              0026     - Replace udhcpc with built-in DHCP client, lease kept on disk and the cached address
+#                         requested directly on reconnect. Fix the hard-coded public IP address lease check.
+#              0027     - Renew wwan0 DHCP lease from T1, rebind from T2, lease events recorded in the state
+#                         transition history. Expired lease obtained again without restarting the 4G network.
+#              0028     - Adopt the live 4G network session at startup when the bearer up, wwan0 configured and
+#                         the probe targets reachable. Replace the ltemodem.log existence boot up check.
+#              0029     - One compact session state file (QMI client IDs, packet data handle, DHCP lease, last good
+#                         RTT, recovery counters) written atomically, replace the separate CID and lease files.
+#              0030     - Non-blocking logging through a queue and log listener thread, identical consecutive
+#                         messages summarized, per module log level (LOGLEVEL macro).
+#              0031     - Prometheus text metrics exporter (HTTP or unix socket, METRICS macro): time to connect,
+#                         reconnect by cause, probe RTT and loss, command duration, watchdog kills, current state.
+#              0032     - Trace every external command, QMI request and DHCP exchange as a span in a bounded ring
+#                         buffer, dumped as JSON lines on SIGUSR2 or HTTP GET /spans.
+#              0033     - QMIDEV, QMIPROXY and RUNDIR macros, so the script can run against the ltesim.py fake
+#                         modem simulator.
+#              0034     - Configure wwan0 link state, address and default route in process through rtnetlink,
+#                         each operation sent as one batch, instead of forking ifconfig and route. Address
+#                         removed by the script itself no longer reported as wwan0 link loss.
+#              0035     - wwan0 sysfs attribute layer: qmi/raw_ip written directly and verified by reading it
+#                         back (the echo command never wrote it), operstate, carrier and statistics counters read
+#                         through file descriptors kept open. Raw IP step skipped when wwan0 has no qmi attributes.
 #
 #              ----------------------------------------------------------------------------------------------
 # Author : Ahmad Bahari Nizam B. Abu Bakar.
@@ -40,1127 +92,3020 @@
 # Version: 1.0.1
 # Version: 1.0.2 - Add feature item [0008,0009]
 # Version: 1.0.3 - Add feature item [0010,0011]
+# Version: 1.0.4 - Add feature item [0012]
+# Version: 1.0.5 - Add feature item [0013]
+# Version: 1.0.6 - Add feature item [0014]
+# Version: 1.0.7 - Add feature item [0015]
+# Version: 1.0.8 - Add feature item [0016]
+# Version: 1.0.9 - Add feature item [0017]
+# Version: 1.0.10 - Add feature item [0018]
+# Version: 1.0.11 - Add feature item [0019]
+# Version: 1.0.12 - Add feature item [0020]
+# Version: 1.0.13 - Add feature item [0021]
+# Version: 1.0.14 - Add feature item [0022]
+# Version: 1.0.15 - Add feature item [0023]
+# Version: 1.0.16 - Add feature item [0024]
+# Version: 1.0.17 - Add feature item [0025]
+# Version: 1.0.18 - Add feature item [0026]
+# Version: 1.0.19 - Add feature item [0027]
+# Version: 1.0.20 - Add feature item [0028]
+# Version: 1.0.21 - Add feature item [0029]
+# Version: 1.0.22 - Add feature item [0030]
+# Version: 1.0.23 - Add feature item [0031]
+# Version: 1.0.24 - Add feature item [0032]
+# Version: 1.0.25 - Add feature item [0033]
+# Version: 1.0.26 - Add feature item [0034]
+# Version: 1.0.27 - Add feature item [0035]
 #
 # Date   : 06/02/2020 (INITIAL RELEASE DATE)
 #          UPDATED - 08/07/2022 - 1.0.2
 #          UPDATED - 22/09/2022 - 1.0.3
+#          UPDATED - 18/10/2026 - 1.0.4
+#          UPDATED - 18/10/2026 - 1.0.5
+#          UPDATED - 18/10/2026 - 1.0.6
+#          UPDATED - 18/10/2026 - 1.0.7
+#          UPDATED - 18/10/2026 - 1.0.8
+#          UPDATED - 18/10/2026 - 1.0.9
+#          UPDATED - 18/10/2026 - 1.0.10
+#          UPDATED - 18/10/2026 - 1.0.11
+#          UPDATED - 18/10/2026 - 1.0.12
+#          UPDATED - 18/10/2026 - 1.0.13
+#          UPDATED - 18/10/2026 - 1.0.14
+#          UPDATED - 18/10/2026 - 1.0.15
+#          UPDATED - 18/10/2026 - 1.0.16
+#          UPDATED - 18/10/2026 - 1.0.17
+#          UPDATED - 18/10/2026 - 1.0.18
+#          UPDATED - 18/10/2026 - 1.0.19
+#          UPDATED - 18/10/2026 - 1.0.20
+#          UPDATED - 18/10/2026 - 1.0.21
+#          UPDATED - 18/10/2026 - 1.0.22
+#          UPDATED - 18/10/2026 - 1.0.23
+#          UPDATED - 18/10/2026 - 1.0.24
+#          UPDATED - 18/10/2026 - 1.0.25
+#          UPDATED - 18/10/2026 - 1.0.26
+#          UPDATED - 18/10/2026 - 1.0.27
 #
 #############################################################################################################
 
 import os, re, sys, time
+import errno
 import thread
+import select
+import signal
+import socket
+import struct
+import threading
+import fcntl
+import json
 import logging
 import logging.handlers
 import subprocess
+import Queue
+import bisect
+import collections
+import random
+import ctypes
 
 # Global variable declaration
 backLogger         = False    # Macro for logger
-qmcliTimeOut       = False    # qmicli command timeout flag 
+logLevels          = {'' : 'INFO'} # Log level per module (4g, qmi, cmd), '' for all modules
+logQueueSize       = 1000     # Log records waiting to be written, dropped when full
+logDupFlush        = 300.0    # Identical consecutive messages summarized at least every this sec
+metricsAddr        = '127.0.0.1:9120' # Metrics exporter, TCP host:port (HTTP) or unix socket path, '' disabled
+metricsTimeOut     = 2.0      # Metrics scrape socket timeout in sec
+metricsRetryDelay  = 10.0     # Delay before reopen the metrics exporter socket in sec
+metricsCmds        = ['qmi-network', 'qmi', 'netlink', 'dhcp', 'dhcp-renew', 'other']
+metricsCauses      = ['probe', 'link', 'lease', 'raw_ip', 'link_up', 'register', 'dhcp', 'other'] # Reconnect causes
+spanBufLen         = 512      # Tracing spans kept in memory
+spanPath           = '/tmp/ltemodem.spans' # Tracing spans dump as JSON lines, written on SIGUSR2
+spanReq            = False    # Tracing spans dump requested
 lteModemStat       = False    # 4G LTE modem connection status flag
-machineBoot        = False    # machine boot status flag, to identified the machine has reboot or not
-restart4gModem     = False    # Restart 4G connection flag
 startSys           = False    # Start 4G LTE modem process sequence flag
 quectelOpt         = False    # Option to used quectel daemon
 pingAttempt        = 0        # 4G network ping process attempt counter
-cmdTimeOutCnt      = 0        # qmicli command timeout counter
-startSysCnt        = 0        # Delay counter before start 4G LTE modem process sequence
-publicIpAddr       = '183.171.147.229' # 4G M2M public IP address
-
-# Check for macro arguments
-if (len(sys.argv) > 1):
-    for x in sys.argv:
-        # Optional macro if we want to enable text file log
-        if x == "LOGGER":
-            backLogger = True
-        elif x == "QUECTOPT":
-            quectelOpt = True
-
-# Check for ltemodem.log existense, if its empty for sure the machine are previously booting up or shutdown
-tempData = os.listdir('/tmp')
-
-# Go through the resulted data
-for files in tempData:
-    if 'ltemodem.log' in tempData:
-        machineBoot = False
-        break
-    # Machine are previously booting up or shutdown
-    else:
-        machineBoot = True
-
-# Setup log file 
-if backLogger == True:
-    path = os.path.dirname(os.path.abspath(__file__))
-    logger = logging.getLogger()
-    logger.setLevel(logging.INFO)
-    logfile = logging.handlers.TimedRotatingFileHandler('/tmp/ltemodem.log', when="midnight", backupCount=3)
-    formatter = logging.Formatter('%(asctime)s %(levelname)-8s %(message)s')
-    logfile.setFormatter(formatter)
-    logger.addHandler(logfile)
-
-# Doing string manipulations
-def mid(s, offset, amount):
-    return s[offset-1:offset+amount-1]
-
-# Thread to check qmcli command time out
-def commandTimeOut (threadname, delay):
+startSysDelay      = 60       # Upper bound delay before start 4G LTE modem process sequence in sec
+defCmdDeadline     = 30.0     # Default external command deadline in sec
+cmdDeadline        = {'qmi-network' : 30.0}     # Per command deadline in sec, based on the executable name
+qmiNetStartOk      = ['Network started successfully'] # qmi-network start output patterns
+qmiNetStartFail    = ['error:']
+qmiNetStopOk       = ['Network stopped successfully'] # qmi-network stop output patterns
+pingTargets        = ['8.8.8.8', '1.1.1.1', '9.9.9.9'] # 4G network ICMP probe targets, probed concurrently
+probeQuorum        = 0        # Failed probe targets needed to declare 4G network down, 0 - majority of the targets
+probeTimeOut       = 1.0      # ICMP echo reply timeout in sec
+probeMinInterval   = 1.0      # Probe interval when the 4G network degraded or failing in sec
+probeMaxInterval   = 30.0     # Probe interval upper bound when the 4G network stable in sec
+probeRelax         = 1.5      # Probe interval growth factor on each clean probe
+probeRttDegrade    = 2.0      # RTT above this factor of the RTT average considered degraded
+probeFailLimit     = 10       # Consecutive failed probes before the 4G network declared down
+backoffBase        = 2.0      # First restart backoff delay in sec, doubled on each restart attempt
+backoffMax         = 300.0    # Restart backoff delay upper bound in sec
+backoffJitter      = 0.5      # Restart backoff random jitter, fraction of the delay
+statusPath         = '/tmp/ltemodem.status' # Daemon status output, written on SIGUSR1
+statusReq          = False    # Status output requested
+bootIdPath         = '/proc/sys/kernel/random/boot_id' # Changed on every boot, tell whether the lease obtained since
+lteIfName          = 'wwan0'  # 4G LTE modem network interface
+lteRouteMetric     = 700      # wwan0 default route metric, own route replaced, other uplinks default routes kept
+SO_BINDTODEVICE    = 25       # Linux socket option, not exported by python socket module
+
+# Linux rtnetlink constants
+NETLINK_ROUTE      = 0
+RTMGRP_LINK        = 0x01
+RTMGRP_IPV4_IFADDR = 0x10
+NLMSG_ERROR        = 2
+NLMSG_DONE         = 3
+NLM_F_REQUEST      = 0x001
+NLM_F_ACK          = 0x004
+NLM_F_REPLACE      = 0x100
+NLM_F_CREATE       = 0x400
+NLM_F_DUMP         = 0x300
+RTM_NEWLINK        = 16
+RTM_DELLINK        = 17
+RTM_NEWADDR        = 20
+RTM_DELADDR        = 21
+RTM_GETADDR        = 22
+RTM_NEWROUTE       = 24
+IFLA_IFNAME        = 3
+IFA_ADDRESS        = 1
+IFA_LOCAL          = 2
+IFA_LABEL          = 3
+IFA_BROADCAST      = 4
+RTA_OIF            = 4
+RTA_GATEWAY        = 5
+RTA_PRIORITY       = 6
+RT_TABLE_MAIN      = 254
+RTPROT_BOOT        = 3
+RT_SCOPE_UNIVERSE  = 0
+RTN_UNICAST        = 1
+NETLINK_KOBJECT_UEVENT = 15
+IFF_UP             = 0x1
+IFF_LOWER_UP       = 0x10000
+CLOCK_MONOTONIC    = 1
+
+# QMI (Qualcomm MSM Interface) constants
+qmiDevPath         = '/dev/cdc-wdm0'  # 4G LTE modem QMI control device
+qmiProxyPath       = '\0qmi-proxy'    # libqmi qmi-proxy abstract unix socket
+QMI_SVC_CTL        = 0x00
+QMI_SVC_WDS        = 0x01
+QMI_SVC_DMS        = 0x02
+QMI_SVC_NAS        = 0x03
+qmiSvcNames        = {QMI_SVC_CTL : 'ctl', QMI_SVC_WDS : 'wds', QMI_SVC_DMS : 'dms', QMI_SVC_NAS : 'nas'}
+QMI_MSG_REQUEST    = 0        # Normalized QMI message type
+QMI_MSG_RESPONSE   = 1
+QMI_MSG_INDICATION = 2
+QMI_CTL_ALLOCATE_CID  = 0x0022
+QMI_CTL_RELEASE_CID   = 0x0023
+QMI_CTL_SET_DATA_FORMAT = 0x0026
+QMI_CTL_PROXY_OPEN    = 0xFF00
+QMI_DMS_GET_OPERATING_MODE = 0x002D
+QMI_DMS_SET_OPERATING_MODE = 0x002E
+QMI_DMS_MODE_ONLINE   = 0
+QMI_DMS_MODE_LOW_POWER = 1
+QMI_DMS_MODE_RESET    = 4
+QMI_WDS_START_NETWORK = 0x0020
+QMI_WDS_STOP_NETWORK  = 0x0021
+QMI_WDS_PKT_SRVC_STATUS = 0x0022
+QMI_WDS_DISCONNECTED  = 1
+QMI_WDS_CONNECTED     = 2
+QMI_TLV_RESULT        = 0x02
+QMI_ERR_INVALID_CLIENT_ID = 7   # Client ID no longer valid, e.g. modem reset since it was allocated
+QMI_ERR_NO_EFFECT     = 26      # Bearer already started by this client
+QMI_ERR_POLICY_MISMATCH = 79    # Bearer already started by another client
+qmiErrConnected    = (QMI_ERR_NO_EFFECT, QMI_ERR_POLICY_MISMATCH) # WDS start network errors meaning the bearer is up
+statePath          = '/tmp/ltemodem.state' # Session state kept across daemon restart, QMI client IDs, lease, RTT...
+qmiRetryDelay      = 1.0      # Delay before reopen the QMI channel in sec
+SIOCGIFADDR        = 0x8915   # Linux ioctl to get interface IPv4 address
+SIOCGIFFLAGS       = 0x8913   # Linux ioctl to get interface flags
+readyTimeOut       = 5.0      # Upper bound waiting for each bring-up step readiness in sec
+netlinkTimeOut     = 2.0      # rtnetlink request acknowledgement timeout in sec
+netlinkRetryDelay  = 1.0      # Delay before reopen the rtnetlink listener socket in sec
+adoptTimeOut       = 2.0      # WDS packet service status timeout when adopting the live session at startup in sec
+connectStart       = None     # Bring-up start timestamp, None when not connecting
+lastConnectTime    = None     # Last measured time to connect in sec
+connectSeq         = 0        # Bring-up sequence number, tag the tracing spans of each bring-up
+apnName            = 'celcom3g' # 4G M2M APN settings
+apnUser            = ' '
+apnPass            = ' '
+dhcpTimeOut        = 20.0     # DHCP DISCOVER and REQUEST timeout in sec
+dhcpRebootTimeOut  = 3.0      # Direct REQUEST of the cached address timeout in sec
+dhcpRetransmit     = 1.0      # First DHCP retransmit interval in sec, doubled on each retransmit
+dhcpDefLease       = 3600     # Lease time when the server does not give any in sec
+dhcpRenewMin       = 60.0     # Minimum delay between lease renewal attempts in sec
+resolvPath         = '/etc/resolv.conf' # DNS servers from the DHCP lease
+
+# DHCP constants
+ETH_P_IP           = 0x0800
+DHCP_MAGIC         = 0x63825363
+DHCP_DISCOVER      = 1
+DHCP_OFFER         = 2
+DHCP_REQUEST       = 3
+DHCP_ACK           = 5
+DHCP_NAK           = 6
+
+# 4G LTE modem lifecycle states
+ST_WAIT_DEVICE     = 'WAIT_DEVICE'
+ST_SET_RAW_IP      = 'SET_RAW_IP'
+ST_LINK_UP         = 'LINK_UP'
+ST_REGISTER        = 'REGISTER'
+ST_DHCP            = 'DHCP'
+ST_MONITOR         = 'MONITOR'
+ST_RECOVER         = 'RECOVER'
+ST_TEARDOWN        = 'TEARDOWN'
+lteStates          = [ST_WAIT_DEVICE, ST_SET_RAW_IP, ST_LINK_UP, ST_REGISTER, ST_DHCP, ST_MONITOR, ST_RECOVER, ST_TEARDOWN]
+# State transition table
+# State : (timeout in sec - None no limit, retries, next state on success, next state on failure)
+lteStateTable      = {ST_WAIT_DEVICE : (None, 0, ST_SET_RAW_IP, ST_WAIT_DEVICE),
+                      ST_SET_RAW_IP  : (15.0, 2, ST_LINK_UP,    ST_RECOVER),
+                      ST_LINK_UP     : (15.0, 2, ST_REGISTER,   ST_RECOVER),
+                      ST_REGISTER    : (90.0, 4, ST_DHCP,       ST_RECOVER),
+                      ST_DHCP        : (90.0, 2, ST_MONITOR,    ST_RECOVER),
+                      ST_MONITOR     : (None, 0, ST_MONITOR,    ST_RECOVER),
+                      ST_RECOVER     : (None, 0, ST_MONITOR,    ST_TEARDOWN),
+                      ST_TEARDOWN    : (60.0, 2, ST_WAIT_DEVICE, ST_WAIT_DEVICE)}
+# Cheapest recovery rung worth trying for the failed state
+# 1 - DHCP renew, 2 - WDS stop/start, 3 - operating mode low power/online, 4 - modem reset, 5 - USB/PCIe rebind
+recoverMinRung     = {ST_MONITOR     : 1,
+                      ST_DHCP        : 2,
+                      ST_REGISTER    : 3,
+                      ST_LINK_UP     : 4,
+                      ST_SET_RAW_IP  : 4}
+recoverVerify      = 3        # Failed probe cycles before escalating to the next recovery rung
+stateHistLen       = 32       # State transition history kept in memory
+
+# Check for macro arguments, only when run as the daemon, importing the module never read the command line
+def parseMacros(argv):
     global backLogger
-    global qmcliTimeOut
-    global cmdTimeOutCnt
-    global startSysCnt
-    global startSys
-    
-    # Thread loop
+    global quectelOpt
+    global pingTargets
+    global metricsAddr
+    global probeQuorum
+    global qmiDevPath
+    global qmiProxyPath
+    global statePath
+    global statusPath
+    global spanPath
+
+    if (len(argv) > 1):
+        for x in argv:
+            # Optional macro if we want to enable text file log
+            if x == "LOGGER":
+                backLogger = True
+            elif x == "QUECTOPT":
+                quectelOpt = True
+            # Optional macro to override ICMP probe targets, e.g. PINGTARGET=8.8.8.8,1.1.1.1
+            elif x.startswith("PINGTARGET="):
+                pingTargets = [a for a in x[len("PINGTARGET="):].split(',') if a != '']
+                # Nothing to probe, the 4G network could never be checked
+                if not pingTargets:
+                    sys.exit("PINGTARGET= need at least one probe target")
+            # Optional macro to set log level, for all or per module, e.g. LOGLEVEL=WARNING,qmi:DEBUG
+            elif x.startswith("LOGLEVEL="):
+                for a in x[len("LOGLEVEL="):].split(','):
+                    if ':' in a:
+                        logLevels[a.split(':')[0]] = a.split(':')[1]
+                    elif a != '':
+                        logLevels[''] = a
+            # Optional macro to override metrics exporter address, e.g. METRICS=/tmp/ltemodem.sock, METRICS= disabled
+            elif x.startswith("METRICS="):
+                metricsAddr = x[len("METRICS="):]
+            # Optional macro to override failed targets quorum, e.g. QUORUM=2
+            elif x.startswith("QUORUM="):
+                probeQuorum = int(x[len("QUORUM="):])
+            # Optional macro to override QMI control device, e.g. QMIDEV=/dev/cdc-wdm1
+            elif x.startswith("QMIDEV="):
+                qmiDevPath = x[len("QMIDEV="):]
+            # Optional macro to override qmi-proxy socket, e.g. QMIPROXY=/tmp/ltesim/qmi-proxy (fake modem)
+            elif x.startswith("QMIPROXY="):
+                qmiProxyPath = x[len("QMIPROXY="):]
+            # Optional macro to move the state, status and tracing spans files, e.g. RUNDIR=/tmp/ltesim
+            elif x.startswith("RUNDIR="):
+                statePath = os.path.join(x[len("RUNDIR="):], 'ltemodem.state')
+                statusPath = os.path.join(x[len("RUNDIR="):], 'ltemodem.status')
+                spanPath = os.path.join(x[len("RUNDIR="):], 'ltemodem.spans')
+
+    # Default quorum is the majority of the probe targets
+    if probeQuorum <= 0 or probeQuorum > len(pingTargets):
+        probeQuorum = len(pingTargets) / 2 + 1
+
+# struct timespec for clock_gettime
+class Timespec(ctypes.Structure):
+    _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+# clock_gettime from the C library (librt before glibc 2.17), None when not found
+def loadClockGettime():
+    for name in (None, 'librt.so.1'):
+        try:
+            func = ctypes.CDLL(name, use_errno=True).clock_gettime
+        except (OSError, AttributeError):
+            continue
+        func.argtypes = [ctypes.c_int, ctypes.POINTER(Timespec)]
+        return func
+    return None
+
+clockGettime = loadClockGettime()
+
+# Monotonic clock in sec for every deadline and interval, time.monotonic only exist from Python 3.3
+# The gateway has no RTC and its wall clock set by NTP only after the 4G network connected, a wall clock
+# jump must not kill commands, time out states or stop the probes. time.time() only kept for the timestamps
+# written out (state file, status, spans, logs).
+def monotonicTime():
+    if clockGettime != None:
+        ts = Timespec()
+        if clockGettime(CLOCK_MONOTONIC, ctypes.byref(ts)) == 0:
+            return ts.tv_sec + ts.tv_nsec * 1e-9
+    with open('/proc/uptime') as f:
+        return float(f.read().split()[0])
+
+# Current boot ID, None when not available
+def bootId():
+    try:
+        with open(bootIdPath) as f:
+            return f.read().strip()
+    except IOError:
+        return None
+
+# Log record queue handler, the caller only enqueue the record and never wait for the log file or console
+# Record dropped (and counted) when the queue full instead of blocking the caller
+class QueueHandler(logging.Handler):
+    def __init__(self, queue):
+        logging.Handler.__init__(self)
+        self.queue = queue
+        self.dropCnt = 0
+
+    def emit(self, record):
+        # Merge the arguments now, the objects may change before the record written
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        try:
+            self.queue.put_nowait(record)
+        except Queue.Full:
+            self.dropCnt += 1
+
+# Log listener, write the queued records to the log file or console in its own thread
+# Identical consecutive messages written once, then summarized as "repeated N times" once a different message
+# arrive, or every dupFlush sec while the duplicates keep coming.
+class QueueListener(object):
+    def __init__(self, queue, handler, dupFlush):
+        self.queue = queue
+        self.handler = handler
+        self.dupFlush = dupFlush
+        self.lastKey = None     # (logger name, level, message) of the last written record
+        self.lastRecord = None
+        self.repeatCnt = 0      # Duplicates suppressed since the last summary
+        self.repeatTime = 0.0   # First suppressed duplicate timestamp
+        self.doneEvt = threading.Event()
+
+    # Write the summary of the suppressed duplicates
+    def flushRepeat(self):
+        if self.repeatCnt == 0:
+            return
+        summary = logging.makeLogRecord(self.lastRecord.__dict__)
+        summary.msg = '%s [repeated %d times]' % (self.lastRecord.msg, self.repeatCnt)
+        summary.created = time.time()
+        self.handler.handle(summary)
+        self.repeatCnt = 0
+
+    # Write one record, unless it is a duplicate of the last one
+    def handle(self, record):
+        key = (record.name, record.levelno, record.msg)
+        if key == self.lastKey:
+            if self.repeatCnt == 0:
+                self.repeatTime = monotonicTime()
+            self.repeatCnt += 1
+            if monotonicTime() - self.repeatTime >= self.dupFlush:
+                self.flushRepeat()
+            return
+
+        self.flushRepeat()
+        self.lastKey = key
+        self.lastRecord = record
+        self.handler.handle(record)
+
+    # Block on the queue without any periodic wake up, None record stop the listener
+    def run(self, threadname):
+        while True:
+            record = self.queue.get()
+            if record == None:
+                break
+            self.handle(record)
+        self.flushRepeat()
+        self.doneEvt.set()
+
+    # Write the records still queued then stop, on daemon exit
+    def stop(self, timeOut=1.0):
+        try:
+            self.queue.put(None, True, timeOut)
+        except Queue.Full:
+            return
+        self.doneEvt.wait(timeOut)
+
+# Setup logging, one logger per module under 'ltemodem'. The caller only queue the record, the console
+# or the log file (LOGGER macro, switched to by setup) written by the log listener thread.
+logTarget = logging.StreamHandler(sys.stdout)
+logTarget.setFormatter(logging.Formatter('%(message)s'))
+logQueue = Queue.Queue(logQueueSize)
+logHandler = QueueHandler(logQueue)
+logListener = QueueListener(logQueue, logTarget, logDupFlush)
+
+logMain = logging.getLogger('ltemodem')     # Daemon, thread errors
+logMain.addHandler(logHandler)
+logMain.propagate = False
+log4g = logging.getLogger('ltemodem.4g')    # 4G LTE modem process sequence and monitoring
+logQmi = logging.getLogger('ltemodem.qmi')  # QMI channel
+logCmd = logging.getLogger('ltemodem.cmd')  # External command watchdog
+
+# Session state file, one compact JSON object of sections (QMI client IDs and packet data handle, DHCP lease,
+# last good RTT, recovery counters). Read once at startup, written atomically (fsync then rename) on update.
+class StateFile(object):
+    def __init__(self, path):
+        self.path = path
+        self.lock = thread.allocate_lock()
+        self.data = {}
+
+    # Read the state from the previous daemon instance
+    def load(self):
+        try:
+            with open(self.path) as f:
+                self.data = json.load(f)
+        except (IOError, ValueError):
+            self.data = {}
+        if not isinstance(self.data, dict):
+            self.data = {}
+
+    # Section value, None when not exist
+    def get(self, section):
+        with self.lock:
+            return self.data.get(section)
+
+    # Update one section, written to disk right away unless flush False (e.g. RTT on every probe)
+    def update(self, section, value, flush=True):
+        with self.lock:
+            self.data[section] = value
+        if flush == True:
+            self.save()
+
+    # Write the whole state, the previous file stay intact until the new one fully on disk
+    def save(self):
+        with self.lock:
+            data = json.dumps(self.data, separators=(',', ':'), sort_keys=True)
+            try:
+                fd = os.open(self.path + '.tmp', os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0644)
+                try:
+                    os.write(fd, data)
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+                os.rename(self.path + '.tmp', self.path)
+
+                # Make the rename itself durable
+                fd = os.open(os.path.dirname(self.path) or '.', os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+                return True
+            except OSError:
+                return False
+
+# Session state instance
+stateFile = StateFile(statePath)
+
+# Fixed bucket histogram, the counters preallocated so an observation only increment one of them
+class Histogram(object):
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # Last counter for +Inf
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    # Prometheus text exposition lines, labels - 'name="value",...' or ''
+    def render(self, name, labels=''):
+        lines = []
+        total = 0
+        for i in range(len(self.buckets)):
+            total += self.counts[i]
+            lines.append('%s_bucket{%sle="%g"} %d' % (name, labels + ',' * (labels != ''), self.buckets[i], total))
+        total += self.counts[-1]
+        lines.append('%s_bucket{%sle="+Inf"} %d' % (name, labels + ',' * (labels != ''), total))
+        if labels != '':
+            labels = '{%s}' % labels
+        lines.append('%s_sum%s %.6f' % (name, labels, self.sum))
+        lines.append('%s_count%s %d' % (name, labels, total))
+        return lines
+
+# Daemon metrics, every label value known in advance and its counter preallocated, a scrape only format them
+class Metrics(object):
+    def __init__(self):
+        self.connectTime = Histogram([1, 2, 5, 10, 20, 30, 60, 120, 300])
+        self.probeRtt = Histogram([0.02, 0.05, 0.1, 0.2, 0.5, 1.0])
+        self.cmdTime = dict([(a, Histogram([0.01, 0.05, 0.1, 0.5, 1, 2, 5, 10, 30])) for a in metricsCmds])
+        self.reconnectCnt = dict([(a, 0) for a in metricsCauses])
+        self.scrapeCnt = 0
+
+    # External command, QMI request or DHCP exchange duration, per command name
+    def observeCmd(self, name, duration):
+        self.cmdTime.get(name, self.cmdTime['other']).observe(duration)
+
+    # Recovery attempt, per cause
+    def reconnect(self, cause):
+        if cause not in self.reconnectCnt:
+            cause = 'other'
+        self.reconnectCnt[cause] += 1
+
+    # Prometheus text exposition format
+    def render(self):
+        self.scrapeCnt += 1
+        lines = ['# HELP ltemodem_connect_seconds Time to connect from the first bring-up attempt',
+                 '# TYPE ltemodem_connect_seconds histogram']
+        lines += self.connectTime.render('ltemodem_connect_seconds')
+
+        lines += ['# HELP ltemodem_reconnect_total Recovery attempts by cause',
+                  '# TYPE ltemodem_reconnect_total counter']
+        lines += ['ltemodem_reconnect_total{cause="%s"} %d' % (a, self.reconnectCnt[a]) for a in metricsCauses]
+
+        lines += ['# HELP ltemodem_probe_rtt_seconds ICMP probe round trip time',
+                  '# TYPE ltemodem_probe_rtt_seconds histogram']
+        lines += self.probeRtt.render('ltemodem_probe_rtt_seconds')
+        lines += ['# TYPE ltemodem_probe_sent_total counter',
+                  'ltemodem_probe_sent_total %d' % icmpProber.sentCnt,
+                  '# TYPE ltemodem_probe_received_total counter',
+                  'ltemodem_probe_received_total %d' % icmpProber.recvCnt,
+                  '# TYPE ltemodem_probe_loss_ratio gauge',
+                  'ltemodem_probe_loss_ratio %.4f' % (icmpProber.lossPct() / 100),
+                  '# TYPE ltemodem_probe_skipped_total counter',
+                  'ltemodem_probe_skipped_total %d' % trafficCounters.skipCnt]
+
+        lines += ['# HELP ltemodem_command_duration_seconds External command, QMI request and DHCP duration',
+                  '# TYPE ltemodem_command_duration_seconds histogram']
+        for name in metricsCmds:
+            lines += self.cmdTime[name].render('ltemodem_command_duration_seconds', 'command="%s"' % name)
+
+        lines += ['# TYPE ltemodem_watchdog_kills_total counter',
+                  'ltemodem_watchdog_kills_total %d' % cmdWatchdog.killCnt,
+                  '# HELP ltemodem_state Current 4G LTE modem state',
+                  '# TYPE ltemodem_state gauge']
+        lines += ['ltemodem_state{state="%s"} %d' % (a, lteState.state == a) for a in lteStates]
+        lines += ['# TYPE ltemodem_connected gauge',
+                  'ltemodem_connected %d' % lteModemStat,
+                  '# TYPE ltemodem_log_dropped_total counter',
+                  'ltemodem_log_dropped_total %d' % logHandler.dropCnt]
+        return '\n'.join(lines) + '\n'
+
+# Daemon metrics instance
+metrics = Metrics()
+
+# Tracing span ring buffer, one span per external command, QMI request or DHCP exchange
+# Spans kept as tuples in a bounded buffer, only converted to JSON lines when dumped
+# Start and end recorded on the monotonic clock, converted to the current wall clock when dumped
+class SpanTracer(object):
+    def __init__(self, size):
+        self.spans = collections.deque(maxlen=size)
+        self.spanCnt = 0        # Total spans recorded, older ones dropped from the buffer
+
+    # Record one finished span, code - exit code or QMI error code, outcome - matched result
+    def record(self, name, startTime, endTime, code, outcome, size):
+        self.spans.append((name, startTime, endTime, code, outcome, size, lteState.state, connectSeq))
+        self.spanCnt += 1
+
+    # Buffered spans, oldest first, as JSON lines
+    def dump(self):
+        keys = ('name', 'start', 'end', 'code', 'outcome', 'bytes', 'state', 'seq')
+        offset = time.time() - monotonicTime()
+        lines = []
+        for span in list(self.spans):
+            data = dict(zip(keys, span))
+            data['start'] = span[1] + offset
+            data['end'] = span[2] + offset
+            data['duration'] = span[2] - span[1]
+            lines.append(json.dumps(data, sort_keys=True))
+        return ''.join([a + '\n' for a in lines])
+
+# Tracing span instance
+spanTracer = SpanTracer(spanBufLen)
+
+# Wait until one of the fds readable or the timeout passed, return the readable fds
+# The user signals interrupt any thread blocked in select, retry on EINTR with the time still left
+def selectRead(fds, timeOut=None):
+    deadline = None
+    if timeOut != None:
+        deadline = monotonicTime() + timeOut
+    while True:
+        try:
+            if deadline == None:
+                return select.select(fds, [], [])[0]
+            return select.select(fds, [], [], max(0, deadline - monotonicTime()))[0]
+        except select.error, e:
+            if e.args[0] != errno.EINTR:
+                raise
+
+# Per command deadline watchdog, kill stuck command process group once its own deadline passed
+class CommandWatchdog(object):
+    def __init__(self):
+        self.lock = thread.allocate_lock()
+        self.procs = {}         # pid -> [Popen handle, deadline, killed flag]
+        self.killCnt = 0        # Total command killed by the watchdog
+        # Self pipe to wake up the watchdog when new command registered
+        self.wakeRd, self.wakeWr = os.pipe()
+
+    # Start tracking newly launched command with its own deadline
+    def register(self, proc, timeout):
+        with self.lock:
+            self.procs[proc.pid] = [proc, monotonicTime() + timeout, False]
+        os.write(self.wakeWr, 'w')
+
+    # Stop tracking command, return True if the command was killed by the watchdog
+    def unregister(self, proc):
+        with self.lock:
+            entry = self.procs.pop(proc.pid, None)
+        return entry != None and entry[2] == True
+
+    # Watchdog thread loop
+    def run(self, threadname):
+        while True:
+            killed = []
+            nearest = None
+            with self.lock:
+                now = monotonicTime()
+                for pid, entry in self.procs.items():
+                    # Already killed, waiting for the caller to reap it
+                    if entry[2] == True:
+                        continue
+                    # Deadline passed, kill the whole process group
+                    if entry[1] <= now:
+                        try:
+                            os.killpg(pid, signal.SIGKILL)
+                        except OSError:
+                            pass
+                        entry[2] = True
+                        self.killCnt += 1
+                        killed.append(entry[0])
+                    elif nearest == None or entry[1] < nearest:
+                        nearest = entry[1]
+
+            for proc in killed:
+                logCmd.info("DEBUG_QMCLITO: KILL stuck command SUCCESSFUL - %s" % ' '.join(proc.cmdArgs))
+
+            # Sleep until the nearest deadline or until new command registered
+            if nearest == None:
+                rd = selectRead([self.wakeRd])
+            else:
+                rd = selectRead([self.wakeRd], nearest - monotonicTime())
+            if rd:
+                os.read(self.wakeRd, 512)
+
+# External command watchdog instance
+cmdWatchdog = CommandWatchdog()
+
+# Internet checksum (RFC 1071) for IPv4 header and ICMP message
+def inetChecksum(data):
+    if len(data) % 2:
+        data += '\0'
+    total = sum(struct.unpack('!%dH' % (len(data) / 2), data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+# Native ICMP echo prober, keep one socket bound to wwan0 for the whole daemon life
+class IcmpProber(object):
+    def __init__(self, ifName):
+        self.ifName = ifName
+        self.sock = None
+        self.rawSock = False
+        self.ident = os.getpid() & 0xFFFF
+        self.seq = 0
+        self.sentCnt = 0        # Total echo request sent
+        self.recvCnt = 0        # Total echo reply received
+        self.lastRtt = None     # Last echo round trip time in sec
+
+    # Open unprivileged datagram ICMP socket, fallback to raw socket when ping_group_range not allow it
+    def open(self):
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+            self.rawSock = False
+        except socket.error:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+            self.rawSock = True
+
+        # Bind the socket to 4G LTE modem interface only
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, SO_BINDTODEVICE, self.ifName + '\0')
+        except socket.error:
+            sock.close()
+            raise
+
+        sock.setblocking(0)
+        self.sock = sock
+
+    # Close the socket, it will be reopen on the next probe
+    def close(self):
+        if self.sock != None:
+            self.sock.close()
+            self.sock = None
+
+    # Send one echo request, return its sequence number or None when sending failed
+    def sendEcho(self, target):
+        self.seq = (self.seq + 1) & 0xFFFF
+        payload = struct.pack('!d', time.time())
+        header = struct.pack('!BBHHH', 8, 0, 0, self.ident, self.seq)
+        packet = struct.pack('!BBHHH', 8, 0, inetChecksum(header + payload), self.ident, self.seq) + payload
+        try:
+            self.sock.sendto(packet, (target, 0))
+        except socket.error:
+            self.close()
+            return None
+
+        self.sentCnt += 1
+        return self.seq
+
+    # Read one echo reply from the socket, return (source address, sequence number) or None
+    def recvEcho(self):
+        try:
+            data,addr = self.sock.recvfrom(1024)
+        except socket.error:
+            return None
+
+        # Raw socket received the IP header as well
+        if self.rawSock == True:
+            data = data[(ord(data[0]) & 0x0F) * 4:]
+        if len(data) < 8:
+            return None
+
+        icmpType,icmpCode,csum,ident,seq = struct.unpack('!BBHHH', data[:8])
+        # Datagram socket ident is managed by the kernel, only raw socket need to match it
+        if icmpType != 0 or (self.rawSock == True and ident != self.ident):
+            return None
+
+        return addr[0],seq
+
+    # Probe all targets concurrently within one cycle, return {target: RTT in sec or None when lost}
+    # Total probe time is bounded by the slowest reply or the timeout, not the sum of all replies
+    def probeMany(self, targets, timeOut):
+        result = dict.fromkeys(targets)
+        if self.sock == None:
+            try:
+                self.open()
+            except socket.error:
+                return result
+
+        # Send echo request to every target first
+        pending = {}
+        for target in targets:
+            sendTime = monotonicTime()
+            seq = self.sendEcho(target)
+            if seq == None:
+                return result
+            pending[(target, seq)] = sendTime
+
+        # Collect the replies until all arrived or the timeout reached
+        deadline = monotonicTime() + timeOut
+        while pending:
+            remain = deadline - monotonicTime()
+            if remain <= 0:
+                break
+
+            if not selectRead([self.sock], remain):
+                break
+
+            reply = self.recvEcho()
+            if reply in pending:
+                self.recvCnt += 1
+                self.lastRtt = monotonicTime() - pending.pop(reply)
+                result[reply[0]] = self.lastRtt
+
+        return result
+
+    # Packet loss percentage since daemon start
+    def lossPct(self):
+        if self.sentCnt == 0:
+            return 0.0
+        return 100.0 * (self.sentCnt - self.recvCnt) / self.sentCnt
+
+# 4G network ICMP prober instance
+icmpProber = IcmpProber(lteIfName)
+
+# Adaptive probe cadence, relax the probe interval while the 4G network stable and tighten it
+# as soon as a target lost or the RTT degraded
+class ProbeCadence(object):
+    def __init__(self, minInterval, maxInterval, relax, rttDegrade):
+        self.minInterval = minInterval
+        self.maxInterval = maxInterval
+        self.relax = relax
+        self.rttDegrade = rttDegrade
+        self.interval = minInterval
+        self.nextProbe = 0.0
+        self.rttAvg = None      # Median RTT moving average in sec
+
+    # Time left before the next probe in sec
+    def remain(self):
+        return max(0.0, self.nextProbe - monotonicTime())
+
+    # Probe result, failed targets count and median RTT (None when all lost), schedule the next probe
+    def update(self, failedCnt, rtt):
+        degraded = failedCnt > 0 or rtt == None
+        if rtt != None:
+            if self.rttAvg != None and rtt > self.rttAvg * self.rttDegrade:
+                degraded = True
+            # Moving average, 1/8 weight as TCP SRTT
+            if self.rttAvg == None:
+                self.rttAvg = rtt
+            else:
+                self.rttAvg += (rtt - self.rttAvg) / 8
+
+        if degraded == True:
+            self.interval = self.minInterval
+        else:
+            self.interval = min(self.interval * self.relax, self.maxInterval)
+        self.nextProbe = monotonicTime() + self.interval
+
+    # 4G network proved working without probing, relax the probe interval as a clean probe
+    def passive(self):
+        self.interval = min(self.interval * self.relax, self.maxInterval)
+        self.nextProbe = monotonicTime() + self.interval
+
+    # Probe right away on the next cycle, e.g. after the 4G network restarted
+    def reset(self):
+        self.interval = self.minInterval
+        self.nextProbe = 0.0
+
+# 4G network probe cadence instance, RTT average start from the last good RTT of the previous daemon instance
+probeCadence = ProbeCadence(probeMinInterval, probeMaxInterval, probeRelax, probeRttDegrade)
+
+# Read the attribute from offset 0 without moving the descriptor, os.pread only exist from Python 3.3
+def sysfsPread(fd, size=4096):
+    if hasattr(os, 'pread'):
+        return os.pread(fd, size, 0)
+    os.lseek(fd, 0, os.SEEK_SET)
+    return os.read(fd, size)
+
+# wwan0 sysfs attributes, read through file descriptors kept open between reads, never fork any command
+# Attribute name is the path under /sys/class/net/wwan0, e.g. 'carrier', 'statistics/rx_packets', 'qmi/raw_ip',
+# or an absolute sysfs path for the attributes outside of it, e.g. the modem driver bind and unbind
+class SysfsAttrs(object):
+    def __init__(self, ifName):
+        self.ifName = ifName
+        self.fds = {}           # Attribute name -> file descriptor
+        self.lock = thread.allocate_lock()
+
+    def path(self, name):
+        if name.startswith('/'):
+            return name
+        return '/sys/class/net/%s/%s' % (self.ifName, name)
+
+    # Attribute exist, e.g. 'qmi' directory only created by the qmi_wwan driver
+    def exists(self, name):
+        return os.path.exists(self.path(name))
+
+    # Interface exist, created by the modem driver
+    def present(self):
+        return os.path.exists('/sys/class/net/' + self.ifName)
+
+    # Interface index, None when the interface not exist
+    def index(self):
+        index = self.read('ifindex')
+        if index == None or not index.isdigit():
+            return None
+        return int(index)
+
+    def close(self):
+        with self.lock:
+            for fd in self.fds.values():
+                os.close(fd)
+            self.fds = {}
+
+    # Read attribute, None when not exist or not readable in the current link state (e.g. carrier when DOWN)
+    # Interface removed and created back (e.g. modem reset) invalidate the descriptor, reopen it once
+    def read(self, name):
+        with self.lock:
+            for attempt in range(2):
+                fd = self.fds.get(name)
+                try:
+                    if fd == None:
+                        fd = os.open(self.path(name), os.O_RDONLY)
+                        self.fds[name] = fd
+                    return sysfsPread(fd).strip()
+                except OSError:
+                    if fd != None:
+                        os.close(fd)
+                    self.fds.pop(name, None)
+            return None
+
+    # Write attribute then read it back, return error or None
+    # verify False for the write only attributes, e.g. the driver bind and unbind
+    def write(self, name, value, verify=True):
+        try:
+            fd = os.open(self.path(name), os.O_WRONLY)
+            try:
+                os.write(fd, value)
+            finally:
+                os.close(fd)
+        except OSError, e:
+            return 'write %s FAILED, %s' % (name, e.strerror)
+
+        if verify == False:
+            return None
+        readBack = self.read(name)
+        if readBack != value.strip():
+            return '%s read back %s' % (name, readBack)
+        return None
+
+    # Current (operstate, carrier), None for the attribute not readable
+    def linkState(self):
+        return self.read('operstate'),self.read('carrier')
+
+# wwan0 sysfs attributes instance
+sysfsAttrs = SysfsAttrs(lteIfName)
+
+# wwan0 traffic counters, read through the sysfs attribute layer
+# RX packets growing since the last read prove the 4G network working without any active probe
+class TrafficCounters(object):
+    def __init__(self, attrs, names=['rx_packets', 'tx_packets', 'rx_errors']):
+        self.attrs = attrs
+        self.names = names
+        self.last = None        # Counter name -> value on the last read
+        self.skipCnt = 0        # Active probe skipped thanks to RX growth
+
+    # Read all counters, None when wwan0 not exist
+    def read(self):
+        values = {}
+        for name in self.names:
+            value = self.attrs.read('statistics/' + name)
+            if value == None or not value.isdigit():
+                return None
+            values[name] = int(value)
+        return values
+
+    # Return True when RX packets grew without new RX errors since the last call
+    def rxGrowing(self):
+        last = self.last
+        self.last = self.read()
+        if last == None or self.last == None:
+            return False
+        return self.last['rx_packets'] > last['rx_packets'] and self.last['rx_errors'] == last['rx_errors']
+
+# wwan0 traffic counters instance
+trafficCounters = TrafficCounters(sysfsAttrs)
+
+# Split rtnetlink attributes into {attribute type: payload}
+def parseRtAttrs(data):
+    attrs = {}
+    while len(data) >= 4:
+        rtaLen,rtaType = struct.unpack('=HH', data[:4])
+        # Malformed or truncated attribute, the rest of the message not usable
+        if rtaLen < 4 or rtaLen > len(data):
+            break
+        attrs[rtaType] = data[4:rtaLen]
+        data = data[(rtaLen + 3) & ~3:]
+    return attrs
+
+# Pack one rtnetlink attribute, padded to 4 bytes
+def packRtAttr(rtaType, data):
+    return struct.pack('=HH', 4 + len(data), rtaType) + data + '\0' * (-len(data) & 3)
+
+# rtnetlink listener, push wwan0 link and address events to the main loop as they happen
+class NetlinkMonitor(object):
+    def __init__(self, ifName):
+        self.ifName = ifName
+        self.lock = thread.allocate_lock()
+        self.linkLost = False   # Link or address loss happen since the last check
+        self.lostCause = ''     # Last link loss cause
+        self.lostTime = None    # Last link loss event timestamp
+        self.carrier = None     # Current wwan0 carrier state, None - unknown
+        self.addrs = set()      # Current wwan0 IPv4 addresses
+        self.ownRemoval = set() # wwan0 IPv4 addresses being removed by the script itself
+        # Self pipe to wake up the main loop blocked in select, non blocking so a burst never block the writer
+        self.wakeRd, self.wakeWr = os.pipe()
+        for fd in (self.wakeRd, self.wakeWr):
+            fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+
+    # Wake up the main loop, pipe already full means a wake up already pending
+    def wake(self):
+        try:
+            os.write(self.wakeWr, 'w')
+        except OSError, e:
+            if e.errno != errno.EAGAIN:
+                raise
+
+    # Record link loss and wake up the main loop immediately
+    def setLinkLost(self, cause):
+        with self.lock:
+            self.linkLost = True
+            self.lostCause = cause
+            self.lostTime = monotonicTime()
+        self.wake()
+
+    # Return and clear link loss cause since the last check, None when no link loss
+    # Loss older than since dropped, the bring-up and the recovery actions take the link down by themselves
+    def takeLinkLost(self, since=None):
+        with self.lock:
+            cause = None
+            if self.linkLost == True and (since == None or self.lostTime >= since):
+                cause = self.lostCause
+            self.linkLost = False
+        return cause
+
+    # Address removal about to be done by the script itself, not a link loss
+    def expectRemoval(self, addrs):
+        with self.lock:
+            self.ownRemoval.update(addrs)
+
+    # Main loop delay, return earlier once link loss event received
+    # Block in select on the self pipe, threading.Event.wait poll every 50 ms on python 2
+    def wait(self, delay):
+        try:
+            rd,wr,ex = select.select([self.wakeRd], [], [], max(0, delay))
+        except select.error, e:
+            # Signal received, handled by the main loop right now
+            if e.args[0] != errno.EINTR:
+                raise
+            return
+        if rd:
+            try:
+                while os.read(self.wakeRd, 512):
+                    pass
+            except OSError, e:
+                if e.errno != errno.EAGAIN:
+                    raise
+
+    # Process one RTM_NEWLINK/RTM_DELLINK message
+    def linkMsg(self, msgType, payload):
+        family,ifType,index,flags,change = struct.unpack('=BxHiII', payload[:16])
+        attrs = parseRtAttrs(payload[16:])
+        if attrs.get(IFLA_IFNAME, '').rstrip('\0') != self.ifName:
+            return
+
+        if msgType == RTM_DELLINK:
+            self.carrier = False
+            self.addrs.clear()
+            self.setLinkLost('%s removed' % self.ifName)
+            return
+
+        carrier = (flags & IFF_UP) != 0 and (flags & IFF_LOWER_UP) != 0
+        if self.carrier == True and carrier == False:
+            self.setLinkLost('%s carrier lost' % self.ifName)
+        self.carrier = carrier
+
+    # Process one RTM_NEWADDR/RTM_DELADDR message
+    def addrMsg(self, msgType, payload):
+        family,prefixLen,flags,scope,index = struct.unpack('=BBBBI', payload[:8])
+        attrs = parseRtAttrs(payload[8:])
+        if attrs.get(IFA_LABEL, '').rstrip('\0') != self.ifName or IFA_LOCAL not in attrs:
+            return
+
+        addr = socket.inet_ntoa(attrs[IFA_LOCAL])
+        if msgType == RTM_NEWADDR:
+            self.addrs.add(addr)
+        else:
+            self.addrs.discard(addr)
+            with self.lock:
+                own = addr in self.ownRemoval
+                self.ownRemoval.discard(addr)
+            if own == False:
+                self.setLinkLost('%s address %s removed' % (self.ifName, addr))
+
+    # Netlink listener thread loop, keep listening after any socket failure
+    def run(self, threadname):
+        sock = None
+        while True:
+            try:
+                if sock == None:
+                    sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+                    sock.bind((0, RTMGRP_LINK | RTMGRP_IPV4_IFADDR))
+                data = sock.recv(65536)
+            except socket.error, e:
+                # Socket buffer overrun, the events in between lost but the socket still usable
+                # The link state read from sysfs on each network monitoring cycle cover the lost events
+                if e.args[0] == errno.ENOBUFS:
+                    log4g.info("DEBUG_4G: Netlink listener overrun, link events lost")
+                    continue
+                # Interrupted by the user signals, nothing lost
+                if e.args[0] == errno.EINTR:
+                    continue
+
+                log4g.info("DEBUG_4G: Netlink listener FAILED!, %s, reopen..." % e)
+                if sock != None:
+                    sock.close()
+                    sock = None
+                time.sleep(netlinkRetryDelay)
+                continue
+
+            while len(data) >= 16:
+                msgLen,msgType,msgFlags,msgSeq,msgPid = struct.unpack('=IHHII', data[:16])
+                if msgLen < 16:
+                    break
+                payload = data[16:msgLen]
+                if msgType in (RTM_NEWLINK, RTM_DELLINK) and len(payload) >= 16:
+                    self.linkMsg(msgType, payload)
+                elif msgType in (RTM_NEWADDR, RTM_DELADDR) and len(payload) >= 8:
+                    self.addrMsg(msgType, payload)
+                data = data[(msgLen + 3) & ~3:]
+
+# wwan0 netlink listener instance
+linkMonitor = NetlinkMonitor(lteIfName)
+
+# rtnetlink request channel, configure wwan0 in process instead of forking ifconfig and route
+# Messages of one operation sent in a single batch, the kernel acknowledge each one of them
+# The interface index taken from the sysfs attribute layer on each request, it change when wwan0 created back
+class RtNetlink(object):
+    def __init__(self, attrs):
+        self.attrs = attrs
+        self.ifName = attrs.ifName
+        self.sock = None
+        self.seq = 0
+        self.lock = thread.allocate_lock()
+
+    # Open the request socket on first use
+    def open(self):
+        if self.sock == None:
+            self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+            self.sock.bind((0, 0))
+        return self.sock
+
+    def close(self):
+        if self.sock != None:
+            self.sock.close()
+            self.sock = None
+
+    # Pack one request message with the next sequence number, return (sequence number, message)
+    def pack(self, msgType, flags, payload):
+        self.seq = (self.seq % 0xFFFFFFFF) + 1
+        return self.seq,struct.pack('=IHHII', 16 + len(payload), msgType, flags | NLM_F_REQUEST, self.seq, 0) + payload
+
+    # Receive the next replies before the deadline, return [(message type, sequence number, payload)]
+    def receive(self, deadline):
+        remain = deadline - monotonicTime()
+        if remain <= 0 or not selectRead([self.sock], remain):
+            raise IOError('netlink reply timeout')
+        data = self.sock.recv(65536)
+        msgs = []
+        while len(data) >= 16:
+            msgLen,msgType,msgFlags,msgSeq,msgPid = struct.unpack('=IHHII', data[:16])
+            if msgLen < 16:
+                break
+            msgs.append((msgType, msgSeq, data[16:msgLen]))
+            data = data[(msgLen + 3) & ~3:]
+        return msgs
+
+    # Send the messages in one batch and wait every acknowledgement, return the first error or None
+    # msgs - list of (message type, flags, payload)
+    def batch(self, name, msgs):
+        startTime = monotonicTime()
+        err = None
+        with self.lock:
+            try:
+                sock = self.open()
+                pending = set()
+                data = ''
+                for msgType,flags,payload in msgs:
+                    seq,msg = self.pack(msgType, flags | NLM_F_ACK, payload)
+                    pending.add(seq)
+                    data += msg
+                sock.send(data)
+
+                deadline = startTime + netlinkTimeOut
+                while pending:
+                    for msgType,msgSeq,payload in self.receive(deadline):
+                        if msgType != NLMSG_ERROR or msgSeq not in pending:
+                            continue
+                        code = -struct.unpack('=i', payload[:4])[0]
+                        pending.remove(msgSeq)
+                        if code != 0 and err == None:
+                            err = os.strerror(code)
+            except (IOError, OSError, socket.error), e:
+                # Late replies of this batch must not be taken by the next one
+                self.close()
+                err = str(e)
+        endTime = monotonicTime()
+        metrics.observeCmd('netlink', endTime - startTime)
+        spanTracer.record('netlink ' + name, startTime, endTime, None, err or 'ok', len(msgs))
+        return err
+
+    # Interface IPv4 addresses, return ([(address, prefix length)], error)
+    def addrs(self):
+        index = self.attrs.index()
+        if index == None:
+            return None,'%s not exist' % self.ifName
+
+        result = []
+        with self.lock:
+            try:
+                sock = self.open()
+                seq,msg = self.pack(RTM_GETADDR, NLM_F_DUMP, struct.pack('=BBBBI', socket.AF_INET, 0, 0, 0, 0))
+                sock.send(msg)
+
+                deadline = monotonicTime() + netlinkTimeOut
+                while True:
+                    for msgType,msgSeq,payload in self.receive(deadline):
+                        if msgSeq != seq:
+                            continue
+                        if msgType == NLMSG_DONE:
+                            return result,None
+                        if msgType == NLMSG_ERROR:
+                            return None,os.strerror(-struct.unpack('=i', payload[:4])[0])
+                        family,prefixLen,flags,scope,ifIndex = struct.unpack('=BBBBI', payload[:8])
+                        attrs = parseRtAttrs(payload[8:])
+                        if ifIndex == index and IFA_LOCAL in attrs:
+                            result.append((socket.inet_ntoa(attrs[IFA_LOCAL]), prefixLen))
+            except (IOError, OSError, socket.error), e:
+                self.close()
+                return None,str(e)
+
+    # Bring the interface UP or DOWN, return error or None
+    def linkSet(self, up):
+        index = self.attrs.index()
+        if index == None:
+            return '%s not exist' % self.ifName
+
+        payload = struct.pack('=BxHiII', socket.AF_UNSPEC, 0, index, [0, IFF_UP][up], IFF_UP)
+        return self.batch('link %s %s' % (self.ifName, ['down', 'up'][up]), [(RTM_NEWLINK, 0, payload)])
+
+    # Configure the interface address and the default route in one batch, return error or None
+    # stale - [(address, prefix length)] removed first
+    # The default route has its own metric, replacing the previous wwan0 default route (e.g. gateway changed on
+    # rebind) without touching the default route of another uplink, which has another metric
+    def configure(self, addr, prefixLen, router, stale=[]):
+        index = self.attrs.index()
+        if index == None:
+            return '%s not exist' % self.ifName
+
+        msgs = []
+        for oldAddr,oldPrefixLen in stale:
+            payload = struct.pack('=BBBBI', socket.AF_INET, oldPrefixLen, 0, RT_SCOPE_UNIVERSE, index) + \
+                      packRtAttr(IFA_LOCAL, socket.inet_aton(oldAddr))
+            msgs.append((RTM_DELADDR, 0, payload))
+
+        addrBin = socket.inet_aton(addr)
+        payload = struct.pack('=BBBBI', socket.AF_INET, prefixLen, 0, RT_SCOPE_UNIVERSE, index) + \
+                  packRtAttr(IFA_LOCAL, addrBin) + packRtAttr(IFA_ADDRESS, addrBin)
+        if prefixLen < 31:
+            hostMask = (1 << (32 - prefixLen)) - 1
+            broadcast = struct.pack('!I', struct.unpack('!I', addrBin)[0] | hostMask)
+            payload += packRtAttr(IFA_BROADCAST, broadcast)
+        msgs.append((RTM_NEWADDR, NLM_F_CREATE | NLM_F_REPLACE, payload))
+
+        if router != None:
+            payload = struct.pack('=BBBBBBBBI', socket.AF_INET, 0, 0, 0, RT_TABLE_MAIN, RTPROT_BOOT, \
+                                  RT_SCOPE_UNIVERSE, RTN_UNICAST, 0) + \
+                      packRtAttr(RTA_GATEWAY, socket.inet_aton(router)) + packRtAttr(RTA_OIF, struct.pack('=i', index)) + \
+                      packRtAttr(RTA_PRIORITY, struct.pack('=I', lteRouteMetric))
+            msgs.append((RTM_NEWROUTE, NLM_F_CREATE | NLM_F_REPLACE, payload))
+
+        return self.batch('configure %s %s/%d' % (self.ifName, addr, prefixLen), msgs)
+
+# rtnetlink request channel instance
+rtNetlink = RtNetlink(sysfsAttrs)
+
+# Pack QMI TLVs, tlvs - list of (type, value)
+def qmiTlvPack(tlvs):
+    return ''.join([struct.pack('<BH', t, len(v)) + v for t,v in tlvs])
+
+# Unpack QMI TLVs into {type: value}
+def qmiTlvUnpack(data):
+    tlvs = {}
+    while len(data) >= 3:
+        t,l = struct.unpack('<BH', data[:3])
+        tlvs[t] = data[3:3 + l]
+        data = data[3 + l:]
+    return tlvs
+
+# Pack one QMUX frame, CTL service use 1 byte transaction ID while the other services use 2 bytes
+def qmiFramePack(service, clientId, msgType, txnId, msgId, tlvs):
+    body = qmiTlvPack(tlvs)
+    if service == QMI_SVC_CTL:
+        sdu = struct.pack('<BBHH', msgType, txnId & 0xFF, msgId, len(body)) + body
+    else:
+        sdu = struct.pack('<BHHH', msgType << 1, txnId & 0xFFFF, msgId, len(body)) + body
+    return struct.pack('<BHBBB', 0x01, len(sdu) + 5, 0x00, service, clientId) + sdu
+
+# Unpack one QMUX frame, return (service, client ID, message type, transaction ID, message ID, {TLV type: value})
+def qmiFrameUnpack(frame):
+    marker,length,flags,service,clientId = struct.unpack('<BHBBB', frame[:6])
+    if service == QMI_SVC_CTL:
+        msgFlags,txnId,msgId,tlvLen = struct.unpack('<BBHH', frame[6:12])
+        tlvs = qmiTlvUnpack(frame[12:12 + tlvLen])
+    else:
+        msgFlags,txnId,msgId,tlvLen = struct.unpack('<BHHH', frame[6:13])
+        msgFlags >>= 1
+        tlvs = qmiTlvUnpack(frame[13:13 + tlvLen])
+    return service,clientId,msgFlags & 0x03,txnId,msgId,tlvs
+
+# Split received bytes into complete QMUX frames, return (frames, remaining bytes)
+def qmiFrameSplit(data):
+    frames = []
+    while len(data) >= 3:
+        # Resync on garbage, every QMUX frame start with 0x01 marker
+        if data[0] != '\x01':
+            data = data[1:]
+            continue
+        length = struct.unpack('<H', data[1:3])[0] + 1
+        if len(data) < length:
+            break
+        frames.append(data[:length])
+        data = data[length:]
+    return frames,data
+
+# Return (result, error) from QMI result TLV, (0, 0) means success
+def qmiResult(tlvs):
+    if QMI_TLV_RESULT not in tlvs:
+        return 1,0xFFFF
+    return struct.unpack('<HH', tlvs[QMI_TLV_RESULT][:4])
+
+# QMI transport, go through qmi-proxy when it is running so qmicli can share the modem,
+# otherwise open the cdc-wdm device directly. An already connected socket (e.g. one end
+# of a socketpair talking to a fake QMI endpoint) can be given instead.
+# proxyOnly - never open the cdc-wdm device, another QMI user (qmi-network) is sharing the modem
+class QmiTransport(object):
+    def __init__(self, devPath, sock=None, proxyOnly=False):
+        self.devPath = devPath
+        self.proxyOnly = proxyOnly
+        self.sock = sock
+        self.fd = None
+        self.rxBuf = ''
+        if sock != None:
+            self.fd = sock.fileno()
+
+    # Open the QMI channel
+    def open(self):
+        if self.fd != None:
+            return
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(qmiProxyPath)
+            self.sock = sock
+            self.fd = sock.fileno()
+            # Tell qmi-proxy which device we want to talk to
+            self.write(qmiFramePack(QMI_SVC_CTL, 0, QMI_MSG_REQUEST, 1, QMI_CTL_PROXY_OPEN, [(0x01, self.devPath)]))
+        except socket.error, e:
+            sock.close()
+            self.sock = None
+            self.fd = None
+            # Two readers on the cdc-wdm device take each other's QMI responses, wait for qmi-proxy instead
+            if self.proxyOnly == True:
+                raise socket.error('qmi-proxy not running, %s' % e)
+            self.fd = os.open(self.devPath, os.O_RDWR)
+
+    # Close the QMI channel
+    def close(self):
+        if self.sock != None:
+            self.sock.close()
+        elif self.fd != None:
+            os.close(self.fd)
+        self.sock = None
+        self.fd = None
+        self.rxBuf = ''
+
+    def fileno(self):
+        return self.fd
+
+    # Write one QMUX frame
+    def write(self, frame):
+        if self.sock != None:
+            self.sock.sendall(frame)
+        else:
+            os.write(self.fd, frame)
+
+    # Read available bytes, return list of complete QMUX frames
+    def read(self):
+        data = os.read(self.fd, 4096)
+        if data == '':
+            raise IOError('QMI channel closed')
+        frames,self.rxBuf = qmiFrameSplit(self.rxBuf + data)
+        return frames
+
+# QMI request error, code is the QMI protocol error code or None on transport failure/timeout
+class QmiError(Exception):
+    def __init__(self, code, message):
+        Exception.__init__(self, message)
+        self.code = code
+
+# In-process QMI client, talk to the modem over one persistent QMI channel. Requests are matched
+# to their responses by transaction ID, indications are dispatched to the registered handlers.
+class QmiClient(object):
+    def __init__(self, transport, stateFile=None):
+        self.transport = transport
+        self.stateFile = stateFile
+        self.pktHandle = None   # WDS packet data handle of the running bearer
+        self.lock = thread.allocate_lock()
+        self.writeLock = thread.allocate_lock()
+        self.allocLock = thread.allocate_lock()
+        self.connected = threading.Event()
+        self.pending = {}       # (service, client ID, transaction ID, message ID) -> [Event, TLVs, error]
+        self.clientIds = {}     # service -> allocated client ID
+        self.indHandlers = {}   # (service, message ID) -> [handler(tlvs)]
+        self.watchServices = [] # Services to allocate as soon as the QMI channel open
+        self.ctlTxnId = 0
+        self.svcTxnId = 0
+
+    # Register indication handler
+    def addIndication(self, service, msgId, handler):
+        self.indHandlers.setdefault((service, msgId), []).append(handler)
+
+    # Next transaction ID, CTL use 8 bits while the other services use 16 bits, 0 is reserved
+    def nextTxnId(self, service):
+        with self.lock:
+            if service == QMI_SVC_CTL:
+                self.ctlTxnId = self.ctlTxnId % 0xFF + 1
+                return self.ctlTxnId
+            self.svcTxnId = self.svcTxnId % 0xFFFF + 1
+            return self.svcTxnId
+
+    # Load client IDs and packet data handle persisted by the previous daemon instance
+    def loadClients(self):
+        if self.stateFile == None:
+            return
+        try:
+            data = self.stateFile.get('qmi')
+            self.clientIds = dict([(int(a), b) for a,b in data['clientIds'].items()])
+            self.pktHandle = data['pktHandle']
+        except (ValueError, KeyError, TypeError, AttributeError):
+            pass
+
+    # Persist client IDs and packet data handle, so the next daemon instance can reuse them
+    def saveClients(self):
+        if self.stateFile == None:
+            return
+        self.stateFile.update('qmi', {'clientIds': self.clientIds, 'pktHandle': self.pktHandle})
+
+    # Release client IDs on shutdown, keep the services still needed by the running bearer
+    def releaseClients(self, keepServices=[], timeOut=1.0):
+        for service,clientId in self.clientIds.items():
+            if service in keepServices:
+                continue
+            tlvs,err = self.request(QMI_SVC_CTL, QMI_CTL_RELEASE_CID, [(0x01, chr(service) + chr(clientId))], timeOut)
+            del self.clientIds[service]
+        self.saveClients()
+
+    # Send one QMI request and wait for its response, return (TLVs, None) or (None, QmiError)
+    # Client ID that is no longer valid will be dropped and allocated again once
+    def request(self, service, msgId, tlvs=[], timeOut=5.0):
+        startTime = monotonicTime()
+        deadline = startTime + timeOut
+        respTlvs,err = self.transact(service, msgId, tlvs, deadline)
+        if err != None and err.code == QMI_ERR_INVALID_CLIENT_ID and service != QMI_SVC_CTL:
+            self.clientIds.pop(service, None)
+            respTlvs,err = self.transact(service, msgId, tlvs, deadline)
+        endTime = monotonicTime()
+        metrics.observeCmd('qmi', endTime - startTime)
+        name = 'qmi %s 0x%04x' % (qmiSvcNames.get(service, service), msgId)
+        if err == None:
+            spanTracer.record(name, startTime, endTime, 0, 'ok', sum([len(a) for a in respTlvs.values()]))
+        else:
+            spanTracer.record(name, startTime, endTime, err.code, str(err), 0)
+        return respTlvs,err
+
+    # Single QMI request and response transaction
+    def transact(self, service, msgId, tlvs, deadline):
+        timeOut = max(0, deadline - monotonicTime())
+        self.connected.wait(timeOut)
+        if not self.connected.isSet():
+            return None,QmiError(None, 'QMI channel not open')
+
+        # Get client ID for the service
+        clientId = 0
+        if service != QMI_SVC_CTL:
+            clientId,err = self.getClientId(service, deadline - monotonicTime())
+            if err != None:
+                return None,err
+
+        txnId = self.nextTxnId(service)
+        key = (service, clientId, txnId, msgId)
+        entry = [threading.Event(), None, None]
+        with self.lock:
+            self.pending[key] = entry
+        try:
+            with self.writeLock:
+                self.transport.write(qmiFramePack(service, clientId, QMI_MSG_REQUEST, txnId, msgId, tlvs))
+            entry[0].wait(max(0, deadline - monotonicTime()))
+        except (IOError, OSError, socket.error), e:
+            entry[2] = QmiError(None, 'QMI write FAILED, %s' % e)
+        finally:
+            with self.lock:
+                self.pending.pop(key, None)
+
+        if entry[2] != None:
+            return None,entry[2]
+        if entry[1] == None:
+            return None,QmiError(None, 'QMI request 0x%02x/0x%04x timeout' % (service, msgId))
+
+        result,error = qmiResult(entry[1])
+        if result != 0:
+            return entry[1],QmiError(error, 'QMI protocol error %d' % error)
+        return entry[1],None
+
+    # Return (client ID, None) for the service, allocate it through QMI CTL on the first use
+    def getClientId(self, service, timeOut=5.0):
+        with self.allocLock:
+            clientId = self.clientIds.get(service)
+            if clientId != None:
+                return clientId,None
+
+            tlvs,err = self.request(QMI_SVC_CTL, QMI_CTL_ALLOCATE_CID, [(0x01, chr(service))], timeOut)
+            if err != None:
+                return None,err
+            if 0x01 not in tlvs:
+                return None,QmiError(None, 'QMI CTL allocate client ID reply malformed')
+
+            self.clientIds[service] = ord(tlvs[0x01][1])
+            self.saveClients()
+            return self.clientIds[service],None
+
+    # Dispatch one received QMUX frame
+    def dispatch(self, frame):
+        service,clientId,msgType,txnId,msgId,tlvs = qmiFrameUnpack(frame)
+        if msgType == QMI_MSG_RESPONSE:
+            with self.lock:
+                entry = self.pending.get((service, clientId, txnId, msgId))
+            if entry != None:
+                entry[1] = tlvs
+                entry[0].set()
+        elif msgType == QMI_MSG_INDICATION:
+            for handler in self.indHandlers.get((service, msgId), []):
+                handler(tlvs)
+
+    # Fail every pending request, used when the QMI channel closed
+    def failPending(self, err):
+        with self.lock:
+            for entry in self.pending.values():
+                entry[2] = err
+                entry[0].set()
+
+    # Allocate client ID for the watched services, so they are ready before the first request and
+    # the modem start sending their indications
+    def allocateWatched(self, threadname):
+        for service in self.watchServices:
+            self.getClientId(service)
+
+    # QMI reader thread loop, reopen the QMI channel after any failure
+    def run(self, threadname):
+        while True:
+            try:
+                self.transport.open()
+                self.connected.set()
+                if self.watchServices:
+                    thread.start_new_thread(self.allocateWatched, ("[qmiAllocate]",))
+                while True:
+                    selectRead([self.transport])
+                    for frame in self.transport.read():
+                        self.dispatch(frame)
+            except (IOError, OSError, socket.error, struct.error), e:
+                logQmi.info("DEBUG_QMI: QMI channel FAILED!, %s, reopen..." % e)
+
+                self.connected.clear()
+                self.failPending(QmiError(None, 'QMI channel closed'))
+                self.transport.close()
+                time.sleep(qmiRetryDelay)
+
+    # Set the data format, equivalent to qmicli --device-open-net='net-raw-ip|net-no-qos-header'
+    def setDataFormat(self, rawIp=True, timeOut=5.0):
+        tlvs,err = self.request(QMI_SVC_CTL, QMI_CTL_SET_DATA_FORMAT, [(0x01, chr(0)), (0x10, struct.pack('<H', rawIp and 2 or 1))], timeOut)
+        return err
+
+    # DMS get operating mode, return (mode, error)
+    def getOperatingMode(self, timeOut=5.0):
+        tlvs,err = self.request(QMI_SVC_DMS, QMI_DMS_GET_OPERATING_MODE, [], timeOut)
+        if err != None:
+            return None,err
+        return ord(tlvs[0x01][0]),None
+
+    # DMS set operating mode, return error
+    def setOperatingMode(self, mode, timeOut=5.0):
+        tlvs,err = self.request(QMI_SVC_DMS, QMI_DMS_SET_OPERATING_MODE, [(0x01, chr(mode))], timeOut)
+        return err
+
+    # WDS start network, return (packet data handle, error)
+    # When the bearer is already up, the packet data handle from the previous start is returned with the error
+    def startNetwork(self, apn, userName, password, ipFamily=4, timeOut=30.0):
+        tlvs,err = self.request(QMI_SVC_WDS, QMI_WDS_START_NETWORK, [(0x14, apn), (0x17, userName), (0x18, password), \
+                                (0x19, chr(ipFamily))], timeOut)
+        if err != None:
+            return self.pktHandle,err
+
+        self.pktHandle = struct.unpack('<I', tlvs[0x01][:4])[0]
+        self.saveClients()
+        return self.pktHandle,None
+
+    # WDS stop network, return error
+    def stopNetwork(self, pktHandle, timeOut=10.0):
+        tlvs,err = self.request(QMI_SVC_WDS, QMI_WDS_STOP_NETWORK, [(0x01, struct.pack('<I', pktHandle))], timeOut)
+        if err == None:
+            self.pktHandle = None
+            self.saveClients()
+        return err
+
+    # WDS get packet service status, return (connection status, error)
+    def getPacketServiceStatus(self, timeOut=5.0):
+        tlvs,err = self.request(QMI_SVC_WDS, QMI_WDS_PKT_SRVC_STATUS, [], timeOut)
+        if err != None:
+            return None,err
+        return ord(tlvs[0x01][0]),None
+
+# QMI WDS indication listener, report bearer disconnect from the packet service status indication
+class QmiIndicationListener(object):
+    def __init__(self, client, onBearerDown):
+        self.onBearerDown = onBearerDown
+        self.connStat = None    # Last reported WDS connection status
+        client.addIndication(QMI_SVC_WDS, QMI_WDS_PKT_SRVC_STATUS, self.handleIndication)
+        if QMI_SVC_WDS not in client.watchServices:
+            client.watchServices.append(QMI_SVC_WDS)
+
+    # Handle packet service status indication, return True when bearer disconnect detected
+    def handleIndication(self, tlvs):
+        if 0x01 not in tlvs:
+            return False
+
+        connStat = ord(tlvs[0x01][0])
+        lastStat = self.connStat
+        self.connStat = connStat
+        if connStat == QMI_WDS_DISCONNECTED and lastStat != QMI_WDS_DISCONNECTED:
+            self.onBearerDown()
+            return True
+        return False
+
+# Bearer disconnect reported by the modem, restart the 4G network the same way as wwan0 link loss
+def qmiBearerDown():
+    linkMonitor.setLinkLost('bearer disconnected (QMI WDS packet service status)')
+
+# Get interface IPv4 address without forking any command, None when not configured
+def ifaceAddr(ifName):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        data = fcntl.ioctl(sock.fileno(), SIOCGIFADDR, struct.pack('256s', ifName[:15]))
+        return socket.inet_ntoa(data[20:24])
+    except IOError:
+        return None
+    finally:
+        sock.close()
+
+# Get interface flags without forking any command, 0 when the interface not exist
+def ifaceFlags(ifName):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        data = fcntl.ioctl(sock.fileno(), SIOCGIFFLAGS, struct.pack('256s', ifName[:15]))
+        return struct.unpack('H', data[16:18])[0]
+    except IOError:
+        return 0
+    finally:
+        sock.close()
+
+# Wait until the readiness condition met or the timeout reached, return True when ready
+# The condition is polled at a short interval instead of waiting a fixed delay between steps
+def waitReady(cond, timeOut, poll=0.01):
+    deadline = monotonicTime() + timeOut
     while True:
-        # Loop every 1 sec based on the thread delay setting
-        time.sleep(delay)
-
-        # Start delay counter before start 4G LTE modem process sequence
-        if startSys == False:
-            startSysCnt += 1
-            # Reach 1 minute, set the 4G LTE modem process sequence flag
-            if startSysCnt == 60:
+        if cond():
+            return True
+        remain = deadline - monotonicTime()
+        if remain <= 0:
+            return False
+        time.sleep(min(poll, remain))
+
+# Start measuring time to connect, only on the first attempt of the bring-up sequence
+def connectBegin():
+    global connectStart
+    global connectSeq
+    if connectStart == None:
+        connectStart = monotonicTime()
+        connectSeq += 1
+
+# Bring-up sequence completed, report the time to connect
+def connectDone():
+    global connectStart
+    global lastConnectTime
+    if connectStart == None:
+        return
+    lastConnectTime = monotonicTime() - connectStart
+    connectStart = None
+    metrics.connectTime.observe(lastConnectTime)
+
+    log4g.info("DEBUG_4G: Time to connect %.3f sec" % lastConnectTime)
+
+# QMI client and WDS indication listener instance
+# One client per DMS/NAS/WDS service allocated at startup and reused, persisted for the next daemon instance
+qmiClient = QmiClient(QmiTransport(qmiDevPath), stateFile)
+qmiClient.watchServices = [QMI_SVC_DMS, QMI_SVC_NAS]
+qmiListener = QmiIndicationListener(qmiClient, qmiBearerDown)
+
+# Minimal DHCP client, DISCOVER/REQUEST through a packet socket bound to the interface, no IP address needed
+# The lease kept on disk, on reconnect the cached address requested directly before falling back to DISCOVER.
+class DhcpClient(object):
+    def __init__(self, attrs, stateFile=None):
+        self.attrs = attrs
+        self.ifName = attrs.ifName
+        self.stateFile = stateFile
+        self.sock = None
+        self.xid = 0
+        self.hwAddr = '\0' * 6  # Raw IP interface has no hardware address
+        self.lease = None       # Current lease
+        self.obtained = 0.0     # Current lease obtained, monotonic clock timestamp
+        self.renewTime = 0.0    # Next lease renewal attempt, monotonic clock timestamp
+
+    def open(self):
+        self.sock = socket.socket(socket.AF_PACKET, socket.SOCK_DGRAM, socket.htons(ETH_P_IP))
+        self.sock.bind((self.ifName, ETH_P_IP))
+        addr = self.attrs.read('address')
+        if addr:
+            self.hwAddr = (''.join([chr(int(a, 16)) for a in addr.split(':')]) + '\0' * 6)[:6]
+
+    def close(self):
+        if self.sock != None:
+            self.sock.close()
+            self.sock = None
+
+    # Age of a lease read from disk in sec, checked against both clocks, None when not known
+    # Same boot: from the monotonic clock kept with the lease, a wall clock jump since then does not matter.
+    # Obtained before a reboot: from the wall clock, unless the clock is before the lease (no RTC, not set by
+    # NTP yet) or too early for the time since boot.
+    def leaseAge(self, lease):
+        now = monotonicTime()
+        if lease.get('boot') != None and lease.get('boot') == bootId() and lease.get('uptime', now) <= now:
+            return now - lease['uptime']
+        age = time.time() - lease['obtained']
+        if age < now:
+            return None
+        return age
+
+    # Read the lease from the previous session, None when not exist
+    # Lease with unknown age renewed right away instead of taken as expired
+    def loadLease(self):
+        if self.stateFile == None:
+            return None
+        try:
+            self.lease = self.stateFile.get('lease')
+            age = self.leaseAge(self.lease)
+            if age == None:
+                age = self.lease['t1']
+            self.obtained = monotonicTime() - age
+            self.renewTime = self.obtained + self.lease['t1']
+        except (KeyError, TypeError, AttributeError):
+            self.lease = None
+        return self.lease
+
+    # Keep the lease in the session state file
+    def saveLease(self):
+        if self.stateFile == None:
+            return
+        self.stateFile.update('lease', self.lease)
+
+    # Build DHCP message inside IPv4/UDP, from ciaddr (0.0.0.0 before any lease) to dest
+    def packet(self, msgType, options, ciaddr='0.0.0.0', dest='255.255.255.255'):
+        opts = struct.pack('!BBB', 53, 1, msgType)
+        # Client identifier and parameter request list
+        opts += struct.pack('!BBB', 61, 7, 1) + self.hwAddr
+        opts += struct.pack('!BB', 55, 7) + '\x01\x03\x06\x33\x36\x3a\x3b'
+        for code,value in options:
+            opts += struct.pack('!BB', code, len(value)) + value
+        opts += '\xff'
+
+        bootp = struct.pack('!BBBBIHH4s4s4s4s16s64s128sI', 1, 1, 6, 0, self.xid, 0, 0x8000, socket.inet_aton(ciaddr), \
+                            '\0' * 4, '\0' * 4, '\0' * 4, self.hwAddr, '', '', DHCP_MAGIC) + opts
+        udp = struct.pack('!HHHH', 68, 67, 8 + len(bootp), 0) + bootp
+        ip = struct.pack('!BBHHHBBH4s4s', 0x45, 0, 20 + len(udp), 0, 0, 64, socket.IPPROTO_UDP, 0, \
+                         socket.inet_aton(ciaddr), socket.inet_aton(dest))
+        return ip[:10] + struct.pack('!H', inetChecksum(ip)) + ip[12:] + udp
+
+    # Parse DHCP reply for the current transaction, return (message type, your address, {option: value})
+    # None when the packet not for us
+    def parse(self, data):
+        if len(data) < 20:
+            return None
+        ihl = (ord(data[0]) & 0x0F) * 4
+        if ord(data[9]) != socket.IPPROTO_UDP or len(data) < ihl + 8 + 240:
+            return None
+        if struct.unpack('!H', data[ihl + 2:ihl + 4])[0] != 68:
+            return None
+
+        bootp = data[ihl + 8:]
+        op,xid = struct.unpack('!B3xI', bootp[:8])
+        if op != 2 or xid != self.xid or struct.unpack('!I', bootp[236:240])[0] != DHCP_MAGIC:
+            return None
+
+        options = {}
+        i = 240
+        while i + 1 < len(bootp) and ord(bootp[i]) != 255:
+            # Pad option
+            if ord(bootp[i]) == 0:
+                i += 1
+                continue
+            code,size = struct.unpack('!BB', bootp[i:i + 2])
+            options[code] = bootp[i + 2:i + 2 + size]
+            i += 2 + size
+
+        if 53 not in options or len(options[53]) != 1:
+            return None
+        return ord(options[53]),socket.inet_ntoa(bootp[16:20]),options
+
+    # Send the message and wait for the expected reply types, retransmit with doubling interval
+    # Return (message type, your address, options), None when no reply before the timeout
+    def exchange(self, msgType, options, replyTypes, timeOut, ciaddr='0.0.0.0', dest='255.255.255.255'):
+        data = self.packet(msgType, options, ciaddr, dest)
+        deadline = monotonicTime() + timeOut
+        retransmit = dhcpRetransmit
+        try:
+            while monotonicTime() < deadline:
+                self.sock.sendto(data, (self.ifName, ETH_P_IP, 0, 0, '\xff' * 6))
+                waitEnd = min(deadline, monotonicTime() + retransmit)
+                retransmit *= 2
+
+                while True:
+                    remain = waitEnd - monotonicTime()
+                    if remain <= 0:
+                        break
+                    if not selectRead([self.sock], remain):
+                        break
+                    reply = self.parse(self.sock.recv(4096))
+                    if reply != None and reply[0] in replyTypes:
+                        return reply
+            return None
+        finally:
+            # DHCP replies are not application traffic, exclude them from the next RX growth check
+            trafficCounters.last = trafficCounters.read()
+
+    # Build the lease from DHCPACK and keep it on disk
+    def bind(self, reply):
+        msgType,addr,options = reply
+        leaseTime = dhcpDefLease
+        if len(options.get(51, '')) == 4:
+            leaseTime = struct.unpack('!I', options[51])[0]
+
+        self.lease = {'addr'      : addr,
+                      'mask'      : '255.255.255.0',
+                      'router'    : None,
+                      'server'    : None,
+                      'dns'       : [],
+                      'leaseTime' : leaseTime,
+                      't1'        : leaseTime / 2,
+                      't2'        : leaseTime * 7 / 8,
+                      'obtained'  : time.time(),
+                      'boot'      : bootId(),
+                      'uptime'    : monotonicTime()}
+        if len(options.get(1, '')) == 4:
+            self.lease['mask'] = socket.inet_ntoa(options[1])
+        if len(options.get(3, '')) >= 4:
+            self.lease['router'] = socket.inet_ntoa(options[3][:4])
+        if len(options.get(54, '')) == 4:
+            self.lease['server'] = socket.inet_ntoa(options[54])
+        self.lease['dns'] = [socket.inet_ntoa(options.get(6, '')[a:a + 4]) for a in range(0, len(options.get(6, '')) / 4 * 4, 4)]
+        if len(options.get(58, '')) == 4:
+            self.lease['t1'] = struct.unpack('!I', options[58])[0]
+        if len(options.get(59, '')) == 4:
+            self.lease['t2'] = struct.unpack('!I', options[59])[0]
+        self.obtained = self.lease['uptime']
+        self.renewTime = self.obtained + self.lease['t1']
+
+        self.saveLease()
+        return self.lease
+
+    # Time left before the next lease renewal attempt in sec, None when no lease
+    def renewRemain(self):
+        if self.lease == None:
+            return None
+        return max(0.0, self.renewTime - monotonicTime())
+
+    # Lease renewal failed, retry after half of the time left until T2 (or the lease expiry once
+    # past T2) as RFC 2131, not sooner than dhcpRenewMin
+    def renewFailed(self):
+        now = monotonicTime()
+        deadline = self.obtained + self.lease['t2']
+        if now >= deadline:
+            deadline = self.obtained + self.lease['leaseTime']
+        self.renewTime = now + max(dhcpRenewMin, (deadline - now) / 2)
+        self.renewTime = min(self.renewTime, self.obtained + self.lease['leaseTime'])
+
+    # Obtain a lease, return (lease, error)
+    # The cached address requested directly first (INIT-REBOOT), full DISCOVER/REQUEST otherwise
+    # The packet socket receive every IPv4 packet of wwan0, only kept open during the call
+    def obtain(self, timeOut):
+        try:
+            self.open()
+
+            cached = self.loadLease()
+            if cached != None:
+                self.xid = random.getrandbits(32)
+                reply = self.exchange(DHCP_REQUEST, [(50, socket.inet_aton(cached['addr']))], [DHCP_ACK, DHCP_NAK], \
+                                      dhcpRebootTimeOut)
+                if reply != None and reply[0] == DHCP_ACK:
+                    return self.bind(reply),None
+
+            self.xid = random.getrandbits(32)
+            offer = self.exchange(DHCP_DISCOVER, [], [DHCP_OFFER], timeOut)
+            if offer == None:
+                return None,'No DHCPOFFER received'
+
+            # Same transaction ID for the selected offer
+            reply = self.exchange(DHCP_REQUEST, [(50, socket.inet_aton(offer[1])), (54, offer[2].get(54, ''))], \
+                                  [DHCP_ACK, DHCP_NAK], timeOut)
+            if reply == None:
+                return None,'No DHCPACK received'
+            if reply[0] == DHCP_NAK:
+                return None,'DHCPNAK received'
+            return self.bind(reply),None
+
+        except socket.error, e:
+            return None,'DHCP socket error, %s' % e
+        finally:
+            self.close()
+
+    # Extend the current lease without touching the address, return (lease, error)
+    # Unicast to the lease server while renewing, broadcast once rebinding (dest None)
+    def renew(self, timeOut, rebind=False):
+        if self.lease == None and self.loadLease() == None:
+            return None,'No DHCP lease'
+
+        try:
+            self.open()
+
+            dest = self.lease['server']
+            if rebind == True or dest == None:
+                dest = '255.255.255.255'
+            self.xid = random.getrandbits(32)
+            reply = self.exchange(DHCP_REQUEST, [], [DHCP_ACK, DHCP_NAK], timeOut, self.lease['addr'], dest)
+            if reply == None:
+                return None,'No DHCPACK received'
+            # Lease no longer valid, obtain a new one
+            if reply[0] == DHCP_NAK:
+                self.lease = None
+                self.saveLease()
+                return None,'DHCPNAK received'
+            return self.bind(reply),None
+
+        except socket.error, e:
+            return None,'DHCP socket error, %s' % e
+        finally:
+            self.close()
+
+# wwan0 DHCP client instance
+dhcpClient = DhcpClient(sysfsAttrs, stateFile)
+
+# Drain the remaining command output and reap it in the background
+def drainCommand(threadname, out):
+    try:
+        while os.read(out.stdout.fileno(), 4096) != '':
+            pass
+        out.wait()
+    except (IOError, OSError):
+        pass
+    finally:
+        cmdWatchdog.unregister(out)
+        out.stdout.close()
+
+# Launch external command and stream its output under watchdog supervision
+# Each command runs in its own process group so it can be killed together with its children.
+# The output is read line by line, the call return as soon as one of the success or failure
+# patterns matched, the command exit or its deadline passed, whichever come first.
+# After success the command is reaped in the background and still killed by the watchdog
+# when it exceed its deadline.
+def runCommand(cmd, timeout=None, okPatterns=[], failPatterns=[]):
+    if timeout == None:
+        timeout = cmdDeadline.get(cmd[0], defCmdDeadline)
+
+    startTime = monotonicTime()
+    out = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, preexec_fn=os.setsid)
+    out.cmdArgs = cmd
+    cmdWatchdog.register(out, timeout)
+
+    fd = out.stdout.fileno()
+    deadline = monotonicTime() + timeout
+    stdout = ''
+    stderr = None
+    lineBuf = ''
+    result = None
+    while result == None:
+        remain = deadline - monotonicTime()
+        if remain <= 0:
+            result = 'timeout'
+            break
+
+        if not selectRead([fd], remain):
+            continue
+        data = os.read(fd, 4096)
+        # End of output, the last line may not end with new line
+        if data == '':
+            lines = [lineBuf]
+            result = 'exit'
+        else:
+            stdout += data
+            lines = (lineBuf + data).split('\n')
+            lineBuf = lines.pop()
+
+        # Check the output line by line
+        for line in lines:
+            if [p for p in failPatterns if re.search(p, line)]:
+                result = 'failed'
+                stderr = 'Command FAILED: %s' % line.strip()
+                break
+            if [p for p in okPatterns if re.search(p, line)]:
+                result = 'ok'
+                break
+
+    # Command terminated by itself
+    if result == 'exit':
+        out.wait()
+        out.stdout.close()
+        # Command killed by the watchdog, report it as execution error
+        if cmdWatchdog.unregister(out) == True:
+            stderr = 'Command deadline %.3f sec exceeded' % timeout
+            result = 'killed'
+
+    # Success output received, no need to wait for the command to exit
+    elif result == 'ok':
+        thread.start_new_thread(drainCommand, ("[drainCommand]", out))
+
+    # Failure output received or deadline passed, kill the command
+    else:
+        try:
+            os.killpg(out.pid, signal.SIGKILL)
+        except OSError:
+            pass
+        out.wait()
+        out.stdout.close()
+        cmdWatchdog.unregister(out)
+        if result == 'timeout':
+            stderr = 'Command deadline %.3f sec exceeded' % timeout
+
+    endTime = monotonicTime()
+    metrics.observeCmd(cmd[0], endTime - startTime)
+    # Exit code not known yet when returned on success output
+    spanTracer.record(' '.join(cmd), startTime, endTime, out.returncode, result, len(stdout))
+    return stdout,stderr
+
+# Thread to start 4G LTE modem process sequence as soon as the modem arrived after machine boot up
+# The modem is considered arrived once the QMI device and wwan0 exist and the modem report its operating mode.
+# Kernel uevents wake up the check immediately, the 1 minute delay remain as an upper bound.
+def deviceArrival(threadname, maxDelay):
+    global startSys
+
+    startTime = monotonicTime()
+    # Listen to kernel uevents, cdc-wdm0 and wwan0 creation will wake up the check
+    try:
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT)
+        sock.bind((0, 1))
+    except socket.error:
+        sock = None
+
+    while startSys == False:
+        remain = startTime + maxDelay - monotonicTime()
+        # Reach the upper bound, set the 4G LTE modem process sequence flag anyway
+        if remain <= 0:
+            startSys = True
+            log4g.info("DEBUG_4G: Modem arrival NOT detected after %d sec, start 4G LTE modem process sequence" % maxDelay)
+            break
+
+        # Modem enumerated, make sure it respond to QMI request
+        if os.path.exists(qmiDevPath) and sysfsAttrs.present() == True:
+            opMode,qmiErr = qmiClient.getOperatingMode(min(1.0, remain))
+            if qmiErr == None:
                 startSys = True
-                startSysCnt = 0
-                
-        # Increment command timeout counter
-        cmdTimeOutCnt += 1
-        # Check the command timeout flag
-        if cmdTimeOutCnt == 5:
-            cmdTimeOutCnt = 0
-            # After 5 sec, time out flag still not clear, terminate qmicli command
-            if qmcliTimeOut == True:
-                out = subprocess.Popen(["ps aux | grep -v grep | grep qmicli"], shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-                stdout,stderr = out.communicate()
-
-                # NO error after command execution
-                # Response: root      2098  0.0  0.0 200912  5284 pts/0    Sl+  04:42   0:00 qmicli -d /dev/cdc-wdm0 --dms-get-operating-mode
-                if stderr == None:
-                    foundDig = False
-                    pidNo = ''
-                    respLen = len(stdout)
-                    for a in range(0, (respLen + 1)):
-                        oneChar = mid(stdout, a, 1)
-                        # Check PID digit
-                        if oneChar.isdigit():
-                            foundDig = True
-                            pidNo += oneChar
-                        elif foundDig == True and oneChar == ' ':
-                            break
-
-                    # Start KILL the stuck qmicli command
-                    if foundDig == True and pidNo != '':
-                        tempCmd = 'kill -9 ' + pidNo
-                        out = subprocess.Popen([tempCmd], shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-                        stdout,stderr = out.communicate()
-
-                        # NO error after command execution
-                        if stderr == None:
-                            # Clear back qmicli tmeout flag
-                            qmcliTimeOut = False
-                            
-                            # Write to logger
-                            if backLogger == True:
-                                logger.info("DEBUG_QMCLITO: KILL qmicli command SUCCESSFUL")
-                            # Print statement
-                            else:
-                                print "DEBUG_QMCLITO: KILL qmicli command SUCCESSFUL"
-
-            # No qmicli command stuck events occur
+                log4g.info("DEBUG_4G: Modem arrived after %.1f sec, operating mode %d" % (monotonicTime() - startTime, opMode))
+                break
+
+        # Wait for the next uevent, or check again after 1 sec
+        remain = min(1.0, startTime + maxDelay - monotonicTime())
+        if sock != None:
+            if selectRead([sock], remain):
+                sock.recv(8192)
+        else:
+            time.sleep(max(0, remain))
+
+    if sock != None:
+        sock.close()
+
+# Table driven 4G LTE modem lifecycle state machine, shared by qmi-network and qmicli method
+# Each state handler return True - done, False - failed, None - stay in the state, or the next state name.
+# A failed state retried on the next cycle until its retries exhausted or its timeout passed, then move
+# to its failure state. Every transition is timestamped to measure the time spent in each state.
+class LteStateMachine(object):
+    def __init__(self, table, handlers, state):
+        self.table = table          # State -> (timeout, retries, success state, failure state)
+        self.handlers = handlers    # State -> handler, per network option method
+        self.state = state
+        self.enterTime = monotonicTime()
+        self.retryCnt = 0
+        self.linkLost = None        # Link loss event received on the current cycle
+        self.failCause = None       # Last network monitoring failure cause, 'probe' or 'link'
+        self.latency = {}           # State -> last time spent in the state in sec
+        self.history = collections.deque(maxlen=stateHistLen) # (wall clock timestamp, from, to, time spent, cause)
+
+    # Move to the next state and record the transition timestamp
+    def transition(self, nextState, cause):
+        now = monotonicTime()
+        spent = now - self.enterTime
+        self.latency[self.state] = spent
+        self.history.append((time.time(), self.state, nextState, spent, cause))
+
+        log4g.info("DEBUG_4G: STATE %s -> %s after %.3f sec, %s" % (self.state, nextState, spent, cause))
+
+        self.state = nextState
+        self.enterTime = now
+        self.retryCnt = 0
+
+    # Record an event in the transition history without changing the state
+    def event(self, cause):
+        self.history.append((time.time(), self.state, self.state, monotonicTime() - self.enterTime, cause))
+
+        log4g.info("DEBUG_4G: EVENT %s, %s" % (self.state, cause))
+
+    # Run the current state handler once, return True when the state changed
+    def step(self, linkLost=None):
+        self.linkLost = linkLost
+        timeOut,retries,okState,failState = self.table[self.state]
+        result = self.handlers[self.state](self)
+
+        # Handler decide the next state by itself
+        if isinstance(result, str):
+            self.transition(result, 'jump')
+        # State done
+        elif result == True:
+            self.transition(okState, 'done')
+        # Stay too long in the state
+        elif timeOut != None and monotonicTime() - self.enterTime > timeOut:
+            self.transition(failState, 'timeout %.1f sec' % timeOut)
+        # State failed, retry on the next cycle
+        elif result == False:
+            self.retryCnt += 1
+            if self.retryCnt > retries:
+                self.transition(failState, 'failed after %d attempt' % self.retryCnt)
             else:
-                # Write to logger
-                if backLogger == True:
-                    logger.info("DEBUG_QMCLITO: NO qmicli command stuck")
-                # Print statement
-                else:
-                    print "DEBUG_QMCLITO: NO qmicli command stuck"
-    
-# Script entry point
-def main():
-    global backLogger
+                return False
+        else:
+            return False
+        return True
+
+# WAIT_DEVICE: Wait until the modem arrived after machine boot up or recovery reset
+def stateWaitDevice(sm):
+    if startSys == True:
+        return True
+    return None
+
+# SET_RAW_IP: qmi-network method, data format negotiated by qmi-network itself
+def stateQmiNetworkRawIp(sm):
+    # Start measuring time to connect on the first bring-up attempt
+    connectBegin()
+    return True
+
+# SET_RAW_IP: qmicli method, enable OS raw IP mode setting (not persistent)
+# sysfs: Y written to /sys/class/net/wwan0/qmi/raw_ip, wwan0 must be DOWN
+# Reply: Y read back
+def stateQmicliRawIp(sm):
+    # Start measuring time to connect on the first bring-up attempt
+    connectBegin()
+
+    # Wait until wwan0 interface created by the modem driver
+    if waitReady(sysfsAttrs.present, readyTimeOut) == False:
+        log4g.info("DEBUG_4G: Enable RAW IP mode setting FAILED!, wwan0 not exist")
+        return False
+
+    # Network driver without raw IP mode setting, e.g. not qmi_wwan
+    if sysfsAttrs.exists('qmi/raw_ip') == False:
+        log4g.info("DEBUG_4G: RAW IP mode setting not supported by wwan0 driver, skipped")
+        return True
+
+    # Already enabled, e.g. restart after bearer loss, the setting only accepted while wwan0 DOWN
+    if sysfsAttrs.read('qmi/raw_ip') == 'Y':
+        log4g.info("DEBUG_4G: Enable RAW IP mode setting SUCCESSFUL")
+        return True
+
+    # qmi_wwan refuse the setting with EBUSY while wwan0 UP, e.g. left UP by the previous session
+    if ifaceFlags(lteIfName) & IFF_UP != 0 and linkDown() == False:
+        log4g.info("DEBUG_4G: Enable RAW IP mode setting FAILED!, wwan0 still UP")
+        return False
+
+    err = sysfsAttrs.write('qmi/raw_ip', 'Y')
+    # Error during sysfs write or read back
+    if err != None:
+        log4g.info("DEBUG_4G: Enable RAW IP mode setting FAILED!, %s" % err)
+        return False
+
+    log4g.info("DEBUG_4G: Enable RAW IP mode setting SUCCESSFUL")
+    return True
+
+# LINK_UP: Enable wwan0 interface
+# Netlink: RTM_NEWLINK wwan0 IFF_UP
+# Reply: Acknowledgement
+def stateLinkUp(sm):
+    # Wait until wwan0 interface created by the modem driver
+    if waitReady(sysfsAttrs.present, readyTimeOut) == False:
+        log4g.info("DEBUG_4G: Bringing UP interface wwan0 FAILED!, wwan0 not exist")
+        return False
+
+    err = rtNetlink.linkSet(True)
+    # Error during netlink request
+    if err != None:
+        log4g.info("DEBUG_4G: Bringing UP interface wwan0 FAILED!, %s" % err)
+        return False
+
+    log4g.info("DEBUG_4G: Bringing UP interface wwan0 SUCCESSFUL")
+
+    # Wait until wwan0 interface really UP
+    return waitReady(lambda: ifaceFlags(lteIfName) & IFF_UP != 0, readyTimeOut)
+
+# REGISTER: qmi-network method, START the 4G modem
+def stateQmiNetworkStart(sm):
+    stdout,stderr = runCommand(['qmi-network', qmiDevPath, 'start'], okPatterns=qmiNetStartOk, failPatterns=qmiNetStartFail)
+
+    # Network successfully started
+    if stderr == None and 'Network started successfully' in stdout:
+        log4g.info("DEBUG_4G: START 4G modem (qmi-network) SUCCESSFUL")
+        return True
+
+    # Network failed to start or error during command execution
+    log4g.info("DEBUG_4G: START 4G modem (qmi-network) FAILED!, retry on the next cycle...")
+    return False
+
+# REGISTER: qmicli method, make sure the modem online then register the network with APN name
+# QMI: DMS Get/Set Operating Mode, CTL Set Data Format, WDS Start Network
+# Reply: Packet data handle - '2264423824'
+def stateQmicliRegister(sm):
+    opMode,qmiErr = qmiClient.getOperatingMode()
+    # Modem not online yet
+    if qmiErr == None and opMode != QMI_DMS_MODE_ONLINE:
+        qmiErr = qmiClient.setOperatingMode(QMI_DMS_MODE_ONLINE)
+
+    # Raw IP data format without QoS header
+    if qmiErr == None:
+        qmiErr = qmiClient.setDataFormat(True)
+    if qmiErr == None:
+        pktHandle,qmiErr = qmiClient.startNetwork(apnName, apnUser, apnPass)
+
+    # Network started
+    if qmiErr == None:
+        log4g.info("DEBUG_4G: 4G network registration SUCCESSFUL")
+        return True
+
+    # Previously APN registration already successful
+    if qmiErr.code in qmiErrConnected:
+        # Bearer and wwan0 address from the previous session still up, reuse them without DHCP
+        wwanAddr = ifaceAddr(lteIfName)
+        if wwanAddr != None:
+            connectDone()
+            log4g.info("DEBUG_4G: wwan0 address %s still valid, reuse packet data handle %s" % (wwanAddr, qmiClient.pktHandle))
+            probeCadence.reset()
+            return ST_MONITOR
+
+        # wwan0 not configured yet, obtain the address
+        return True
+
+    # Operation failed
+    log4g.info("DEBUG_4G: 4G network registration FAILED!, %s" % qmiErr)
+    return False
+
+# Configure wwan0 address, default route and DNS servers from the DHCP lease, return error
+# Netlink: RTM_GETADDR, then RTM_DELADDR <stale address>, RTM_NEWADDR <address>/<prefix>, RTM_NEWROUTE default via <router> in one batch
+# Reply: Acknowledgement for each message
+def dhcpApply(lease):
+    prefixLen = bin(struct.unpack('!I', socket.inet_aton(lease['mask']))[0]).count('1')
+    current,err = rtNetlink.addrs()
+    if err != None:
+        return err
+
+    # Addresses of the previous lease removed by the script itself, must not be taken as a link loss
+    stale = [a for a in current if a != (lease['addr'], prefixLen)]
+    linkMonitor.expectRemoval([a[0] for a in stale])
+    err = rtNetlink.configure(lease['addr'], prefixLen, lease['router'], stale)
+    if err != None:
+        return err
+
+    if lease['dns']:
+        try:
+            with open(resolvPath, 'w') as f:
+                f.write(''.join(['nameserver %s\n' % a for a in lease['dns']]))
+        except IOError:
+            pass
+    return None
+
+# DHCP: Obtain wwan0 lease with the built-in DHCP client, then configure the address and the default route
+def stateDhcp(sm):
+    startTime = monotonicTime()
+    lease,err = dhcpClient.obtain(dhcpTimeOut)
+    endTime = monotonicTime()
+    metrics.observeCmd('dhcp', endTime - startTime)
+    spanTracer.record('dhcp obtain', startTime, endTime, None, err or 'ok', 0)
+    if err == None:
+        err = dhcpApply(lease)
+
+    # 4G LTE modem initialization with network provider completed
+    if err == None:
+        # Wait until the address configured on wwan0, then report the time to connect
+        waitReady(lambda: ifaceAddr(lteIfName) != None, readyTimeOut)
+        connectDone()
+
+        log4g.info("DEBUG_4G: Obtained public IP address %s, lease time %d sec SUCCESSFUL" % (lease['addr'], lease['leaseTime']))
+        probeCadence.reset()
+        return True
+
+    log4g.info("DEBUG_4G: Obtained public IP address FAILED!, %s" % err)
+    return False
+
+# Renew wwan0 lease ahead of its expiry without touching the bearer, unicast to the lease server from T1,
+# broadcast rebind from T2. Return False once the lease expired or refused by the server.
+def leaseMaintain(sm):
+    lease = dhcpClient.lease
+    if lease == None or dhcpClient.renewRemain() > 0:
+        return True
+
+    now = monotonicTime()
+    if now >= dhcpClient.obtained + lease['leaseTime']:
+        sm.event('DHCP lease %s expired' % lease['addr'])
+        return False
+
+    rebind = now >= dhcpClient.obtained + lease['t2']
+    newLease,err = dhcpClient.renew(dhcpRebootTimeOut, rebind)
+    endTime = monotonicTime()
+    metrics.observeCmd('dhcp-renew', endTime - now)
+    spanTracer.record('dhcp %s' % ['renew', 'rebind'][rebind], now, endTime, None, err or 'ok', 0)
+    # Server may give a different address on rebind
+    if err == None and newLease['addr'] != lease['addr']:
+        err = dhcpApply(newLease)
+
+    if err == None:
+        sm.event('DHCP lease %s renewed, lease time %d sec' % (newLease['addr'], newLease['leaseTime']))
+        return True
+
+    sm.event('DHCP lease %s %s FAILED!, %s' % (lease['addr'], ['renew', 'rebind'][rebind], err))
+    if dhcpClient.lease == None:
+        return False
+    dhcpClient.renewFailed()
+    return True
+
+# MONITOR: Check the 4G network on the adaptive probe cadence, failed once the network lost probeFailLimit
+# times in a row or wwan0 link lost. Active probe only sent when wwan0 received nothing since the last check.
+def stateMonitor(sm):
     global lteModemStat
     global pingAttempt
-    global machineBoot
-    global qmcliTimeOut
-    global restart4gModem
+
+    # wwan0 lease expired or refused, obtain a new lease, the bearer still up
+    if leaseMaintain(sm) == False:
+        metrics.reconnect('lease')
+        return ST_DHCP
+
+    # wwan0 link state read from sysfs without forking, catch link loss missed by the netlink listener
+    # (e.g. events dropped on netlink socket buffer overrun)
+    if sm.linkLost == None:
+        operState,carrier = sysfsAttrs.linkState()
+        if operState in (None, 'down', 'lowerlayerdown') or carrier == '0':
+            sm.linkLost = '%s link down (sysfs operstate %s, carrier %s)' % (lteIfName, operState, carrier)
+
+    # Not the time to probe yet
+    if sm.linkLost == None and probeCadence.remain() > 0:
+        return None
+
+    # Application traffic received through wwan0 since the last check, no need to probe the network
+    # While recovering only a real probe reply prove the recovery worked
+    if sm.linkLost == None and recoveryLadder.failTime == None and trafficCounters.rxGrowing() == True:
+        pingAttempt = 0
+        lteModemStat = True
+        trafficCounters.skipCnt += 1
+        probeCadence.passive()
+        recoveryLadder.recovered()
+        return None
+
+    # wwan0 link already lost, no need to probe the network
+    if sm.linkLost != None:
+        pingResult = dict.fromkeys(pingTargets)
+    # Send ICMP echo request to all probe targets concurrently through wwan0
+    else:
+        pingResult = icmpProber.probeMany(pingTargets, probeTimeOut)
+        # Echo replies are not application traffic, exclude them from the next RX growth check
+        trafficCounters.last = trafficCounters.read()
+        for rtt in pingResult.values():
+            if rtt != None:
+                metrics.probeRtt.observe(rtt)
+    pingRtt = sorted([a for a in pingResult.values() if a != None])
+    pingFailed = [a for a in pingTargets if pingResult[a] == None]
+    if pingRtt:
+        probeCadence.update(len(pingFailed), pingRtt[len(pingRtt) / 2])
+    else:
+        probeCadence.update(len(pingFailed), None)
+
+    # 4G network OK, failed targets below the quorum
+    if len(pingFailed) < probeQuorum:
+        pingAttempt = 0
+        lteModemStat = True
+        recoveryLadder.recovered()
+        # Last good RTT, written to disk together with the next state update
+        stateFile.update('rtt', pingRtt[len(pingRtt) / 2], False)
+
+        # Hot path, the message only formatted when the debug level enabled
+        log4g.debug("DEBUG_4G: 4G network OK, %d/%d targets replied, RTT %.1f ms, loss %.1f%%", \
+            len(pingRtt), len(pingTargets), pingRtt[len(pingRtt) / 2] * 1000, icmpProber.lossPct())
+        return None
+
+    # 4G network FAILED!
+    # Increment attempt to check 4G network by pinging process
+    pingAttempt += 1
+
+    log4g.info("DEBUG_4G: PING %s lost, attempt %d, loss %.1f%%" % (','.join(pingFailed), pingAttempt, icmpProber.lossPct()))
+
+    # After checking probeFailLimit times or wwan0 link lost, still 4G network failed, start the recovery
+    # While recovering, escalate to the next recovery rung sooner
+    if recoveryLadder.failTime != None:
+        pingLimit = recoverVerify
+    else:
+        pingLimit = probeFailLimit
+    if pingAttempt >= pingLimit or sm.linkLost != None:
+        pingAttempt = 0
+        lteModemStat = False
+        if sm.linkLost != None:
+            sm.failCause = 'link'
+        else:
+            sm.failCause = 'probe'
+
+        # Restart triggered by netlink event
+        if sm.linkLost != None:
+            log4g.info("DEBUG_4G: Netlink event, %s" % sm.linkLost)
+
+        log4g.info("DEBUG_4G: PING %s FAILED!, Initiate recovery process for 4G LTE modem..." % ','.join(pingFailed))
+        return False
+
+    return None
+
+# Bring wwan0 interface DOWN and wait until it really DOWN
+# Netlink: RTM_NEWLINK wwan0 ~IFF_UP
+# Reply: Acknowledgement
+def linkDown():
+    err = rtNetlink.linkSet(False)
+    # Error during netlink request
+    if err != None:
+        log4g.info("DEBUG_4G: Bringing DOWN interface wwan0 FAILED!, %s" % err)
+        return False
+
+    log4g.info("DEBUG_4G: Bringing DOWN interface wwan0 SUCCESSFUL")
+
+    waitReady(lambda: ifaceFlags(lteIfName) & IFF_UP == 0, readyTimeOut)
+    return True
+
+# TEARDOWN: qmi-network method, bring wwan0 DOWN then STOP the 4G modem
+def stateQmiNetworkStop(sm):
+    if linkDown() == False:
+        return False
+
+    stdout,stderr = runCommand(['qmi-network', qmiDevPath, 'stop'], okPatterns=qmiNetStopOk)
+
+    # Network successfully stop
+    if stderr == None and 'Network stopped successfully' in stdout:
+        log4g.info("DEBUG_4G: STOP 4G modem (qmi-network) SUCCESSFUL")
+        return True
+
+    # Network failed to stop or error during command execution
+    log4g.info("DEBUG_4G: STOP 4G modem (qmi-network) FAILED!, retry on the next cycle...")
+    return False
+
+# TEARDOWN: qmicli method, make sure the modem still responding then bring wwan0 DOWN
+def stateQmicliStop(sm):
+    # QMI: DMS Get Operating Mode
+    opMode,qmiErr = qmiClient.getOperatingMode()
+
+    # Operation failed
+    if qmiErr != None:
+        log4g.info("DEBUG_4G: STOP 4G LTE modem FAILED!, %s" % qmiErr)
+        return False
+
+    if linkDown() == False:
+        return False
+
+    log4g.info("DEBUG_4G: STOP 4G LTE modem SUCCESSFUL, initiate 4G LTE modem...")
+    return True
+
+# Find the modem USB device or PCI function bound to its driver, walking up from the network interface device
+# Return (device sysfs path, driver sysfs path), None when not found
+def modemBusDevice(attrs):
+    path = os.path.realpath(attrs.path('device'))
+    while path.startswith('/sys/devices/'):
+        drvPath = os.path.join(path, 'driver')
+        if os.path.islink(drvPath):
+            drvPath = os.path.realpath(drvPath)
+            subsys = os.path.basename(os.path.realpath(os.path.join(path, 'subsystem')))
+            # USB device (not the interface) or PCI function
+            if os.path.basename(drvPath) == 'usb' or subsys == 'pci':
+                return path,drvPath
+        path = os.path.dirname(path)
+    return None,None
+
+# Modem gone (reset or unbind), wait for its arrival again before the next bring-up
+def restartArrival():
     global startSys
+
+    startSys = False
+    try:
+        thread.start_new_thread(deviceArrival, ("[deviceArrival]", startSysDelay))
+    except:
+        # Unable to wait for the modem, start 4G LTE modem process sequence on the next cycle
+        startSys = True
+        logMain.error("THREAD_ERROR: Unable to start [deviceArrival] thread")
+
+# Recovery rung 1: DHCP renew of the current wwan0 lease
+def recoverDhcpRenew(ladder):
+    startTime = monotonicTime()
+    lease,err = dhcpClient.renew(dhcpRebootTimeOut, True)
+    endTime = monotonicTime()
+    metrics.observeCmd('dhcp-renew', endTime - startTime)
+    spanTracer.record('dhcp rebind', startTime, endTime, None, err or 'ok', 0)
+    if err == None:
+        err = dhcpApply(lease)
+    return err == None
+
+# Recovery rung 2: Restart the WDS bearer only, the modem and wwan0 stay up
+def recoverWdsRestart(ladder):
+    # Using qmi-network CLI
+    if quectelOpt == True:
+        runCommand(['qmi-network', qmiDevPath, 'stop'], okPatterns=qmiNetStopOk)
+        stdout,stderr = runCommand(['qmi-network', qmiDevPath, 'start'], okPatterns=qmiNetStartOk, failPatterns=qmiNetStartFail)
+        return stderr == None and 'Network started successfully' in stdout
+
+    # Using qmicli method
+    # QMI: WDS Stop Network, WDS Start Network
+    if qmiClient.pktHandle != None:
+        qmiClient.stopNetwork(qmiClient.pktHandle)
+    pktHandle,qmiErr = qmiClient.startNetwork(apnName, apnUser, apnPass)
+    return qmiErr == None or qmiErr.code in qmiErrConnected
+
+# Recovery rung 3: Operating mode low power then online, the modem drop and register the network again
+# QMI: DMS Set Operating Mode - low power, online
+def recoverOpModeCycle(ladder):
+    qmiErr = qmiClient.setOperatingMode(QMI_DMS_MODE_LOW_POWER)
+    if qmiErr == None:
+        qmiErr = qmiClient.setOperatingMode(QMI_DMS_MODE_ONLINE)
+    return qmiErr == None
+
+# Recovery rung 4: Reset the modem, wait until it disappear then for its arrival
+# QMI: DMS Set Operating Mode - reset
+def recoverModemReset(ladder):
+    qmiErr = qmiClient.setOperatingMode(QMI_DMS_MODE_RESET)
+    if qmiErr != None:
+        return False
+
+    waitReady(lambda: not os.path.exists(qmiDevPath), readyTimeOut)
+    restartArrival()
+    return True
+
+# Recovery rung 5: Unbind then rebind the modem USB device or PCI function from its driver
+def recoverBusRebind(ladder):
+    if ladder.busDev == None:
+        return False
+
+    devPath,drvPath = ladder.busDev
+    devName = os.path.basename(devPath)
+    err = sysfsAttrs.write(drvPath + '/unbind', devName, False)
+    if err == None:
+        waitReady(lambda: not os.path.exists(qmiDevPath), readyTimeOut)
+        err = sysfsAttrs.write(drvPath + '/bind', devName, False)
+    if err != None:
+        log4g.info("DEBUG_4G: Modem %s rebind FAILED!, %s" % (devName, err))
+        return False
+
+    restartArrival()
+    return True
+
+# Recovery escalation ladder, the cheapest recovery action tried first
+# The next rung only tried when the previous one did not bring the 4G network back, the time to recover
+# measured from the first failure until the network OK again and accounted to the last rung tried.
+class RecoveryLadder(object):
+    def __init__(self, rungs):
+        self.rungs = rungs          # [(rung name, action, resume state)]
+        self.rung = 0               # Last rung tried, 0 - not recovering
+        self.failTime = None        # First failure timestamp of the current outage
+        self.busDev = None          # Modem bus device, resolved while wwan0 still exist
+        self.mttr = {}              # Rung name -> [recovered count, total time to recover in sec]
+        self.attempt = 0            # Recovery attempts since the last recovered
+        self.tryCnt = {}            # Rung name -> total times tried
+        self.nextTry = 0.0          # Earliest timestamp for the next recovery attempt
+        self.delay = 0.0            # Last backoff delay in sec
+
+    # Time left before the next recovery attempt allowed in sec
+    def remain(self):
+        return max(0.0, self.nextTry - monotonicTime())
+
+    # Schedule the next recovery attempt, exponential backoff with random jitter
+    # The first attempt of an outage not delayed
+    def backoff(self):
+        self.delay = min(backoffBase * (2 ** (self.attempt - 1)), backoffMax)
+        self.delay *= 1.0 - backoffJitter * random.random()
+        self.nextTry = monotonicTime() + self.delay
+
+    # Try the next rung, not cheaper than minRung, return the state to resume from
+    def escalate(self, minRung):
+        if self.failTime == None:
+            self.failTime = monotonicTime()
+        self.attempt += 1
+        self.backoff()
+        busDev = modemBusDevice(sysfsAttrs)
+        if busDev[0] != None:
+            self.busDev = busDev
+
+        while True:
+            self.rung = min(max(self.rung + 1, minRung), len(self.rungs))
+            name,action,resumeState = self.rungs[self.rung - 1]
+            self.tryCnt[name] = self.tryCnt.get(name, 0) + 1
+            result = action(self)
+            self.saveState()
+
+            log4g.info("DEBUG_4G: RECOVERY rung %d (%s) %s" % (self.rung, name, ['FAILED!', 'SUCCESSFUL'][result]))
+
+            # Action done, or nothing more expensive left to try
+            if result == True or self.rung == len(self.rungs):
+                return resumeState
+
+    # 4G network OK again, account the time to recover to the last rung tried
+    def recovered(self):
+        if self.failTime == None:
+            return
+
+        name = self.rungs[self.rung - 1][0]
+        stat = self.mttr.setdefault(name, [0, 0.0])
+        stat[0] += 1
+        spent = monotonicTime() - self.failTime
+        stat[1] += spent
+
+        log4g.info("DEBUG_4G: RECOVERED by rung %d (%s) after %.1f sec, mean %.1f sec over %d" % \
+            (self.rung, name, spent, stat[1] / stat[0], stat[0]))
+
+        self.rung = 0
+        self.failTime = None
+        self.attempt = 0
+        self.nextTry = 0.0
+        self.delay = 0.0
+        self.saveState()
+
+    # Restore the recovery counters from the previous daemon instance
+    def loadState(self):
+        try:
+            data = stateFile.get('recovery')
+            self.tryCnt = dict(data['tryCnt'])
+            self.mttr = dict(data['mttr'])
+        except (KeyError, TypeError, ValueError):
+            pass
+
+    # Keep the recovery counters in the session state file
+    def saveState(self):
+        stateFile.update('recovery', {'tryCnt': self.tryCnt, 'mttr': self.mttr})
+
+    # Mean time to recover per rung in sec
+    def meanTime(self):
+        return dict([(a, b[1] / b[0]) for a,b in self.mttr.items()])
+
+recoveryLadder = RecoveryLadder([('dhcp-renew',   recoverDhcpRenew,   ST_MONITOR),
+                                 ('wds-restart',  recoverWdsRestart,  ST_DHCP),
+                                 ('opmode-cycle', recoverOpModeCycle, ST_TEARDOWN),
+                                 ('modem-reset',  recoverModemReset,  ST_TEARDOWN),
+                                 ('bus-rebind',   recoverBusRebind,   ST_TEARDOWN)])
+
+# RECOVER: Escalate the recovery ladder, starting from the rung that match the failed state
+def stateRecover(sm):
+    # Restart attempts back off, a dead cell tower should not restart the modem in a tight loop
+    if recoveryLadder.remain() > 0:
+        return None
+
+    failedState = sm.history[-1][1]
+    if failedState == ST_MONITOR:
+        metrics.reconnect(sm.failCause)
+    else:
+        metrics.reconnect(failedState.lower())
+    return recoveryLadder.escalate(recoverMinRung.get(failedState, 1))
+
+# Per network option method state handlers
+qmiNetworkSteps = {ST_WAIT_DEVICE : stateWaitDevice,
+                   ST_SET_RAW_IP  : stateQmiNetworkRawIp,
+                   ST_LINK_UP     : stateLinkUp,
+                   ST_REGISTER    : stateQmiNetworkStart,
+                   ST_DHCP        : stateDhcp,
+                   ST_MONITOR     : stateMonitor,
+                   ST_RECOVER     : stateRecover,
+                   ST_TEARDOWN    : stateQmiNetworkStop}
+qmicliSteps     = {ST_WAIT_DEVICE : stateWaitDevice,
+                   ST_SET_RAW_IP  : stateQmicliRawIp,
+                   ST_LINK_UP     : stateLinkUp,
+                   ST_REGISTER    : stateQmicliRegister,
+                   ST_DHCP        : stateDhcp,
+                   ST_MONITOR     : stateMonitor,
+                   ST_RECOVER     : stateRecover,
+                   ST_TEARDOWN    : stateQmicliStop}
+
+# 4G LTE modem state machine, start from the modem arrival unless the live session adopted at startup
+# State handlers of the network option method chosen by setup
+lteState = LteStateMachine(lteStateTable, qmicliSteps, ST_WAIT_DEVICE)
+
+# Check whether the 4G network from the previous daemon instance still alive, return the reason when not
+# The bearer must be up (WDS packet service status), wwan0 configured and the probe targets reachable
+def adoptCheck():
+    connStat,qmiErr = qmiClient.getPacketServiceStatus(adoptTimeOut)
+    if qmiErr != None:
+        return 'WDS packet service status, %s' % qmiErr
+    if connStat != QMI_WDS_CONNECTED:
+        return 'bearer not connected'
+
+    wwanAddr = ifaceAddr(lteIfName)
+    if wwanAddr == None:
+        return 'wwan0 address not configured'
+
+    pingResult = icmpProber.probeMany(pingTargets, probeTimeOut)
+    pingFailed = [a for a in pingTargets if pingResult[a] == None]
+    if len(pingFailed) >= probeQuorum:
+        return 'PING %s FAILED!' % ','.join(pingFailed)
+    return None
+
+# Daemon status output, current state and every probe cadence and restart backoff knob
+def statusReport():
+    return {'time'          : time.time(),
+            'state'         : lteState.state,
+            'stateTime'     : monotonicTime() - lteState.enterTime,
+            'stateLatency'  : lteState.latency,
+            'connected'     : lteModemStat,
+            'lastConnectTime' : lastConnectTime,
+            'probe'         : {'targets'     : pingTargets,
+                               'quorum'      : probeQuorum,
+                               'timeOut'     : probeTimeOut,
+                               'interval'    : probeCadence.interval,
+                               'minInterval' : probeCadence.minInterval,
+                               'maxInterval' : probeCadence.maxInterval,
+                               'relax'       : probeCadence.relax,
+                               'rttDegrade'  : probeCadence.rttDegrade,
+                               'rttAvg'      : probeCadence.rttAvg,
+                               'failLimit'   : probeFailLimit,
+                               'failCnt'     : pingAttempt,
+                               'lossPct'     : icmpProber.lossPct(),
+                               'passiveSkip' : trafficCounters.skipCnt,
+                               'counters'    : trafficCounters.last,
+                               'link'        : dict(zip(['operstate', 'carrier'], sysfsAttrs.linkState()))},
+            'recovery'      : {'rung'        : recoveryLadder.rung,
+                               'attempt'     : recoveryLadder.attempt,
+                               'verify'      : recoverVerify,
+                               'backoffBase' : backoffBase,
+                               'backoffMax'  : backoffMax,
+                               'backoffJitter' : backoffJitter,
+                               'backoffDelay' : recoveryLadder.delay,
+                               'nextTry'     : recoveryLadder.remain(),
+                               'mttr'        : recoveryLadder.meanTime()},
+            'dhcp'          : dhcpClient.lease,
+            'dhcpRenewIn'   : dhcpClient.renewRemain(),
+            'recoveryTryCnt' : recoveryLadder.tryCnt,
+            'cmdKillCnt'    : cmdWatchdog.killCnt}
+
+# Write the daemon status output, replace the previous one atomically
+def writeStatus():
+    data = json.dumps(statusReport(), sort_keys=True)
+    try:
+        with open(statusPath + '.tmp', 'w') as f:
+            f.write(data)
+        os.rename(statusPath + '.tmp', statusPath)
+    except IOError, e:
+        data = 'unable to write %s, %s' % (statusPath, e)
+
+    log4g.info("DEBUG_4G: STATUS %s" % data)
+
+# Metrics exporter, HTTP on TCP host:port or plain text on unix socket path (written on connect)
+# HTTP GET /spans return the tracing spans instead
+class MetricsServer(object):
+    def __init__(self, addr):
+        self.addr = addr
+        self.sock = None
+
+    def open(self):
+        # Unix socket, filesystem path or abstract name
+        if self.addr.startswith('/') or self.addr.startswith('@'):
+            path = self.addr.replace('@', '\0', 1)
+            if self.addr.startswith('/') and os.path.exists(path):
+                os.unlink(path)
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.bind(path)
+        else:
+            host,port = self.addr.rsplit(':', 1)
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.sock.bind((host, int(port)))
+        self.sock.listen(4)
+
+    # Answer one scrape
+    def serve(self, conn):
+        conn.settimeout(metricsTimeOut)
+        if conn.family == socket.AF_UNIX:
+            conn.sendall(metrics.render())
+            return
+
+        # Read the HTTP request header, only GET supported
+        req = ''
+        while '\r\n\r\n' not in req and '\n\n' not in req and len(req) < 4096:
+            data = conn.recv(1024)
+            if data == '':
+                break
+            req += data
+        if not req.startswith('GET '):
+            conn.sendall('HTTP/1.0 405 Method Not Allowed\r\nContent-Length: 0\r\n\r\n')
+            return
+        # Tracing spans as JSON lines, metrics otherwise
+        if req.split(' ')[1].startswith('/spans'):
+            body = spanTracer.dump()
+        else:
+            body = metrics.render()
+        conn.sendall('HTTP/1.0 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\nContent-Length: %d\r\n\r\n%s' % \
+                     (len(body), body))
+
+    def run(self, threadname):
+        while True:
+            try:
+                if self.sock == None:
+                    self.open()
+                conn,addr = self.sock.accept()
+            except socket.error, e:
+                # Interrupted by the user signals
+                if e.args[0] == errno.EINTR:
+                    continue
+                logMain.info("DEBUG_METRICS: Metrics exporter %s FAILED!, %s, retry..." % (self.addr, e))
+                if self.sock != None:
+                    self.sock.close()
+                    self.sock = None
+                time.sleep(metricsRetryDelay)
+                continue
+
+            try:
+                self.serve(conn)
+            except socket.error:
+                pass
+            finally:
+                conn.close()
+
+# Metrics exporter instance
+metricsServer = MetricsServer(metricsAddr)
+
+# Write the tracing spans as JSON lines, replace the previous dump atomically
+def writeSpans():
+    try:
+        with open(spanPath + '.tmp', 'w') as f:
+            f.write(spanTracer.dump())
+        os.rename(spanPath + '.tmp', spanPath)
+        log4g.info("DEBUG_4G: %d tracing spans written to %s" % (len(spanTracer.spans), spanPath))
+    except (IOError, OSError), e:
+        log4g.info("DEBUG_4G: Write tracing spans FAILED!, %s" % e)
+
+# Apply the macros to the module instances and load the session state of the previous daemon instance
+# Only done when run as the daemon, importing the module (tests, simulator) never touch the state file
+def setup():
+    global logTarget
+
+    # Log file instead of the console
+    if backLogger == True:
+        logTarget = logging.handlers.TimedRotatingFileHandler('/tmp/ltemodem.log', when="midnight", backupCount=3)
+        logTarget.setFormatter(logging.Formatter('%(asctime)s %(levelname)-8s %(message)s'))
+        logListener.handler = logTarget
+
+    # Per module log level
+    for name,level in logLevels.items():
+        if name == '':
+            logger = logMain
+        else:
+            logger = logging.getLogger('ltemodem.' + name)
+        logger.setLevel(getattr(logging, level.upper(), logging.INFO))
+
+    stateFile.path = statePath
+    stateFile.load()
+    probeCadence.rttAvg = stateFile.get('rtt')
+    qmiClient.transport.devPath = qmiDevPath
+    # qmi-network method (QUECTOPT) run qmicli on the same modem, only go through qmi-proxy (PROXY=yes in
+    # /etc/qmi-network.conf start it)
+    qmiClient.transport.proxyOnly = quectelOpt
+    qmiClient.loadClients()
+    dhcpClient.loadLease()
+    recoveryLadder.loadState()
+    metricsServer.addr = metricsAddr
+
+    # State handlers per network option method
+    if quectelOpt == True:
+        lteState.handlers = qmiNetworkSteps
+    else:
+        lteState.handlers = qmicliSteps
+
+# Script entry point
+def main():
     global quectelOpt
-    global publicIpAddr
+    global startSys
+    global statusReq
+    global spanReq
+    global lteModemStat
+
+    # Create log listener thread first, every log record written by this thread
+    # Unable to start, write the log records directly by the caller
+    try:
+        thread.start_new_thread(logListener.run, ("[logListener]",))
+    except:
+        logMain.removeHandler(logHandler)
+        logMain.addHandler(logTarget)
+        logMain.error("THREAD_ERROR: Unable to start [logListener] thread")
+
+    # Create command watchdog thread, kill any external command that exceed its deadline
+    try:
+        thread.start_new_thread(cmdWatchdog.run, ("[cmdWatchdog]",))
+    except:
+        logMain.error("THREAD_ERROR: Unable to start [cmdWatchdog] thread")
+
+    # Create rtnetlink listener thread, wake up the main loop immediately on wwan0 link or address loss
+    try:
+        thread.start_new_thread(linkMonitor.run, ("[linkMonitor]",))
+    except:
+        logMain.error("THREAD_ERROR: Unable to start [linkMonitor] thread")
+
+    # Create metrics exporter thread
+    if metricsAddr != '':
+        try:
+            thread.start_new_thread(metricsServer.run, ("[metricsServer]",))
+        except:
+            logMain.error("THREAD_ERROR: Unable to start [metricsServer] thread")
+
+    # Create QMI client reader thread, it also deliver WDS indication to restart the 4G network as soon as the bearer goes down
+    try:
+        thread.start_new_thread(qmiClient.run, ("[qmiClient]",))
+    except:
+        logMain.error("THREAD_ERROR: Unable to start [qmiClient] thread")
 
     # Only start this thread when using qmicli method
     if quectelOpt == False:
-        # Create thread to get battery status 
+        # Create thread to start 4G LTE modem process sequence once the modem arrived after boot up
         try:
-            thread.start_new_thread(commandTimeOut, ("[commandTimeOut]", 1 ))
+            thread.start_new_thread(deviceArrival, ("[deviceArrival]", startSysDelay))
         except:
-            # Write to logger
-            if backLogger == True:
-                logger.info("THREAD_ERROR: Unable to start [commandTimeOut] thread")
-            # Print statement
-            else:
-                print "THREAD_ERROR: Unable to start [commandTimeOut] thread"
-            
+            logMain.error("THREAD_ERROR: Unable to start [deviceArrival] thread")
+
+    # qmi-network method start 4G LTE modem process sequence right away
+    else:
+        startSys = True
+
+    # Daemon restarted while the 4G network still up, adopt the live session without touching it
+    reason = adoptCheck()
+    if reason == None:
+        lteModemStat = True
+        probeCadence.reset()
+        lteState.transition(ST_MONITOR, 'live session adopted, wwan0 address %s' % ifaceAddr(lteIfName))
+    # Previous session not usable, full bring-up
+    else:
+        log4g.info("DEBUG_4G: Live session NOT adopted, %s" % reason)
+
     # Forever loop
     while True:
-        # loop every 1s only
-        time.sleep(1)
-
-        # After 1 minute, start 4G LTE modem process sequence
-        if startSys == True or quectelOpt == True:
-            # The machine are previously booting up or shutdown
-            # Run the first initialization of 4G LTE modem
-            if machineBoot == True:
-                # Check for the network option method
-                # Using qmi-network CLI
-                if quectelOpt == True:
-                    # START the 4G modem
-                    #out = subprocess.Popen(['qmi-network', '/dev/cdc-wdm1', 'start'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-                    out = subprocess.Popen(['qmi-network', '/dev/cdc-wdm0', 'start'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-                    stdout,stderr = out.communicate()
-                    
-                    # NO error after command execution
-                    if stderr == None:
-                        # Network successfully started
-                        if 'Network started successfully' in stdout:
-                            # Write to logger
-                            if backLogger == True:
-                                logger.info("DEBUG_4G: PROC-START-BOOT[01]-START 4G modem (qmi-network) SUCCESSFUL")
-                            # Print statement
-                            else:
-                                print "DEBUG_4G: PROC-START-BOOT[01]-START 4G modem (qmi-network) SUCCESSFUL"
-
-                            # Wait before execute another command
-                            time.sleep(1)
-
-                            # Enable wwan0 interface
-                            # Command: ifconfig wwan0 up
-                            # Reply: NA 
-                            out = subprocess.Popen(['ifconfig', 'wwan0', 'up'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-                            stdout,stderr = out.communicate() 
-                            
-                            # NO error after command execution
-                            if stderr == None:
-                                # Write to logger
-                                if backLogger == True:
-                                    logger.info("DEBUG_4G: PROC-START-BOOT[02]-Bringing UP interface wwan0 SUCCESSFUL")
-                                # Print statement
-                                else:
-                                    print "DEBUG_4G: PROC-START-BOOT[02]-Bringing UP interface wwan0 SUCCESSFUL"
-
-                                # Wait before execute another command
-                                time.sleep(1)
-
-                                # Finally, configure the IP address and the default route with udhcpc
-                                # Command: udhcpc -i wwan0
-                                # Reply:
-                                # udhcpc: sending discover
-                                # udhcpc: sending select for 183.171.144.62
-                                # udhcpc: lease of 183.171.144.62 obtained, lease time 7200
-                                out = subprocess.Popen(['udhcpc', '-i', 'wwan0'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-                                stdout,stderr = out.communicate()
-
-                                # NO error after command execution
-                                if stderr == None:
-                                    publicIpAddr += ' obtained'
-                                    # 4G LTE modem initialization with network provider completed
-                                    if publicIpAddr in stdout:
-                                        # Set flag to indicate 4G LTE modem first initialization completed
-                                        machineBoot = False
-                                        
-                                        # Write to logger
-                                        if backLogger == True:
-                                            logger.info("DEBUG_4G: PROC-START-BOOT[03]-Obtained public IP address SUCCESSFUL")
-                                        # Print statement
-                                        else:
-                                            print "DEBUG_4G: PROC-START-BOOT[03]-Obtained public IP address SUCCESSFUL"
-
-                                # Error during command execution
-                                else:
-                                    # Write to logger
-                                    if backLogger == True:
-                                        logger.info("DEBUG_4G: PROC-START-BOOT[03]-Obtained public IP address FAILED!, restart LTE network initiation process...")
-                                    # Print statement
-                                    else:
-                                        print "DEBUG_4G: PROC-START-BOOT[03]-Obtained public IP address FAILED!, restart LTE network initiation process..."
-
-                                    # Wait before execute another command
-                                    time.sleep(1)
-
-                                    # Start shutdown wwan0 interface
-                                    out = subprocess.Popen(['ifconfig', 'wwan0', 'down'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-                                    stdout,stderr = out.communicate()
-
-                                    # NO error after command execution
-                                    if stderr == None:
-                                        # Write to logger
-                                        if backLogger == True:
-                                            logger.info("DEBUG_4G: PROC-END-BOOT[01]-Bringing DOWN interface wwan0 SUCCESSFULL")
-                                        # Print statement
-                                        else:
-                                            print "DEBUG_4G: PROC-END-BOOT[01]-Bringing DOWN interface wwan0 SUCCESSFULL"
-                                        
-                                        # Wait before execute another command
-                                        time.sleep(1)
-                                    
-                                        # Shutdown qmi network
-                                        out = subprocess.Popen(['qmi-network', '/dev/cdc-wdm0', 'stop'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-                                        stdout,stderr = out.communicate()
-
-                                        # NO error after command execution
-                                        if stderr == None:
-                                            # Network successfully stop
-                                            if 'Network stopped successfully' in stdout:
-                                                # Write to logger
-                                                if backLogger == True:
-                                                    logger.info("DEBUG_4G: PROC-END-BOOT[02]-STOP 4G modem (qmi-network) SUCCESSFULL")
-                                                # Print statement
-                                                else:
-                                                    print "DEBUG_4G: PROC-END-BOOT[02]-STOP 4G modem (qmi-network) SUCCESSFULL"
-
-                                            # Network failed to stop
-                                            else:
-                                                # Write to logger
-                                                if backLogger == True:
-                                                    logger.info("DEBUG_4G: PROC-END-BOOT[02]-STOP 4G modem (qmi-network) FAILED!")
-                                                # Print statement
-                                                else:
-                                                    print "DEBUG_4G: PROC-END-BOOT[02]-STOP 4G modem (qmi-network) FAILED!"
-
-                                        # Error during command execution
-                                        else:
-                                            # Write to logger
-                                            if backLogger == True:
-                                                logger.info("DEBUG_4G: PROC-END-BOOT[01]-STOP 4G modem (qmi-network), execution ERROR")
-                                            # Print statement
-                                            else:
-                                                print "DEBUG_4G: PROC-END-BOOT[01]-STOP 4G modem (qmi-network), execution ERROR"
-
-                                    # Command execution error
-                                    else:
-                                        # Write to logger
-                                        if backLogger == True:
-                                            logger.info("DEBUG_4G: PROC-END-BOOT[01]-Bringing DOWN interface wwan0 FAILED!, execution ERROR")
-                                        # Print statement
-                                        else:
-                                            print "DEBUG_4G: PROC-END-BOOT[01]-Bringing DOWN interface wwan0 FAILED!, execution ERROR"
-                                        
-                            # Error during command execution - out = subprocess.Popen(['ifconfig', 'wwan0', 'up'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-                            else:
-                                # Write to logger
-                                if backLogger == True:
-                                    logger.info("DEBUG_4G: PROC-START-BOOT[02]-Bringing UP interface wwan0 FAILED!, restart LTE network initiation process...")
-                                # Print statement
-                                else:
-                                    print "DEBUG_4G: PROC-START-BOOT[02]-Bringing UP interface wwan0 FAILED!, restart LTE network initiation process..."
-
-                                # Wait before execute another command
-                                time.sleep(1)
-
-                                # Shutdown qmi network
-                                out = subprocess.Popen(['qmi-network', '/dev/cdc-wdm0', 'stop'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-                                stdout,stderr = out.communicate()
-
-                                # NO error after command execution
-                                if stderr == None:
-                                    # Network successfully stop
-                                    if 'Network stopped successfully' in stdout:
-                                        # Write to logger
-                                        if backLogger == True:
-                                            logger.info("DEBUG_4G: PROC-END-BOOT[01]-STOP 4G modem (qmi-network) SUCCESSFULL")
-                                        # Print statement
-                                        else:
-                                            print "DEBUG_4G: PROC-END-BOOT[01]-STOP 4G modem (qmi-network) SUCCESSFULL"
-
-                                    # Network failed to stop
-                                    else:
-                                        # Write to logger
-                                        if backLogger == True:
-                                            logger.info("DEBUG_4G: PROC-END-BOOT[01]-STOP 4G modem (qmi-network) FAILED!")
-                                        # Print statement
-                                        else:
-                                            print "DEBUG_4G: PROC-END-BOOT[01]-STOP 4G modem (qmi-network) FAILED!"
-                                        
-                                # Error during command execution
-                                else:
-                                    # Write to logger
-                                    if backLogger == True:
-                                        logger.info("DEBUG_4G: PROC-END-BOOT[01]-STOP 4G modem (qmi-network), execution ERROR")
-                                    # Print statement
-                                    else:
-                                        print "DEBUG_4G: PROC-END-BOOT[01]-STOP 4G modem (qmi-network), execution ERROR"
-                                    
-                        # Network failed to start
-                        else:
-                            # Write to logger
-                            if backLogger == True:
-                                logger.info("DEBUG_4G: PROC-START-BOOT[01]-START 4G modem (qmi-network) FAILED!, retry on the next cycle...")
-                            # Print statement
-                            else:
-                                print "DEBUG_4G: PROC-START-BOOT[01]-START 4G modem (qmi-network) FAILED!, retry on the next cycle..."       
-
-                    # Error during command execution
-                    else:
-                        # Write to logger
-                        if backLogger == True:
-                            logger.info("DEBUG_4G: PROC-START-BOOT[01]-START 4G modem (qmi-network) FAILED!, retry on the next cycle...")
-                        # Print statement
-                        else:
-                            print "DEBUG_4G: PROC-START-BOOT[01]-START 4G modem (qmi-network) FAILED!, retry on the next cycle..."
-                        
-                # Using qmicli method
-                else:
-                    # Enable OS raw IP mode setting (not persistent)
-                    out = subprocess.Popen(['echo', 'Y', '>', '/sys/class/net/wwan0/qmi/raw_ip'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-                    stdout,stderr = out.communicate()
-                    # NO error after command execution
-                    if stderr == None:
-                        # Write to logger
-                        if backLogger == True:
-                            logger.info("DEBUG_4G: Enable RAW IP mode setting SUCCESSFUL")
-                        # Print statement
-                        else:
-                            print "DEBUG_4G: Enable RAW IP mode setting SUCCESSFUL"
-
-                    # Wait before execute another command
-                    time.sleep(1)
-                    
-                    # Enable wwan0 interface
-                    # Command: ifconfig wwan0 up
-                    # Reply: NA 
-                    out = subprocess.Popen(['ifconfig', 'wwan0', 'up'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-                    stdout,stderr = out.communicate()    
-
-                    # NO error after command execution
-                    if stderr == None:
-                        # Write to logger
-                        if backLogger == True:
-                            logger.info("DEBUG_4G: Bringing UP interface wwan0 SUCCESSFUL")
-                        # Print statement
-                        else:
-                            print "DEBUG_4G: Bringing UP interface wwan0 SUCCESSFUL"
-
-                        # Wait before execute another command
-                        time.sleep(1)
-
-                        # Set qmicli tmeout flag for checking purposes
-                        qmcliTimeOut = True
-                        
-                        # Check current 4G LTE modem status first
-                        # Command: qmicli -d /dev/cdc-wdm0 --dms-get-operating-mode
-                        # Reply:
-                        # [/dev/cdc-wdm0] Operating mode retrieved:
-                        # Mode: 'online' or 'offline'
-                        # HW restricted: 'no'
-                        out = subprocess.Popen(['qmicli', '-d', '/dev/cdc-wdm0', '--dms-get-operating-mode'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-                        stdout,stderr = out.communicate()
-
-                        # NO error after command execution
-                        if stderr == None:
-                            # Response OK
-                            if 'online' in stdout:
-                                # Write to logger
-                                if backLogger == True:
-                                    logger.info("DEBUG_4G: Get 4G modem operating mode SUCCESSFUL")
-                                # Print statement
-                                else:
-                                    print "DEBUG_4G: Get 4G modem operating mode SUCCESSFUL"
-                                
-                                # Clear back qmicli tmeout flag
-                                qmcliTimeOut = False
-
-                                # Wait before execute another command
-                                time.sleep(1)
-
-                                # Set qmicli tmeout flag for checking purposes
-                                qmcliTimeOut = True
-                        
-                                # Register the network with APN name
-                                # Command: qmicli -p -d /dev/cdc-wdm0 --device-open-net='net-raw-ip|net-no-qos-header' --wds-start-network="apn='celcom3g',username=' ',password=' ',ip-type=4" --client-no-release-cid
-                                # Reply;
-                                # [/dev/cdc-wdm0] Network started
-                                # Packet data handle: '2264423824'
-                                # [/dev/cdc-wdm0] Client ID not released:
-                                # Service: 'wds'
-                                # CID: '20'
-                                out = subprocess.Popen(['qmicli', '-p', '-d', '/dev/cdc-wdm0', "--device-open-net=net-raw-ip|net-no-qos-header", \
-                                                        '--wds-start-network=', "apn='celcom3g',username=' ',password=' ',ip-type=4", \
-                                                        '--client-no-release-cid'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-                                stdout,stderr = out.communicate()
-
-                                # NO error after command execution
-                                if stderr == None:
-                                    if 'Network started' in stdout:
-                                        if 'CID' in stdout:
-                                            # Write to logger
-                                            if backLogger == True:
-                                                logger.info("DEBUG_4G: 4G network registration SUCCESSFUL")
-                                            # Print statement
-                                            else:
-                                                print "DEBUG_4G: 4G network registration SUCCESSFUL"
-                                    
-                                            # Clear back qmicli tmeout flag
-                                            qmcliTimeOut = False
-
-                                            # Wait before execute another command
-                                            time.sleep(1)
-
-                                            # Finally, configure the IP address and the default route with udhcpc
-                                            # Command: udhcpc -i wwan0
-                                            # Reply:
-                                            # udhcpc: sending discover
-                                            # udhcpc: sending select for 183.171.144.62
-                                            # udhcpc: lease of 183.171.144.62 obtained, lease time 7200
-                                            out = subprocess.Popen(['udhcpc', '-i', 'wwan0'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-                                            stdout,stderr = out.communicate()
-
-                                            # NO error after command execution
-                                            if stderr == None:
-                                                # 4G LTE modem initialization with network provider completed
-                                                #if '183.171.212.223 obtained' in stdout:
-                                                if '183.171.147.229 obtained' in stdout:
-                                                    # Set flag to indicate 4G LTE modem first initialization completed
-                                                    machineBoot = False
-                                                    
-                                                    # Write to logger
-                                                    if backLogger == True:
-                                                        logger.info("DEBUG_4G: Obtained public IP address SUCCESSFUL")
-                                                    # Print statement
-                                                    else:
-                                                        print "DEBUG_4G: Obtained public IP address SUCCESSFUL"
-
-                                    # Previously APN registration already successful
-                                    elif 'PolicyMismatch' in stdout:
-                                        # Write to logger
-                                        if backLogger == True:
-                                            logger.info("DEBUG_4G: 4G network registration SUCCESSFUL")
-                                        # Print statement
-                                        else:
-                                            print "DEBUG_4G: 4G network registration SUCCESSFUL"
-
-                                        # Clear back qmicli tmeout flag
-                                        qmcliTimeOut = False
-
-                                        # Wait before execute another command
-                                        time.sleep(1)
-
-                                        # Finally, configure the IP address and the default route with udhcpc
-                                        # Command: udhcpc -i wwan0
-                                        # Reply:
-                                        # udhcpc: sending discover
-                                        # udhcpc: sending select for 183.171.144.62
-                                        # udhcpc: lease of 183.171.144.62 obtained, lease time 7200
-                                        out = subprocess.Popen(['udhcpc', '-i', 'wwan0'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-                                        stdout,stderr = out.communicate()
-
-                                        # NO error after command execution
-                                        if stderr == None:
-                                            # 4G LTE modem initialization with network provider completed
-                                            #if '183.171.212.223 obtained' in stdout:
-                                            if '183.171.147.229 obtained' in stdout:
-                                                # Set flag to indicate 4G LTE modem first initialization completed
-                                                machineBoot = False
-                                                
-                                                # Write to logger
-                                                if backLogger == True:
-                                                    logger.info("DEBUG_4G: Obtained public IP address SUCCESSFUL")
-                                                # Print statement
-                                                else:
-                                                    print "DEBUG_4G: Obtained public IP address SUCCESSFUL"
-
-                                # Operation failed
-                                else:
-                                    # Write to logger
-                                    if backLogger == True:
-                                        logger.info("DEBUG_4G: Command execution FAILED during 4G network registration")
-                                    # Print statement
-                                    else:
-                                        print "DEBUG_4G: Command execution FAILED during 4G network registration"    
-                                            
-                            # Response ERROR
-                            elif 'error:' in stdout:
-                                # Clear back qmicli tmeout flag
-                                qmcliTimeOut = False
-
-                                # Write to logger
-                                if backLogger == True:
-                                    logger.info("DEBUG_4G: Initiate 4G LTE modem for the first time FAILED!, retry....")
-                                # Print statement
-                                else:
-                                    print "DEBUG_4G: Initiate 4G LTE modem for the first time FAILED!, retry...."
-
-                        # Error during command executiom
-                        else:
-                            # Clear back qmicli tmeout flag
-                            qmcliTimeOut = False
-                                
-                            # Write to logger
-                            if backLogger == True:
-                                logger.info("DEBUG_4G: Initiate 4G LTE modem for the first time FAILED!, retry....")
-                            # Print statement
-                            else:
-                                print "DEBUG_4G: Initiate 4G LTE modem for the first time FAILED!, retry...."    
-
-            # Previously 4G modem already started, start monitor the network
-            else:
-                # Normal 4G modem status check
-                if restart4gModem == False:
-                    # Start PING google.com
-                    out = subprocess.Popen(['ping', '-c', '1', '8.8.8.8'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-                    stdout,stderr = out.communicate()
-
-                    # NO error after command execution
-                    if stderr == None:
-                        # 4G network OK
-                        if '1 received' in stdout:
-                            pingAttempt = 0
-                            lteModemStat = True
-                            
-                            # Write to logger
-                            if backLogger == True:
-                                logger.info("DEBUG_4G: 4G network OK")
-                            # Print statement
-                            else:
-                                print "DEBUG_4G: 4G network OK"
-
-                        # 4G network FAILED!
-                        elif '0 received' or 'failure' in stdout:
-                            # Increment attempt to check 4G network by pinging process
-                            pingAttempt += 1
-
-                            # After  checking 10 times, still 4G network failed, start initiate 4G LTE modem:
-                            if pingAttempt == 10:
-                                pingAttempt = 0
-
-                                # Write to logger
-                                if backLogger == True:
-                                    logger.info("DEBUG_4G: PING google.com FAILED!, Initiate restart process for 4G LTE modem...")
-                                # Print statement
-                                else:
-                                    print "DEBUG_4G: PING google.com FAILED!, Initiate restart process for 4G LTE modem..."
-                                    
-                                # Wait before execute another command
-                                time.sleep(1)
-
-                                # Using qmi-network CLI
-                                if quectelOpt == True:
-                                    # Disable wwan0 interface
-                                    # Command: ifconfig wwan0 down
-                                    # Reply: NA 
-                                    out = subprocess.Popen(['ifconfig', 'wwan0', 'down'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-                                    stdout,stderr = out.communicate()
-
-                                    # NO error after command execution
-                                    if stderr == None:
-                                        # Write to logger
-                                        if backLogger == True:
-                                            logger.info("DEBUG_4G: PROC-END-NORM[01]-Bringing DOWN interface wwan0 SUCCESSFUL")
-                                        # Print statement
-                                        else:
-                                            print "DEBUG_4G: PROC-END-NORM[01]-Bringing DOWN interface wwan0 SUCCESSFUL"
-
-                                        # Wait before execute another command
-                                        time.sleep(1)
-
-                                        # STOP the 4G modem
-                                        #out = subprocess.Popen(['qmi-network', '/dev/cdc-wdm1', 'stop'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-                                        out = subprocess.Popen(['qmi-network', '/dev/cdc-wdm0', 'stop'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-                                        stdout,stderr = out.communicate()
-
-                                        # NO error after command execution
-                                        if stderr == None:
-                                            # Network successfully started
-                                            if 'Network stopped successfully' in stdout:
-                                                # Write to logger
-                                                if backLogger == True:
-                                                    logger.info("DEBUG_4G: PROC-END-NORM[02]-STOP 4G modem (qmi-network) SUCCESSFUL")
-                                                # Print statement
-                                                else:
-                                                    print "DEBUG_4G: PROC-END-NORM[02]-STOP 4G modem (qmi-network) SUCCESSFUL"
-
-                                                # Set flag to restart 4G LTE modem on the next cycle
-                                                restart4gModem = True
-
-                                            # Network failed to stop
-                                            else:
-                                                # Write to logger
-                                                if backLogger == True:
-                                                    logger.info("DEBUG_4G: PROC-END-NORM[02]-STOP 4G modem (qmi-network) FAILED!, retry on the next cycle...")
-                                                # Print statement
-                                                else:
-                                                    print "DEBUG_4G: PROC-END-NORM[02]-STOP 4G modem (qmi-network) FAILED!, retry on the next cycle..."
-
-                                        # Error during command executiom
-                                        else:
-                                            # Write to logger
-                                            if backLogger == True:
-                                                logger.info("DEBUG_4G: PROC-END-NORM[02]-STOP 4G modem (qmi-network) FAILED!, retry on the next cycle...")
-                                            # Print statement
-                                            else:
-                                                print "DEBUG_4G: PROC-END-NORM[02]-STOP 4G modem (qmi-network) FAILED!, retry on the next cycle..."
-                                        
-                                    # Error during command executiom
-                                    else:
-                                        # Write to logger
-                                        if backLogger == True:
-                                            logger.info("DEBUG_4G: PROC-END-NORM[01]-Bringing DOWN interface wwan0 FAILED!, execution error")
-                                        # Print statement
-                                        else:
-                                            print "DEBUG_4G: PROC-END-NORM[01]-Bringing DOWN interface wwan0 FAILED!, execution error"
-
-                                # Using qmicli method
-                                else:
-                                    # Set qmicli tmeout flag for checking purposes
-                                    qmcliTimeOut = True
-
-                                    # STOP 4G LTE modem
-                                    out = subprocess.Popen(['qmicli', '-d', '/dev/cdc-wdm0', '--device-open-sync', '--dms-get-operating-mode'], \
-                                        stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-                                    stdout,stderr = out.communicate()
-
-                                    # NO error after command execution
-                                    if stderr == None:
-                                        if 'HW restricted:' in stdout:
-                                            # Write to logger
-                                            if backLogger == True:
-                                                logger.info("DEBUG_4G: STOP 4G LTE modem SUCCESSFUL")
-                                            # Print statement
-                                            else:
-                                                print "DEBUG_4G: STOP 4G LTE modem SUCCESSFUL"
-
-                                            # Clear back qmicli tmeout flag
-                                            qmcliTimeOut = False
-                                        
-                                            # Wait before execute another command
-                                            time.sleep(1)
-
-                                            # Bring wwan0 interface DOWN
-                                            out = subprocess.Popen(['ifconfig', 'wwan0', 'down'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-                                            stdout,stderr = out.communicate()
-
-                                            # NO error after command execution
-                                            if stderr == None:
-                                                # Write to logger
-                                                if backLogger == True:
-                                                    logger.info("DEBUG_4G: Bringing DOWN wwan0 SUCCESSFUL")
-                                                # Print statement
-                                                else:
-                                                    print "DEBUG_4G: Bringing DOWN wwan0 SUCCESSFUL"
-                                                
-                                                # Wait before execute another command
-                                                time.sleep(1)
-
-                                                # KILL udhcpc instances
-                                                out = subprocess.Popen(['killall', 'udhcpc'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-                                                stdout,stderr = out.communicate()
-
-                                                # NO error after command execution
-                                                if stderr == None:
-                                                    # Write to logger
-                                                    if backLogger == True:
-                                                        logger.info("DEBUG_4G: KILL  udhcpc SUCCESSFUL")
-                                                        logger.info("DEBUG_4G: Initiate 4G LTE modem on the next cycle...")
-                                                    # Print statement
-                                                    else:
-                                                        print "DEBUG_4G: KILL  udhcpc SUCCESSFUL"
-                                                        print "DEBUG_4G: Initiate 4G LTE modem on the next cycle..."
-
-                                                    # Set flag to restart 4G LTE modem on the next cycle
-                                                    restart4gModem = True
-
-                                        # Operation failed
-                                        else:
-                                            # Write to logger
-                                            if backLogger == True:
-                                                logger.info("DEBUG_4G: STOP 4G LTE modem FAILED!")
-                                            # Print statement
-                                            else:
-                                                print "DEBUG_4G: STOP 4G LTE modem FAILED!"
-
-                                    # Operation failed
-                                    else:
-                                        # Write to logger
-                                        if backLogger == True:
-                                            logger.info("DEBUG_4G: Command execution to STOP 4G LTE modem FAILED!")
-                                        # Print statement
-                                        else:
-                                            print "DEBUG_4G: Command execution to STOP 4G LTE modem FAILED!"
-
-                # Restart 4G LTE modem
-                else:
-                    # Using qmi-network CLI
-                    if quectelOpt == True:
-                        # START the 4G modem
-                        #out = subprocess.Popen(['qmi-network', '/dev/cdc-wdm1', 'start'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-                        out = subprocess.Popen(['qmi-network', '/dev/cdc-wdm0', 'start'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-                        stdout,stderr = out.communicate()
-                        
-                        # NO error after command execution
-                        if stderr == None:
-                            # Network successfully started
-                            if 'Network started successfully' in stdout:
-                                # Write to logger
-                                if backLogger == True:
-                                    logger.info("DEBUG_4G: PROC-START-RSTRT[01]-START 4G modem (qmi-network) SUCCESSFUL")
-                                # Print statement
-                                else:
-                                    print "DEBUG_4G: PROC-START-RSTRT[01]-START 4G modem (qmi-network) SUCCESSFUL"
-
-                                # Wait before execute another command
-                                time.sleep(1)
-
-                                # Enable wwan0 interface
-                                # Command: ifconfig wwan0 up
-                                # Reply: NA 
-                                out = subprocess.Popen(['ifconfig', 'wwan0', 'up'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-                                stdout,stderr = out.communicate() 
-                                
-                                # NO error after command execution
-                                if stderr == None:
-                                    # Write to logger
-                                    if backLogger == True:
-                                        logger.info("DEBUG_4G: PROC-START-RSTRT[02]-Bringing UP interface wwan0 SUCCESSFUL")
-                                    # Print statement
-                                    else:
-                                        print "DEBUG_4G: PROC-START-RSTRT[02]-Bringing UP interface wwan0 SUCCESSFUL"
-
-                                    # Wait before execute another command
-                                    time.sleep(1)
-
-                                    # Finally, configure the IP address and the default route with udhcpc
-                                    # Command: udhcpc -i wwan0
-                                    # Reply:
-                                    # udhcpc: sending discover
-                                    # udhcpc: sending select for 183.171.144.62
-                                    # udhcpc: lease of 183.171.144.62 obtained, lease time 7200
-                                    out = subprocess.Popen(['udhcpc', '-i', 'wwan0'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-                                    stdout,stderr = out.communicate()
-
-                                    # NO error after command execution
-                                    if stderr == None:
-                                        publicIpAddr += ' obtained'
-                                        # 4G LTE modem initialization with network provider completed
-                                        if publicIpAddr in stdout:
-                                            # Clear flag to start pinging process
-                                            restart4gModem = False
-                                            
-                                            # Write to logger
-                                            if backLogger == True:
-                                                logger.info("DEBUG_4G: PROC-START-RSTRT[03]-Obtained public IP address SUCCESSFUL")
-                                            # Print statement
-                                            else:
-                                                print "DEBUG_4G: PROC-START-RSTRT[03]-Obtained public IP address SUCCESSFUL"
-
-                                    # Error during command execution
-                                    else:
-                                        # Write to logger
-                                        if backLogger == True:
-                                            logger.info("DEBUG_4G: PROC-START-RSTRT[03]-Obtained public IP address FAILED!, restart LTE network initiation process...")
-                                        # Print statement
-                                        else:
-                                            print "DEBUG_4G: PROC-START-RSTRT[03]-Obtained public IP address FAILED!, restart LTE network initiation process..."
-
-                                        # Wait before execute another command
-                                        time.sleep(1)
-
-                                        # Start shutdown wwan0 interface
-                                        out = subprocess.Popen(['ifconfig', 'wwan0', 'down'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-                                        stdout,stderr = out.communicate()
-
-                                         # NO error after command execution
-                                        if stderr == None:
-                                            # Write to logger
-                                            if backLogger == True:
-                                                logger.info("DEBUG_4G: PROC-END-RSTRT[01]-Bringing DOWN interface wwan0 SUCCESSFULL")
-                                            # Print statement
-                                            else:
-                                                print "DEBUG_4G: PROC-END-RSTRT[01]-Bringing DOWN interface wwan0 SUCCESSFULL"
-
-                                            # Wait before execute another command
-                                            time.sleep(1)
-                                        
-                                            # Shutdown qmi network
-                                            out = subprocess.Popen(['qmi-network', '/dev/cdc-wdm0', 'stop'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-                                            stdout,stderr = out.communicate()
-
-                                            # NO error after command execution
-                                            if stderr == None:
-                                                # Network successfully stop
-                                                if 'Network stopped successfully' in stdout:
-                                                    # Write to logger
-                                                    if backLogger == True:
-                                                        logger.info("DEBUG_4G: PROC-END-RSTRT[02]-STOP 4G modem (qmi-network) SUCCESSFULL")
-                                                    # Print statement
-                                                    else:
-                                                        print "DEBUG_4G: PROC-END-RSTRT[02]-STOP 4G modem (qmi-network) SUCCESSFULL"
-
-                                                # Network failed to stop
-                                                else:
-                                                    # Write to logger
-                                                    if backLogger == True:
-                                                        logger.info("DEBUG_4G: PROC-END-RSTRT[02]-STOP 4G modem (qmi-network) FAILED!")
-                                                    # Print statement
-                                                    else:
-                                                        print "DEBUG_4G: PROC-END-RSTRT[02]-STOP 4G modem (qmi-network) FAILED!"
-
-                                            # Error during command execution
-                                            else:
-                                                # Write to logger
-                                                if backLogger == True:
-                                                    logger.info("DEBUG_4G: PROC-END-RSTRT[02]-STOP 4G modem (qmi-network), execution ERROR")
-                                                # Print statement
-                                                else:
-                                                    print "DEBUG_4G: PROC-END-RSTRT[02]-STOP 4G modem (qmi-network), execution ERROR"
-                                                
-
-                                        # Error during command execution
-                                        else:
-                                            # Write to logger
-                                            if backLogger == True:
-                                                logger.info("DEBUG_4G: PROC-END-RSTRT[01]-Bringing DOWN interface wwan0 FAILED!, execution ERROR")
-                                            # Print statement
-                                            else:
-                                                print "DEBUG_4G: PROC-END-RSTRT[01]-Bringing DOWN interface wwan0 FAILED!, execution ERROR"    
-
-                                # Error during command execution - out = subprocess.Popen(['ifconfig', 'wwan0', 'up'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-                                else:
-                                    # Write to logger
-                                    if backLogger == True:
-                                        logger.info("DEBUG_4G: PROC-START-RSTRT[02]-Bringing UP interface wwan0 FAILED!, restart LTE network initiation process...")
-                                    # Print statement
-                                    else:
-                                        print "DEBUG_4G: PROC-START-RSTRT[02]-Bringing UP interface wwan0 FAILED!, restart LTE network initiation process..."
-
-                                    # Wait before execute another command
-                                    time.sleep(1)
-
-                                    # Shutdown qmi network
-                                    out = subprocess.Popen(['qmi-network', '/dev/cdc-wdm0', 'stop'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-                                    stdout,stderr = out.communicate()
-
-                                    # NO error after command execution
-                                    if stderr == None:
-                                        # Network successfully stop
-                                        if 'Network stopped successfully' in stdout:
-                                            # Write to logger
-                                            if backLogger == True:
-                                                logger.info("DEBUG_4G: PROC-END-RSTRT[01]-STOP 4G modem (qmi-network) SUCCESSFULL")
-                                            # Print statement
-                                            else:
-                                                print "DEBUG_4G: PROC-END-RSTRT[01]-STOP 4G modem (qmi-network) SUCCESSFULL"
-
-                                        # Network failed to stop
-                                        else:
-                                            # Write to logger
-                                            if backLogger == True:
-                                                logger.info("DEBUG_4G: PROC-END-RSTRT[01]-STOP 4G modem (qmi-network) FAILED!")
-                                            # Print statement
-                                            else:
-                                                print "DEBUG_4G: PROC-END-RSTRT[01]-STOP 4G modem (qmi-network) FAILED!"
-
-                                    # Error during command execution
-                                    else:
-                                        # Write to logger
-                                        if backLogger == True:
-                                            logger.info("DEBUG_4G: PROC-END-RSTRT[01]-STOP 4G modem (qmi-network), execution ERROR")
-                                        # Print statement
-                                        else:
-                                            print "DEBUG_4G: PROC-END-RSTRT[01]-STOP 4G modem (qmi-network), execution ERROR"
-                                        
-                            # Network failed to start
-                            else:
-                                # Write to logger
-                                if backLogger == True:
-                                    logger.info("DEBUG_4G: PROC-START-RSTRT[01]-START 4G modem (qmi-network) FAILED!, retry on the next cycle...")
-                                # Print statement
-                                else:
-                                    print "DEBUG_4G: PROC-START-RSTRT[01]-START 4G modem (qmi-network) FAILED!, retry on the next cycle..."    
-
-                        # Error during command executiom
-                        else:
-                            # Write to logger
-                            if backLogger == True:
-                                logger.info("DEBUG_4G: PROC-START-RSTRT[01]-START 4G modem (qmi-network) FAILED!, retry on the next cycle...")
-                            # Print statement
-                            else:
-                                print "DEBUG_4G: PROC-START-RSTRT[01]-START 4G modem (qmi-network) FAILED!, retry on the next cycle..."
-                                
-                    # Using qmicli method
-                    else:
-                        # Enable OS raw IP mode setting (not persistent)
-                        out = subprocess.Popen(['echo', 'Y', '>', '/sys/class/net/wwan0/qmi/raw_ip'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-                        stdout,stderr = out.communicate()
-                        # NO error after command execution
-                        if stderr == None:
-                            # Write to logger
-                            if backLogger == True:
-                                logger.info("DEBUG_4G: Enable RAW IP mode setting SUCCESSFUL")
-                            # Print statement
-                            else:
-                                print "DEBUG_4G: Enable RAW IP mode setting SUCCESSFUL"
-
-                        # Wait before execute another command
-                        time.sleep(1)
-                        
-                        # Set qmicli tmeout flag for checking purposes
-                        qmcliTimeOut = True
-
-                        out = subprocess.Popen(['qmicli', '-d', '/dev/cdc-wdm0', "--dms-set-operating-mode=online"], \
-                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-                        stdout,stderr = out.communicate()
-
-                        # NO error after command execution
-                        if stderr == None:
-                            if 'successfully' in stdout:
-                                # Write to logger
-                                if backLogger == True:
-                                    logger.info("DEBUG_4G: Set modem operating mode SUCCESSFUL")
-                                # Print statement
-                                else:
-                                    print "DEBUG_4G: Set modem operating mode SUCCESSFUL"
-
-                                # Clear back qmicli tmeout flag
-                                qmcliTimeOut = False
-
-                                # Enable wwan0 interface
-                                # Command: ifconfig wwan0 up
-                                # Reply: NA 
-                                out = subprocess.Popen(['ifconfig', 'wwan0', 'up'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-                                stdout,stderr = out.communicate()    
-
-                                # NO error after command execution
-                                if stderr == None:
-                                    # Write to logger
-                                    if backLogger == True:
-                                        logger.info("DEBUG_4G: Bringing UP interface wwan0 SUCCESSFUL")
-                                    # Print statement
-                                    else:
-                                        print "DEBUG_4G: Bringing UP interface wwan0 SUCCESSFUL"
-
-                                    # Wait before execute another command
-                                    time.sleep(1)
-
-                                    # Set qmicli tmeout flag for checking purposes
-                                    qmcliTimeOut = True
-
-                                    # Register the network with APN name
-                                    # Command: qmicli -p -d /dev/cdc-wdm0 --device-open-net='net-raw-ip|net-no-qos-header' --wds-start-network="apn='celcom3g',username=' ',password=' ',ip-type=4" --client-no-release-cid
-                                    # Reply;
-                                    # [/dev/cdc-wdm0] Network started
-                                    # Packet data handle: '2264423824'
-                                    # [/dev/cdc-wdm0] Client ID not released:
-                                    # Service: 'wds'
-                                    # CID: '20'
-                                    out = subprocess.Popen(['qmicli', '-p', '-d', '/dev/cdc-wdm0', "--device-open-net=net-raw-ip|net-no-qos-header", \
-                                                            '--wds-start-network=', "apn='celcom3g',username=' ',password=' ',ip-type=4", \
-                                                            '--client-no-release-cid'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-                                    stdout,stderr = out.communicate()
-
-                                    # NO error after command execution
-                                    if stderr == None:
-                                        if 'Network started' in stdout:
-                                            if 'CID' in stdout:    
-                                                # Write to logger
-                                                if backLogger == True:
-                                                    logger.info("DEBUG_4G: 4G network registration SUCCESSFUL")
-                                                # Print statement
-                                                else:
-                                                    print "DEBUG_4G: 4G network registration SUCCESSFUL"
-                                        
-                                                # Clear back qmicli tmeout flag
-                                                qmcliTimeOut = False
-
-                                                # Wait before execute another command
-                                                time.sleep(1)
-
-                                                # Finally, configure the IP address and the default route with udhcpc
-                                                # Command: udhcpc -i wwan0
-                                                # Reply:
-                                                # udhcpc: sending discover
-                                                # udhcpc: sending select for 183.171.144.62
-                                                # udhcpc: lease of 183.171.144.62 obtained, lease time 7200
-                                                out = subprocess.Popen(['udhcpc', '-i', 'wwan0'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-                                                stdout,stderr = out.communicate()
-
-                                                # NO error after command execution
-                                                if stderr == None:
-                                                    # 4G LTE modem initialization with network provider completed
-                                                    #if '183.171.212.223 obtained' in stdout:
-                                                    if '183.171.147.229 obtained' in stdout:
-                                                        # Clear flag to restart 4G LTE modem on the next cycle
-                                                        restart4gModem = False
-                                                        
-                                                        # Write to logger
-                                                        if backLogger == True:
-                                                            logger.info("DEBUG_4G: Obtained public IP address SUCCESSFUL")
-                                                        # Print statement
-                                                        else:
-                                                            print "DEBUG_4G: Obtained public IP address SUCCESSFUL"
-                                        # Previously APN registration already successful
-                                        elif 'PolicyMismatch' in stdout:
-                                            # Write to logger
-                                            if backLogger == True:
-                                                logger.info("DEBUG_4G: 4G network registration SUCCESSFUL")
-                                            # Print statement
-                                            else:
-                                                print "DEBUG_4G: 4G network registration SUCCESSFUL"
-
-                                            # Clear back qmicli tmeout flag
-                                            qmcliTimeOut = False
-
-                                            # Wait before execute another command
-                                            time.sleep(1)
-
-                                            # Finally, configure the IP address and the default route with udhcpc
-                                            # Command: udhcpc -i wwan0
-                                            # Reply:
-                                            # udhcpc: sending discover
-                                            # udhcpc: sending select for 183.171.144.62
-                                            # udhcpc: lease of 183.171.144.62 obtained, lease time 7200
-                                            out = subprocess.Popen(['udhcpc', '-i', 'wwan0'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-                                            stdout,stderr = out.communicate()
-
-                                            # NO error after command execution
-                                            if stderr == None:
-                                                # 4G LTE modem initialization with network provider completed
-                                                #if '183.171.212.223 obtained' in stdout:
-                                                if '183.171.147.229 obtained' in stdout:
-                                                    # Clear flag to restart 4G LTE modem on the next cycle
-                                                    restart4gModem = False
-                                                    
-                                                    # Write to logger
-                                                    if backLogger == True:
-                                                        logger.info("DEBUG_4G: Obtained public IP address SUCCESSFUL")
-                                                    # Print statement
-                                                    else:
-                                                        print "DEBUG_4G: Obtained public IP address SUCCESSFUL"            
-                                                
-                                    # Operation failed
-                                    else:
-                                        # Write to logger
-                                        if backLogger == True:
-                                            logger.info("DEBUG_4G: Command execution FAILED during 4G network registration")
-                                        # Print statement
-                                        else:
-                                            print "DEBUG_4G: Command execution FAILED during 4G network registration"     
-                                        
-                            # Operation failed
-                            else:
-                                # Write to logger
-                                if backLogger == True:
-                                    logger.info("DEBUG_4G: Set modem operating mode FAILED!")
-                                # Print statement
-                                else:
-                                    print "DEBUG_4G: Set modem operating mode FAILED!"
-                                    
-                        # Operation failed
-                        else:
-                            # Write to logger
-                            if backLogger == True:
-                                logger.info("DEBUG_4G: Command execution to STOP 4G LTE modem FAILED!")
-                            # Print statement
-                            else:
-                                print "DEBUG_4G: Command execution to STOP 4G LTE modem FAILED!"    
-                        
+        # loop every 1s during the bring-up, on the probe cadence or restart backoff otherwise,
+        # or immediately after wwan0 link loss event
+        if lteState.state == ST_MONITOR:
+            leaseRemain = dhcpClient.renewRemain()
+            if leaseRemain == None:
+                leaseRemain = probeMaxInterval
+            linkMonitor.wait(min(probeCadence.remain(), leaseRemain, probeMaxInterval))
+        elif lteState.state == ST_RECOVER:
+            linkMonitor.wait(min(recoveryLadder.remain(), backoffMax))
+        else:
+            linkMonitor.wait(1)
+
+        # Status output requested
+        if statusReq == True:
+            statusReq = False
+            writeStatus()
+
+        # Tracing spans dump requested
+        if spanReq == True:
+            spanReq = False
+            writeSpans()
+
+        # Link loss event received since the last cycle, only used during network monitoring
+        # Events from before MONITOR entered caused by the bring-up or the recovery action itself
+        # (WDS stop, low power mode, wwan0 down), the first monitoring cycle must not fail on them
+        linkLost = linkMonitor.takeLinkLost(lteState.enterTime)
+
+        # Run the current state, keep going on the same cycle while the bring-up progressing
+        while lteState.step(linkLost) == True and lteState.state != ST_MONITOR:
+            linkLost = None
+
+# Terminate signal, exit the main loop gracefully
+def sigTerm(signum, frame):
+    sys.exit(0)
+
+# User signal 1, write the daemon status output on the next cycle
+# Only set the flag, the signal wake up fd already wake up the main loop
+def sigStatus(signum, frame):
+    global statusReq
+    statusReq = True
+
+# User signal 2, dump the tracing spans on the next cycle
+# Only set the flag, the signal wake up fd already wake up the main loop
+def sigSpans(signum, frame):
+    global spanReq
+    spanReq = True
+
 if __name__ == "__main__":
-    main()
+    parseMacros(sys.argv)
+    setup()
+    signal.signal(signal.SIGTERM, sigTerm)
+    signal.signal(signal.SIGUSR1, sigStatus)
+    signal.signal(signal.SIGUSR2, sigSpans)
+    # Any signal wake up the main loop through the netlink listener self pipe,
+    # even when delivered to another thread
+    signal.set_wakeup_fd(linkMonitor.wakeWr)
+    try:
+        main()
+    finally:
+        # Release QMI client IDs, keep WDS client when the bearer still up so the next instance can reuse it
+        if qmiClient.pktHandle != None:
+            qmiClient.releaseClients([QMI_SVC_WDS])
+        else:
+            qmiClient.releaseClients()
+        stateFile.save()
+        # Write the log records still queued
+        logListener.stop()
 
 
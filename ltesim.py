@@ -0,0 +1,692 @@
+#############################################################################################################
+# File:        ltesim.py
+# Description: Fake 4G LTE modem simulator, run ltemodem.py without the real modem and SIM card
+#              ----------------------------------------------------------------------------------------------
+# Notes      : Simulator layout:
+#              ----------------------------------------------------------------------------------------------
+#              ltesim     - Network namespace of ltemodem.py, wwan0 is one end of a veth pair
+#              ltesim-net - Network namespace of the fake modem and operator network, sim0 is the other end of
+#                           the veth pair. The fake modem answer DHCP on sim0 and the probe targets are local
+#                           addresses of this namespace while the bearer is up. PINGTARGET macro on up or run
+#                           change the probe targets, the same macro is passed to ltemodem.py on run.
+#              QMI        - Fake QMI endpoint on the unix socket <run dir>/qmi-proxy (QMIPROXY macro), CTL, DMS
+#                           and WDS requests answered from the fake modem state, WDS packet service status
+#                           indication sent on bearer up and drop. Modem reset remove <run dir>/cdc-wdm0 (QMIDEV
+#                           macro) and wwan0 until the modem come back.
+#              Commands   - qmi-network on the PATH overlay <run dir>/bin, ask the fake modem for its delay,
+#                           hang or failure, its output come from the fake modem. wwan0 link, address and
+#                           default route configured by ltemodem.py through rtnetlink on the veth directly.
+#              Faults     - Set on the control socket <run dir>/ctl, see simFaults.
+#              ----------------------------------------------------------------------------------------------
+# Usage  : python ltesim.py up                          - Create the namespaces and start the fake modem
+#          python ltesim.py run [ltemodem.py macros]    - Run ltemodem.py against the fake modem
+#          python ltesim.py fault <name>=<JSON value>   - Inject faults, e.g. bearer='"drop"'
+#                                                         fail='{"qmi wds 0x0020": 14}' delay='{"qmi-network stop": 2}'
+#          python ltesim.py status                      - Print the fake modem state
+#          python ltesim.py down                        - Stop the fake modem, remove the namespaces
+#          RUNDIR=<path> macro on any of the above, default /tmp/ltesim
+#          PINGTARGET=<a,b,..> macro on up and run, default the ltemodem.py probe targets
+#
+# Author : Ahmad Bahari Nizam B. Abu Bakar.
+#
+# Version: 1.0.1
+# Version: 1.0.2 - ifconfig and route no longer faked, ltemodem.py configure wwan0 through rtnetlink
+#
+# Date   : 18/10/2026 (INITIAL RELEASE DATE)
+#          UPDATED - 18/10/2026 - 1.0.2
+#############################################################################################################
+
+import os, sys, time
+import thread
+import threading
+import select
+import signal
+import socket
+import struct
+import json
+import random
+import subprocess
+
+# QMUX/TLV codec, checksum and protocol constants shared with the script under test
+from ltemodem import qmiFramePack, qmiFrameUnpack, qmiFrameSplit, inetChecksum
+from ltemodem import QMI_SVC_CTL, QMI_SVC_WDS, QMI_SVC_DMS, qmiSvcNames
+from ltemodem import QMI_MSG_RESPONSE, QMI_MSG_INDICATION, QMI_TLV_RESULT
+from ltemodem import QMI_CTL_ALLOCATE_CID, QMI_CTL_RELEASE_CID
+from ltemodem import QMI_DMS_GET_OPERATING_MODE, QMI_DMS_SET_OPERATING_MODE
+from ltemodem import QMI_DMS_MODE_ONLINE, QMI_DMS_MODE_RESET
+from ltemodem import QMI_WDS_START_NETWORK, QMI_WDS_STOP_NETWORK, QMI_WDS_PKT_SRVC_STATUS
+from ltemodem import QMI_WDS_DISCONNECTED, QMI_WDS_CONNECTED
+from ltemodem import QMI_ERR_INVALID_CLIENT_ID, QMI_ERR_NO_EFFECT, QMI_ERR_POLICY_MISMATCH
+from ltemodem import ETH_P_IP, DHCP_MAGIC, DHCP_DISCOVER, DHCP_OFFER, DHCP_REQUEST, DHCP_ACK, DHCP_NAK
+
+# Global variable declaration
+simRunDir          = '/tmp/ltesim' # Simulator run directory, sockets, fake device, PATH overlay and logs
+simNs              = 'ltesim'      # Network namespace of ltemodem.py
+simNetNs           = 'ltesim-net'  # Network namespace of the fake modem and operator network
+simIfName          = 'sim0'        # Operator network end of the veth pair
+simGateway         = '10.64.0.1'   # Operator gateway, DHCP server and DNS server address
+simClientAddr      = '10.64.0.2'   # wwan0 address given by DHCP
+simNetmask         = '255.255.255.0'
+simCmds            = ['qmi-network'] # Fake commands on the PATH overlay
+simTargets         = ['8.8.8.8', '1.1.1.1', '9.9.9.9'] # Probe targets reachable through the bearer, same as ltemodem.py
+simStartTimeOut    = 5.0      # Fake modem control socket ready timeout in sec
+simScript          = os.path.abspath(__file__).replace('.pyc', '.py') # This script, fake commands and fake modem
+lteScript          = os.path.join(os.path.dirname(simScript), 'ltemodem.py') # Script under test
+# Fault and behaviour defaults, every one can be changed on the fly with the fault control request
+# delay, hang, fail - {key prefix: value}, key is the command without device paths, e.g. 'qmi-network start',
+# 'qmi-network stop', or the QMI request as in the tracing spans, e.g. 'qmi wds 0x0020'
+# fail value - exit code for commands, QMI protocol error code for QMI requests
+simFaults          = {'delay'        : {},      # Extra latency in sec
+                      'hang'         : {},      # Never reply (QMI) or never exit (commands) when true
+                      'fail'         : {},      # Fail with the given code
+                      'attachTime'   : 0.5,     # Network attach time on bearer start in sec
+                      'resetTime'    : 2.0,     # Modem gone after reset in sec
+                      'hwRestricted' : False,   # Hardware restricted to low power, bearer start fail
+                      'dhcp'         : 'ok',    # 'ok', 'drop' - no reply, 'nak' - refuse every request
+                      'leaseTime'    : 3600}    # DHCP lease time in sec
+# Fault actions, not kept in the faults table
+# bearer - 'drop' bearer lost with WDS indication, 'silent' data path lost while WDS still connected,
+#          'restore' data path back; reset - true, modem crash and come back after resetTime
+
+# QMI constants only used by the fake modem, the others shared with ltemodem.py
+QMUX_FLAG_SERVICE  = 0x80     # QMUX control flag of the frames sent by the modem
+QMI_ERR_INTERNAL      = 3
+QMI_ERR_CALL_FAILED   = 14
+qmiErrNames        = {QMI_ERR_INTERNAL : 'Internal', QMI_ERR_INVALID_CLIENT_ID : 'InvalidClientId', \
+                      QMI_ERR_CALL_FAILED : 'CallFailed', QMI_ERR_NO_EFFECT : 'NoEffect', \
+                      QMI_ERR_POLICY_MISMATCH : 'PolicyMismatch'}
+
+# Check for macro arguments
+for x in sys.argv:
+    # Optional macro to override simulator run directory, e.g. RUNDIR=/tmp/ltesim2
+    if x.startswith("RUNDIR="):
+        simRunDir = x[len("RUNDIR="):]
+    # Optional macro to override the probe targets, e.g. PINGTARGET=8.8.8.8,1.1.1.1
+    elif x.startswith("PINGTARGET="):
+        simTargets = [a for a in x[len("PINGTARGET="):].split(',') if a != '']
+
+# Log simulator event with timestamp
+def simLog(msg):
+    sys.stdout.write("%.3f SIM: %s\n" % (time.time(), msg))
+    sys.stdout.flush()
+
+# Run command, simulator side only, return True when succeed
+def simCommand(cmd):
+    return subprocess.call(cmd, stdout=open(os.devnull, 'w'), stderr=subprocess.STDOUT) == 0
+
+# Pack one QMUX frame sent by the modem, the ltemodem.py frame with the modem side control flag
+def modemFramePack(service, clientId, msgType, txnId, msgId, tlvs):
+    frame = qmiFramePack(service, clientId, msgType, txnId, msgId, tlvs)
+    return frame[:3] + chr(QMUX_FLAG_SERVICE) + frame[4:]
+
+# QMI result TLV
+def qmiResultTlv(error):
+    if error == None:
+        return (QMI_TLV_RESULT, struct.pack('<HH', 0, 0))
+    return (QMI_TLV_RESULT, struct.pack('<HH', 1, error))
+
+# Fake Quectel EC25 modem, QMI endpoint, DHCP server and operator data path in one process
+# Run inside the operator network namespace, the QMI and control sockets are path based unix sockets
+# so they are reachable from the ltemodem.py namespace.
+class FakeModem(object):
+    def __init__(self, runDir, targets):
+        self.runDir = runDir
+        self.targets = targets      # Probe target addresses, local addresses while the data path is up
+        self.lock = threading.RLock()
+        self.faults = json.loads(json.dumps(simFaults))
+        self.mode = QMI_DMS_MODE_ONLINE
+        self.present = False        # QMI device and wwan0 exist
+        self.bearer = None          # Bearer owner, WDS client ID or 'qmi-network', None when down
+        self.pktHandle = None
+        self.dataPath = False       # Probe targets reachable through the bearer
+        self.conns = []             # QMI client connections
+        self.clientIds = {}         # (service, client ID) -> QMI client connection
+        self.nextCid = 1
+        self.linkGen = 0            # Increased each time sim0 recreated, DHCP socket reopen
+        self.execCnt = {}           # Fake command name -> executed count
+        self.qmiCnt = 0             # QMI requests received
+        self.dhcpCnt = 0            # DHCP requests received
+
+    # Fault value for the command or QMI request key, longest matching prefix wins
+    def faultValue(self, kind, key, default):
+        match = None
+        for prefix in self.faults[kind]:
+            if key.startswith(prefix) and (match == None or len(prefix) > len(match)):
+                match = prefix
+        if match == None:
+            return default
+        return self.faults[kind][match]
+
+    # Create sim0/wwan0 veth pair and the QMI device, the modem arrived
+    def attach(self):
+        simCommand(['ip', 'link', 'add', simIfName, 'type', 'veth', 'peer', 'name', 'wwan0', 'netns', simNs])
+        simCommand(['ip', 'addr', 'add', simGateway + '/24', 'dev', simIfName])
+        simCommand(['ip', 'link', 'set', simIfName, 'up'])
+        open(os.path.join(self.runDir, 'cdc-wdm0'), 'w').close()
+        with self.lock:
+            self.mode = QMI_DMS_MODE_ONLINE
+            self.present = True
+            self.linkGen += 1
+        simLog("modem arrived")
+
+    # Remove QMI device and the veth pair, drop every QMI client, the modem gone
+    def detach(self):
+        with self.lock:
+            self.present = False
+            self.bearerStop(False)
+            self.clientIds = {}
+            for conn in self.conns:
+                try:
+                    conn.shutdown(socket.SHUT_RDWR)
+                except socket.error:
+                    pass
+        try:
+            os.unlink(os.path.join(self.runDir, 'cdc-wdm0'))
+        except OSError:
+            pass
+        simCommand(['ip', 'link', 'del', simIfName])
+        simLog("modem gone")
+
+    # Modem reset, gone then arrived again after resetTime
+    def reset(self, threadname):
+        self.detach()
+        time.sleep(self.faults['resetTime'])
+        self.attach()
+
+    # Probe targets reachable or not
+    def setDataPath(self, up):
+        if up == self.dataPath:
+            return
+        self.dataPath = up
+        for target in self.targets:
+            simCommand(['ip', 'addr', ['del', 'add'][up], target + '/32', 'dev', 'lo'])
+        simLog("data path %s" % ['DOWN', 'UP'][up])
+
+    # Change the probe targets, the data path moved to the new targets as is
+    def setTargets(self, targets):
+        with self.lock:
+            dataPath = self.dataPath
+            self.setDataPath(False)
+            self.targets = targets
+            self.setDataPath(dataPath)
+        simLog("probe targets %s" % ','.join(targets))
+
+    # Start the bearer, return None or QMI error code
+    def bearerStart(self, owner):
+        with self.lock:
+            if self.mode != QMI_DMS_MODE_ONLINE or self.faults['hwRestricted'] == True:
+                return QMI_ERR_CALL_FAILED
+            if self.bearer != None:
+                if self.bearer == owner:
+                    return QMI_ERR_NO_EFFECT
+                return QMI_ERR_POLICY_MISMATCH
+            self.bearer = owner
+            self.pktHandle = random.randint(1, 0xFFFFFFFF)
+            self.setDataPath(True)
+            simLog("bearer UP, packet data handle %d" % self.pktHandle)
+            self.indicate(QMI_WDS_CONNECTED)
+            return None
+
+    # Stop the bearer, notify False when the modem gone without any indication
+    def bearerStop(self, notify=True):
+        with self.lock:
+            if self.bearer == None:
+                return
+            self.bearer = None
+            self.pktHandle = None
+            self.setDataPath(False)
+            simLog("bearer DOWN")
+            if notify == True:
+                self.indicate(QMI_WDS_DISCONNECTED)
+
+    # Send WDS packet service status indication to every WDS client
+    def indicate(self, connStat):
+        for (service,clientId),conn in self.clientIds.items():
+            if service == QMI_SVC_WDS:
+                self.send(conn, modemFramePack(service, clientId, QMI_MSG_INDICATION, 0, QMI_WDS_PKT_SRVC_STATUS, \
+                                             [(0x01, chr(connStat) + chr(0))]))
+
+    # Send frame to QMI client, connection already closed is ignored
+    def send(self, conn, frame):
+        with self.lock:
+            try:
+                conn.sendall(frame)
+            except socket.error:
+                pass
+
+    # Handle one QMI request, return (response TLVs, error code)
+    def qmiHandle(self, conn, service, clientId, msgId, tlvs):
+        if service == QMI_SVC_CTL:
+            if msgId == QMI_CTL_ALLOCATE_CID:
+                svc = ord(tlvs.get(0x01, '\0')[0])
+                with self.lock:
+                    cid = self.nextCid
+                    self.nextCid = self.nextCid % 0xFE + 1
+                    self.clientIds[(svc, cid)] = conn
+                return [(0x01, chr(svc) + chr(cid))],None
+            if msgId == QMI_CTL_RELEASE_CID:
+                data = tlvs.get(0x01, '\0\0')
+                with self.lock:
+                    self.clientIds.pop((ord(data[0]), ord(data[1])), None)
+                return [(0x01, data)],None
+            # Set data format, qmi-proxy open and anything else on CTL accepted
+            return [],None
+
+        # Client ID from before the modem reset or never allocated
+        if (service, clientId) not in self.clientIds:
+            return [],QMI_ERR_INVALID_CLIENT_ID
+
+        if service == QMI_SVC_DMS and msgId == QMI_DMS_GET_OPERATING_MODE:
+            return [(0x01, chr(self.mode)), (0x11, chr(self.faults['hwRestricted'] == True))],None
+
+        if service == QMI_SVC_DMS and msgId == QMI_DMS_SET_OPERATING_MODE:
+            mode = ord(tlvs.get(0x01, '\0')[0])
+            if mode == QMI_DMS_MODE_RESET:
+                thread.start_new_thread(self.reset, ("[modemReset]",))
+                return [],None
+            if mode == QMI_DMS_MODE_ONLINE and self.faults['hwRestricted'] == True:
+                return [],QMI_ERR_INTERNAL
+            if mode != QMI_DMS_MODE_ONLINE:
+                self.bearerStop()
+            self.mode = mode
+            simLog("operating mode %d" % mode)
+            return [],None
+
+        if service == QMI_SVC_WDS and msgId == QMI_WDS_START_NETWORK:
+            err = self.bearerStart(clientId)
+            if err == None:
+                return [(0x01, struct.pack('<I', self.pktHandle))],None
+            # Call end reason, generic no service
+            return [(0x10, struct.pack('<H', 3))],err
+
+        if service == QMI_SVC_WDS and msgId == QMI_WDS_STOP_NETWORK:
+            self.bearerStop()
+            return [],None
+
+        if service == QMI_SVC_WDS and msgId == QMI_WDS_PKT_SRVC_STATUS:
+            if self.bearer != None:
+                return [(0x01, chr(QMI_WDS_CONNECTED))],None
+            return [(0x01, chr(QMI_WDS_DISCONNECTED))],None
+
+        return [],QMI_ERR_INTERNAL
+
+    # Reply one QMI request after its delay, unless it is hung
+    def qmiRequest(self, conn, frame):
+        service,clientId,msgType,txnId,msgId,tlvs = qmiFrameUnpack(frame)
+        key = 'qmi %s 0x%04x' % (qmiSvcNames.get(service, service), msgId)
+        self.qmiCnt += 1
+
+        if self.faultValue('hang', key, False) == True:
+            simLog("%s hung" % key)
+            return
+        delay = self.faultValue('delay', key, 0.0)
+        if service == QMI_SVC_WDS and msgId == QMI_WDS_START_NETWORK:
+            delay += self.faults['attachTime']
+
+        err = self.faultValue('fail', key, None)
+        if err != None:
+            respTlvs = []
+        else:
+            respTlvs,err = self.qmiHandle(conn, service, clientId, msgId, tlvs)
+        resp = modemFramePack(service, clientId, QMI_MSG_RESPONSE, txnId, msgId, [qmiResultTlv(err)] + respTlvs)
+        if delay > 0:
+            threading.Timer(delay, self.send, (conn, resp)).start()
+        else:
+            self.send(conn, resp)
+
+    # Serve one QMI client connection until it closed
+    def qmiConn(self, threadname, conn):
+        rxBuf = ''
+        try:
+            while True:
+                data = conn.recv(4096)
+                if data == '':
+                    break
+                frames,rxBuf = qmiFrameSplit(rxBuf + data)
+                for frame in frames:
+                    # Modem gone, the request is lost
+                    if self.present == True:
+                        self.qmiRequest(conn, frame)
+        except (socket.error, struct.error):
+            pass
+        with self.lock:
+            self.conns.remove(conn)
+            for key in [a for a,b in self.clientIds.items() if b == conn]:
+                del self.clientIds[key]
+        conn.close()
+
+    # QMI endpoint, one thread per client connection
+    def qmiServe(self, threadname):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(os.path.join(self.runDir, 'qmi-proxy'))
+        sock.listen(8)
+        while True:
+            conn,addr = sock.accept()
+            # Modem gone, nothing listening
+            if self.present == False:
+                conn.close()
+                continue
+            with self.lock:
+                self.conns.append(conn)
+            thread.start_new_thread(self.qmiConn, ("[qmiConn]", conn))
+
+    # Fake qmi-network output, the real script print its own progress then the qmicli result
+    def qmiNetwork(self, action):
+        out = "Loading profile at /etc/qmi-network.conf...\n    APN: internet\n    APN user: unset\n" + \
+              "    APN password: unset\n    qmi-proxy: no\n"
+        if action == 'stop':
+            self.bearerStop()
+            return 0,out + "Network stopped successfully\n"
+
+        err = self.bearerStart('qmi-network')
+        if err == None:
+            out += "Starting network with 'qmicli -d /dev/cdc-wdm0 --wds-start-network=apn='internet' " + \
+                   "--client-no-release-cid'...\nSaving state at /tmp/qmi-network-state-cdc-wdm0... (PDH: %d)\n" % \
+                   self.pktHandle + "Network started successfully\n"
+            return 0,out
+        if err in (QMI_ERR_NO_EFFECT, QMI_ERR_POLICY_MISMATCH):
+            return 3,out + "error: cannot re-start network, PDH already exists\n"
+        return 3,out + "error: couldn't start network: QMI protocol error (%d): '%s'\n" % (err, qmiErrNames[err]) + \
+               "call end reason (3): generic-no-service\nNetwork start failed\n"
+
+    # Fake command executed, return its delay, hang, exit code, output and whether the real command follow
+    def execCommand(self, name, args):
+        key = ' '.join([name] + [a for a in args if not a.startswith('/')])
+        with self.lock:
+            self.execCnt[name] = self.execCnt.get(name, 0) + 1
+        reply = {'delay': self.faultValue('delay', key, 0.0), 'hang': self.faultValue('hang', key, False), \
+                 'code': 0, 'output': '', 'real': name != 'qmi-network'}
+        code = self.faultValue('fail', key, None)
+        if code != None:
+            reply.update({'code': code, 'output': 'error: %s failed\n' % key, 'real': False})
+        elif name == 'qmi-network' and self.present == False:
+            reply.update({'code': 1, 'output': "error: couldn't open the QmiDevice: Device does not exist\n"})
+        elif name == 'qmi-network' and args[-1:] in (['start'], ['stop']):
+            reply['code'],reply['output'] = self.qmiNetwork(args[-1])
+            if args[-1] == 'start':
+                reply['delay'] += self.faults['attachTime']
+        simLog("exec %s, code %d" % (key, reply['code']))
+        return reply
+
+    # Apply faults and fault actions from the control request, return error or None
+    def setFaults(self, faults):
+        for name,value in faults.items():
+            if name == 'bearer' and value == 'drop':
+                self.bearerStop()
+            elif name == 'bearer' and value == 'silent':
+                self.setDataPath(False)
+            elif name == 'bearer' and value == 'restore':
+                self.setDataPath(self.bearer != None)
+            elif name == 'reset' and value == True:
+                thread.start_new_thread(self.reset, ("[modemReset]",))
+            elif name in self.faults:
+                self.faults[name] = value
+            else:
+                return 'unknown fault %s' % name
+            simLog("fault %s = %s" % (name, json.dumps(value)))
+        return None
+
+    # Fake modem state
+    def status(self):
+        return {'mode': self.mode, 'present': self.present, 'bearer': self.bearer != None, 'dataPath': self.dataPath, \
+                'targets': self.targets, \
+                'execCnt': self.execCnt, 'qmiCnt': self.qmiCnt, 'dhcpCnt': self.dhcpCnt, 'faults': self.faults}
+
+    # Serve one control request, JSON line in and JSON line out
+    def ctlConn(self, threadname, conn):
+        try:
+            data = ''
+            while not data.endswith('\n'):
+                chunk = conn.recv(4096)
+                if chunk == '':
+                    return
+                data += chunk
+            req = json.loads(data)
+            if req['op'] == 'exec':
+                reply = self.execCommand(req['name'], req['args'])
+            elif req['op'] == 'fault':
+                reply = {'error': self.setFaults(req['faults'])}
+            elif req['op'] == 'targets':
+                self.setTargets(req['targets'])
+                reply = {'error': None}
+            else:
+                reply = self.status()
+            conn.sendall(json.dumps(reply) + '\n')
+        except (socket.error, ValueError, KeyError), e:
+            simLog("control request FAILED, %s" % e)
+        finally:
+            conn.close()
+
+    # Control socket, fake commands and fault injection
+    def ctlServe(self, threadname):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(os.path.join(self.runDir, 'ctl'))
+        sock.listen(16)
+        while True:
+            conn,addr = sock.accept()
+            thread.start_new_thread(self.ctlConn, ("[ctlConn]", conn))
+
+    # Build DHCP reply to the request
+    def dhcpReply(self, bootp, msgType):
+        opts = struct.pack('!BBB', 53, 1, msgType) + struct.pack('!BB4s', 54, 4, socket.inet_aton(simGateway))
+        if msgType != DHCP_NAK:
+            opts += struct.pack('!BBI', 51, 4, self.faults['leaseTime']) + \
+                    struct.pack('!BB4s', 1, 4, socket.inet_aton(simNetmask)) + \
+                    struct.pack('!BB4s', 3, 4, socket.inet_aton(simGateway)) + \
+                    struct.pack('!BB4s', 6, 4, socket.inet_aton(simGateway))
+        opts += '\xff'
+        yiaddr = socket.inet_aton([simClientAddr, '0.0.0.0'][msgType == DHCP_NAK])
+        reply = struct.pack('!BBBB', 2, 1, 6, 0) + bootp[4:8] + '\0' * 4 + bootp[12:16] + yiaddr + '\0' * 8 + \
+                bootp[28:236] + struct.pack('!I', DHCP_MAGIC) + opts
+        udp = struct.pack('!HHHH', 67, 68, 8 + len(reply), 0) + reply
+        ip = struct.pack('!BBHHHBBH4s4s', 0x45, 0, 20 + len(udp), 0, 0, 64, socket.IPPROTO_UDP, 0, \
+                         socket.inet_aton(simGateway), '\xff' * 4)
+        return ip[:10] + struct.pack('!H', inetChecksum(ip)) + ip[12:] + udp
+
+    # Handle one packet received on sim0, return DHCP reply or None
+    def dhcpHandle(self, data):
+        ihl = (ord(data[0]) & 0x0F) * 4
+        if len(data) < ihl + 8 + 240 or ord(data[9]) != socket.IPPROTO_UDP or \
+           struct.unpack('!H', data[ihl + 2:ihl + 4])[0] != 67:
+            return None
+        bootp = data[ihl + 8:]
+        opts = {}
+        i = 240
+        while i + 1 < len(bootp) and ord(bootp[i]) != 255:
+            opts[ord(bootp[i])] = bootp[i + 2:i + 2 + ord(bootp[i + 1])]
+            i += 2 + ord(bootp[i + 1])
+        if 53 not in opts:
+            return None
+
+        self.dhcpCnt += 1
+        msgType = ord(opts[53])
+        # Modem only relay DHCP while the bearer is up
+        if self.bearer == None or self.faults['dhcp'] == 'drop':
+            return None
+        if msgType == DHCP_DISCOVER:
+            return self.dhcpReply(bootp, DHCP_OFFER)
+        if msgType == DHCP_REQUEST:
+            addr = socket.inet_ntoa(opts.get(50, bootp[12:16]))
+            if self.faults['dhcp'] == 'nak' or addr != simClientAddr:
+                return self.dhcpReply(bootp, DHCP_NAK)
+            return self.dhcpReply(bootp, DHCP_ACK)
+        return None
+
+    # DHCP server on sim0, reopen the packet socket each time sim0 recreated
+    def dhcpServe(self, threadname):
+        sock = None
+        linkGen = None
+        while True:
+            try:
+                if linkGen != self.linkGen:
+                    if sock != None:
+                        sock.close()
+                    sock = None
+                    linkGen = self.linkGen
+                    sock = socket.socket(socket.AF_PACKET, socket.SOCK_DGRAM, socket.htons(ETH_P_IP))
+                    sock.bind((simIfName, ETH_P_IP))
+                rd,wr,ex = select.select([sock], [], [], 1.0)
+                if not rd:
+                    continue
+                reply = self.dhcpHandle(sock.recv(4096))
+                if reply != None:
+                    sock.sendto(reply, (simIfName, ETH_P_IP, 0, 0, '\xff' * 6))
+            except (socket.error, select.error, struct.error, IndexError):
+                linkGen = None
+                time.sleep(0.5)
+
+# Send control request to the fake modem, return the JSON reply
+def simRequest(runDir, req, timeOut=5.0):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeOut)
+    try:
+        sock.connect(os.path.join(runDir, 'ctl'))
+        sock.sendall(json.dumps(req) + '\n')
+        data = ''
+        while not data.endswith('\n'):
+            chunk = sock.recv(4096)
+            if chunk == '':
+                break
+            data += chunk
+        return json.loads(data)
+    finally:
+        sock.close()
+
+# Inject faults, return error or None
+def simFault(runDir, faults):
+    return simRequest(runDir, {'op': 'fault', 'faults': faults})['error']
+
+# Fake modem state
+def simStatus(runDir):
+    return simRequest(runDir, {'op': 'status'})
+
+# Fake command entry point, started through the PATH overlay wrapper
+def fakeCommand(runDir, name, args):
+    try:
+        reply = simRequest(runDir, {'op': 'exec', 'name': name, 'args': args})
+    except (socket.error, ValueError), e:
+        sys.stdout.write("error: fake modem not running, %s\n" % e)
+        sys.exit(1)
+
+    if reply['delay'] > 0:
+        time.sleep(reply['delay'])
+    # Stuck until killed by the ltemodem.py command watchdog
+    while reply['hang'] == True:
+        time.sleep(3600)
+    sys.stdout.write(reply['output'])
+    sys.stdout.flush()
+    if reply['real'] == False:
+        sys.exit(reply['code'])
+
+    # Run the real command, skip the PATH overlay
+    overlay = os.path.join(runDir, 'bin')
+    for path in os.environ.get('PATH', '').split(os.pathsep):
+        if os.path.abspath(path) != overlay and os.access(os.path.join(path, name), os.X_OK):
+            os.execv(os.path.join(path, name), [name] + args)
+    sys.stdout.write("error: %s not found\n" % name)
+    sys.exit(127)
+
+# Fake modem entry point, run inside the operator network namespace
+def modemMain(runDir, targets):
+    modem = FakeModem(runDir, targets)
+    simCommand(['ip', 'link', 'set', 'lo', 'up'])
+    modem.attach()
+    thread.start_new_thread(modem.qmiServe, ("[qmiServe]",))
+    thread.start_new_thread(modem.dhcpServe, ("[dhcpServe]",))
+    modem.ctlServe("[ctlServe]")
+
+# Create the namespaces, PATH overlay and start the fake modem, return the fake modem process
+def simUp(runDir):
+    binDir = os.path.join(runDir, 'bin')
+    if os.path.isdir(binDir) == False:
+        os.makedirs(binDir)
+    for name in ['ctl', 'qmi-proxy', 'cdc-wdm0', 'ltemodem.state'] + [os.path.join('bin', a) for a in simCmds]:
+        if os.path.lexists(os.path.join(runDir, name)):
+            os.unlink(os.path.join(runDir, name))
+
+    # Wrapper run the fake command with this interpreter, whatever python is on the PATH
+    for name in simCmds:
+        with open(os.path.join(binDir, name), 'w') as f:
+            f.write('#!/bin/sh\nexec %s %s fake %s %s "$@"\n' % (sys.executable, simScript, runDir, name))
+        os.chmod(os.path.join(binDir, name), 0755)
+
+    # ip netns exec bind mount /etc/netns/<name>/resolv.conf, the DHCP DNS servers never touch the host
+    if os.path.isdir('/etc/netns/' + simNs) == False:
+        os.makedirs('/etc/netns/' + simNs)
+    open('/etc/netns/%s/resolv.conf' % simNs, 'w').close()
+    for ns in [simNs, simNetNs]:
+        simCommand(['ip', 'netns', 'add', ns])
+    simCommand(['ip', 'netns', 'exec', simNs, 'ip', 'link', 'set', 'lo', 'up'])
+
+    proc = subprocess.Popen(['ip', 'netns', 'exec', simNetNs, sys.executable, simScript, 'modem', 'RUNDIR=' + runDir, \
+                             'PINGTARGET=' + ','.join(simTargets)], \
+                            stdout=open(os.path.join(runDir, 'modem.log'), 'a'), stderr=subprocess.STDOUT, \
+                            preexec_fn=os.setsid)
+    with open(os.path.join(runDir, 'modem.pid'), 'w') as f:
+        f.write('%d\n' % proc.pid)
+
+    # Wait until the control socket ready
+    deadline = time.time() + simStartTimeOut
+    while time.time() < deadline:
+        try:
+            simStatus(runDir)
+            return proc
+        except socket.error:
+            time.sleep(0.05)
+    raise RuntimeError('fake modem not started, see %s' % os.path.join(runDir, 'modem.log'))
+
+# Stop the fake modem and remove the namespaces
+def simDown(runDir):
+    try:
+        os.killpg(int(open(os.path.join(runDir, 'modem.pid')).read()), signal.SIGTERM)
+    except (IOError, OSError, ValueError):
+        pass
+    for ns in [simNs, simNetNs]:
+        simCommand(['ip', 'netns', 'del', ns])
+    try:
+        os.unlink('/etc/netns/%s/resolv.conf' % simNs)
+        os.rmdir('/etc/netns/' + simNs)
+    except OSError:
+        pass
+
+# Start ltemodem.py inside its namespace against the fake modem, return the process
+# PINGTARGET macro also given to the fake modem so the daemon probe targets are reachable
+def simDaemon(runDir, macros=[], stdout=None):
+    for x in macros:
+        if x.startswith("PINGTARGET="):
+            simRequest(runDir, {'op': 'targets', 'targets': [a for a in x[len("PINGTARGET="):].split(',') if a != '']})
+
+    env = dict(os.environ)
+    env['PATH'] = os.path.join(runDir, 'bin') + os.pathsep + env.get('PATH', '')
+    return subprocess.Popen(['ip', 'netns', 'exec', simNs, sys.executable, lteScript, \
+                             'QMIDEV=' + os.path.join(runDir, 'cdc-wdm0'), 'QMIPROXY=' + os.path.join(runDir, 'qmi-proxy'), \
+                             'RUNDIR=' + runDir, 'METRICS=' + os.path.join(runDir, 'metrics.sock')] + macros, \
+                            env=env, stdout=stdout, stderr=subprocess.STDOUT)
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith('RUNDIR=')]
+    if args[:1] != ['run']:
+        args = [a for a in args if not a.startswith('PINGTARGET=')]
+
+    # Started as a fake command through the PATH overlay, fake <run dir> <command> <arguments>
+    if sys.argv[1:2] == ['fake']:
+        fakeCommand(sys.argv[2], sys.argv[3], sys.argv[4:])
+    elif args[:1] == ['modem']:
+        modemMain(simRunDir, simTargets)
+    elif args[:1] == ['up']:
+        simUp(simRunDir)
+        print "Fake modem started, run directory %s" % simRunDir
+    elif args[:1] == ['down']:
+        simDown(simRunDir)
+    elif args[:1] == ['run']:
+        sys.exit(simDaemon(simRunDir, args[1:]).wait())
+    elif args[:1] == ['fault']:
+        err = simFault(simRunDir, dict([(a.split('=', 1)[0], json.loads(a.split('=', 1)[1])) for a in args[1:]]))
+        if err != None:
+            print err
+            sys.exit(1)
+    elif args[:1] == ['status']:
+        print json.dumps(simStatus(simRunDir), indent=1, sort_keys=True)
+    else:
+        print "Usage: python ltesim.py up|run|fault|status|down [RUNDIR=path]"
+        sys.exit(2)
@@ -0,0 +1,68 @@
+# Restart adoption check tests, bearer status, wwan0 address and probe replies set by the test
+# Run from the repository root: python -m unittest discover -s tests
+
+import os, sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import ltemodem
+from ltemodem import QMI_WDS_CONNECTED
+
+# QMI client answering the WDS packet service status from a fixed (status, error)
+class FakeQmiClient(object):
+    def __init__(self):
+        self.result = (QMI_WDS_CONNECTED, None)
+
+    def getPacketServiceStatus(self, timeOut=5.0):
+        return self.result
+
+# ICMP prober answering from a fixed {target: RTT} table, missing targets lost
+class FakeProber(object):
+    def __init__(self):
+        self.replies = {}
+
+    def probeMany(self, targets, timeOut):
+        return dict([(a, self.replies.get(a)) for a in targets])
+
+class AdoptCheckTest(unittest.TestCase):
+    def setUp(self):
+        self.names = ['qmiClient', 'ifaceAddr', 'icmpProber', 'pingTargets', 'probeQuorum']
+        self.saved = dict([(a, getattr(ltemodem, a)) for a in self.names])
+        self.qmi = FakeQmiClient()
+        self.prober = FakeProber()
+        self.addr = '10.64.0.2'
+        ltemodem.qmiClient = self.qmi
+        ltemodem.ifaceAddr = lambda ifName: self.addr
+        ltemodem.icmpProber = self.prober
+        ltemodem.pingTargets = ['8.8.8.8', '1.1.1.1', '9.9.9.9']
+        ltemodem.probeQuorum = 2
+        self.prober.replies = {'8.8.8.8': 0.05, '1.1.1.1': 0.05, '9.9.9.9': 0.05}
+
+    def tearDown(self):
+        for name in self.names:
+            setattr(ltemodem, name, self.saved[name])
+
+    def testAlive(self):
+        self.assertEqual(ltemodem.adoptCheck(), None)
+        # Minority of the targets lost still adopted
+        del self.prober.replies['9.9.9.9']
+        self.assertEqual(ltemodem.adoptCheck(), None)
+
+    def testQmiError(self):
+        self.qmi.result = (None, 'QMI request timeout')
+        self.assertEqual(ltemodem.adoptCheck(), 'WDS packet service status, QMI request timeout')
+
+    def testBearerDown(self):
+        self.qmi.result = (QMI_WDS_CONNECTED - 1, None)
+        self.assertEqual(ltemodem.adoptCheck(), 'bearer not connected')
+
+    def testNoAddress(self):
+        self.addr = None
+        self.assertEqual(ltemodem.adoptCheck(), 'wwan0 address not configured')
+
+    def testQuorumLost(self):
+        self.prober.replies = {'8.8.8.8': 0.05}
+        self.assertEqual(ltemodem.adoptCheck(), 'PING 1.1.1.1,9.9.9.9 FAILED!')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+# Adaptive probe cadence and restart backoff tests
+# Run from the repository root: python -m unittest discover -s tests
+
+import os, sys
+import random
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import ltemodem
+
+class ProbeCadenceTest(unittest.TestCase):
+    def setUp(self):
+        self.cadence = ltemodem.ProbeCadence(1.0, 30.0, 1.5, 2.0)
+
+    def testRelaxWhileStable(self):
+        self.assertEqual(self.cadence.remain(), 0.0)
+        intervals = []
+        for i in range(10):
+            self.cadence.update(0, 0.05)
+            intervals.append(self.cadence.interval)
+        self.assertEqual(intervals[:3], [1.5, 2.25, 3.375])
+        # Bounded by the upper interval
+        self.assertEqual(intervals[-1], 30.0)
+        self.assertTrue(29.0 < self.cadence.remain() <= 30.0)
+
+    def testTightenOnLoss(self):
+        for i in range(5):
+            self.cadence.update(0, 0.05)
+        self.cadence.update(1, 0.05)
+        self.assertEqual(self.cadence.interval, 1.0)
+        for i in range(5):
+            self.cadence.update(0, 0.05)
+        self.cadence.update(3, None)
+        self.assertEqual(self.cadence.interval, 1.0)
+
+    def testTightenOnRttDegraded(self):
+        for i in range(5):
+            self.cadence.update(0, 0.05)
+        self.assertEqual(self.cadence.rttAvg, 0.05)
+        # Above twice the RTT average
+        self.cadence.update(0, 0.2)
+        self.assertEqual(self.cadence.interval, 1.0)
+        # Moving average, 1/8 weight
+        self.assertAlmostEqual(self.cadence.rttAvg, 0.05 + 0.15 / 8)
+
+    def testPassiveAndReset(self):
+        self.cadence.passive()
+        self.assertEqual(self.cadence.interval, 1.5)
+        self.assertTrue(self.cadence.remain() > 1.0)
+        self.cadence.reset()
+        self.assertEqual(self.cadence.interval, 1.0)
+        self.assertEqual(self.cadence.remain(), 0.0)
+
+class BackoffTest(unittest.TestCase):
+    def setUp(self):
+        self.savedRandom = random.random
+        self.ladder = ltemodem.RecoveryLadder([])
+
+    def tearDown(self):
+        random.random = self.savedRandom
+
+    def delays(self, attempts):
+        result = []
+        for attempt in range(1, attempts + 1):
+            self.ladder.attempt = attempt
+            self.ladder.backoff()
+            result.append(self.ladder.delay)
+        return result
+
+    def testExponential(self):
+        random.random = lambda: 0.0
+        delays = self.delays(10)
+        self.assertEqual(delays[:4], [ltemodem.backoffBase * a for a in [1, 2, 4, 8]])
+        self.assertEqual(delays[-1], ltemodem.backoffMax)
+        self.assertTrue(self.ladder.remain() > ltemodem.backoffMax - 1.0)
+
+    def testJitter(self):
+        # Jitter only shorten the delay, never below (1 - backoffJitter) of it
+        random.random = lambda: 1.0
+        self.assertEqual(self.delays(2), [ltemodem.backoffBase * (1 - ltemodem.backoffJitter),
+                                          ltemodem.backoffBase * 2 * (1 - ltemodem.backoffJitter)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+# Monotonic clock and lease age tests, the persisted lease checked against both the wall and monotonic clocks
+# Run from the repository root: python -m unittest discover -s tests
+
+import os, sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import ltemodem
+from ltemodem import monotonicTime
+
+class MonotonicTimeTest(unittest.TestCase):
+    def testElapsed(self):
+        startTime = monotonicTime()
+        time.sleep(0.05)
+        self.assertTrue(0.04 <= monotonicTime() - startTime < 1.0)
+
+    def testUptimeFallback(self):
+        saved = ltemodem.clockGettime
+        try:
+            ltemodem.clockGettime = None
+            with open('/proc/uptime') as f:
+                uptime = float(f.read().split()[0])
+            self.assertTrue(abs(monotonicTime() - uptime) < 1.0)
+        finally:
+            ltemodem.clockGettime = saved
+
+class LeaseAgeTest(unittest.TestCase):
+    def setUp(self):
+        self.stateFile = ltemodem.StateFile('/nonexistent/ltemodem.state')
+        self.client = ltemodem.DhcpClient(ltemodem.SysfsAttrs('nonexistent0'), self.stateFile)
+
+    # Lease as kept on disk, 1 hour lease
+    def storeLease(self, obtained, boot, uptime):
+        self.stateFile.data['lease'] = {'addr': '10.64.0.2', 'mask': '255.255.255.0', 'router': '10.64.0.1',
+                                        'server': '10.64.0.1', 'dns': [], 'leaseTime': 3600, 't1': 1800,
+                                        't2': 3150, 'obtained': obtained, 'boot': boot, 'uptime': uptime}
+
+    def testSameBootWallClockJumped(self):
+        # Obtained 100 sec ago, the wall clock set back a day since then
+        self.storeLease(time.time() + 86400, ltemodem.bootId(), monotonicTime() - 100)
+        self.assertNotEqual(self.client.loadLease(), None)
+        self.assertTrue(1690 <= self.client.renewRemain() <= 1700)
+
+    def testOtherBoot(self):
+        # Obtained 100 sec before this boot, the wall clock already set
+        self.storeLease(time.time() - monotonicTime() - 100, 'other-boot', 5.0)
+        self.client.loadLease()
+        # Monotonic timestamp before the boot
+        self.assertTrue(-110 <= self.client.obtained <= -90)
+
+    def testWallClockNotSet(self):
+        # Wall clock before the lease, no RTC and NTP not synced yet: renewed right away, not expired
+        self.storeLease(time.time() + 86400, 'other-boot', 5.0)
+        self.client.loadLease()
+        self.assertEqual(self.client.renewRemain(), 0.0)
+        self.assertTrue(self.client.obtained + 3150 > monotonicTime())
+
+    def testNoLease(self):
+        self.assertEqual(self.client.loadLease(), None)
+        self.assertEqual(self.client.renewRemain(), None)
+
+if __name__ == '__main__':
+    unittest.main()
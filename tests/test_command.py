@@ -0,0 +1,45 @@
+# Streaming command runner tests, the call return on the first matching output line
+# Run from the repository root: python -m unittest discover -s tests
+
+import os, sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from ltemodem import runCommand
+
+class RunCommandTest(unittest.TestCase):
+    def testOkPatternBeforeExit(self):
+        # Command still running after its success line, reaped in the background
+        startTime = time.time()
+        stdout,stderr = runCommand(['sh', '-c', 'echo Network started successfully; sleep 2'], 5.0, \
+                                   okPatterns=['Network started successfully'])
+        self.assertTrue(time.time() - startTime < 1.0)
+        self.assertEqual(stderr, None)
+        self.assertEqual(stdout, 'Network started successfully\n')
+
+    def testFailPattern(self):
+        startTime = time.time()
+        stdout,stderr = runCommand(['sh', '-c', 'echo starting; echo "error: couldn\'t start network"; sleep 5'], 5.0, \
+                                   okPatterns=['Network started successfully'], failPatterns=['error:'])
+        self.assertTrue(time.time() - startTime < 1.0)
+        self.assertEqual(stderr, "Command FAILED: error: couldn't start network")
+
+    def testExit(self):
+        stdout,stderr = runCommand(['sh', '-c', 'echo one; echo two'], 5.0)
+        self.assertEqual(stderr, None)
+        self.assertEqual(stdout, 'one\ntwo\n')
+
+    def testLastLineWithoutNewLine(self):
+        stdout,stderr = runCommand(['printf', 'Network stopped successfully'], 5.0, okPatterns=['Network stopped successfully'])
+        self.assertEqual(stderr, None)
+        self.assertEqual(stdout, 'Network stopped successfully')
+
+    def testDeadline(self):
+        startTime = time.time()
+        stdout,stderr = runCommand(['sleep', '10'], 0.2)
+        self.assertTrue(time.time() - startTime < 2.0)
+        self.assertEqual(stderr, 'Command deadline 0.200 sec exceeded')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+# Built-in DHCP client packet tests, replies built by hand, no interface or DHCP server needed
+# Run from the repository root: python -m unittest discover -s tests
+
+import os, sys
+import struct
+import socket
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import ltemodem
+from ltemodem import inetChecksum, DHCP_MAGIC, DHCP_REQUEST, DHCP_OFFER, DHCP_ACK
+
+# DHCP reply inside IPv4/UDP, options - raw option bytes without the end option
+def dhcpReply(xid, yiaddr, options, op=2, dstPort=68):
+    bootp = struct.pack('!BBBBIHH4s4s4s4s16s64s128sI', op, 1, 6, 0, xid, 0, 0, '\0' * 4, socket.inet_aton(yiaddr), \
+                        '\0' * 4, '\0' * 4, '\0' * 16, '', '', DHCP_MAGIC) + options + '\xff'
+    udp = struct.pack('!HHHH', 67, dstPort, 8 + len(bootp), 0) + bootp
+    ip = struct.pack('!BBHHHBBH4s4s', 0x45, 0, 20 + len(udp), 0, 0, 64, socket.IPPROTO_UDP, 0, \
+                     socket.inet_aton('10.64.0.1'), '\xff' * 4)
+    return ip + udp
+
+class DhcpParseTest(unittest.TestCase):
+    def setUp(self):
+        self.client = ltemodem.DhcpClient(ltemodem.SysfsAttrs('nonexistent0'))
+        self.client.xid = 0x12345678
+
+    def testAck(self):
+        options = struct.pack('!BBB', 53, 1, DHCP_ACK) + '\0' + struct.pack('!BBI', 51, 4, 3600) + \
+                  struct.pack('!BB4s', 3, 4, socket.inet_aton('10.64.0.1'))
+        msgType,addr,opts = self.client.parse(dhcpReply(0x12345678, '10.64.0.2', options))
+        self.assertEqual(msgType, DHCP_ACK)
+        self.assertEqual(addr, '10.64.0.2')
+        # Pad option skipped
+        self.assertEqual(opts, {53: chr(DHCP_ACK), 51: struct.pack('!I', 3600), 3: socket.inet_aton('10.64.0.1')})
+
+    def testOtherTransaction(self):
+        options = struct.pack('!BBB', 53, 1, DHCP_OFFER)
+        self.assertEqual(self.client.parse(dhcpReply(0x87654321, '10.64.0.2', options)), None)
+
+    def testNotReply(self):
+        options = struct.pack('!BBB', 53, 1, DHCP_OFFER)
+        # Own broadcast request seen on the packet socket
+        self.assertEqual(self.client.parse(dhcpReply(0x12345678, '10.64.0.2', options, op=1)), None)
+        self.assertEqual(self.client.parse(dhcpReply(0x12345678, '10.64.0.2', options, dstPort=67)), None)
+        self.assertEqual(self.client.parse(self.client.packet(DHCP_REQUEST, [])), None)
+
+    def testMalformed(self):
+        options = struct.pack('!BBB', 53, 1, DHCP_OFFER)
+        self.assertEqual(self.client.parse(dhcpReply(0x12345678, '10.64.0.2', options)[:200]), None)
+        self.assertEqual(self.client.parse('\x45' + '\0' * 10), None)
+        # No message type option
+        self.assertEqual(self.client.parse(dhcpReply(0x12345678, '10.64.0.2', struct.pack('!BBI', 51, 4, 60))), None)
+
+    def testRequestPacket(self):
+        data = self.client.packet(DHCP_REQUEST, [(50, socket.inet_aton('10.64.0.2'))])
+        # Valid IPv4 header checksum, broadcast from 0.0.0.0
+        self.assertEqual(inetChecksum(data[:20]), 0)
+        self.assertEqual(data[12:20], '\0' * 4 + '\xff' * 4)
+        self.assertEqual(struct.unpack('!HH', data[20:24]), (68, 67))
+        self.assertEqual(struct.unpack('!I', data[32:36])[0], 0x12345678)
+        self.assertTrue(struct.pack('!BB4s', 50, 4, socket.inet_aton('10.64.0.2')) in data[28 + 240:])
+
+class ChecksumTest(unittest.TestCase):
+    def testIpHeader(self):
+        header = '450000730000400040110000c0a80001c0a800c7'.decode('hex')
+        self.assertEqual(inetChecksum(header), 0xB861)
+        # Checksum in place, verify to 0
+        self.assertEqual(inetChecksum(header[:10] + '\xb8\x61' + header[12:]), 0)
+
+    def testOddLength(self):
+        self.assertEqual(inetChecksum('\x01'), ~0x0100 & 0xFFFF)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+# Module import tests, importing ltemodem must not read the command line or the session state file
+# Run from the repository root: python -m unittest discover -s tests
+
+import os, sys
+import json
+import shutil
+import tempfile
+import subprocess
+import unittest
+
+rootDir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, rootDir)
+import ltemodem
+
+class ImportTest(unittest.TestCase):
+    def setUp(self):
+        self.runDir = tempfile.mkdtemp()
+        with open(os.path.join(self.runDir, 'ltemodem.state'), 'w') as f:
+            json.dump({'rtt': 0.05, 'qmi': {'clientIds': {'2': 5}, 'pktHandle': 1234}}, f)
+
+    def tearDown(self):
+        shutil.rmtree(self.runDir)
+
+    # Import in a fresh interpreter with daemon macros on its command line
+    def importWith(self, argv):
+        code = 'import sys; sys.argv = %r; sys.path.insert(0, %r); import ltemodem; ' % (argv, rootDir) + \
+               'print ltemodem.pingTargets, ltemodem.quectelOpt, ltemodem.stateFile.data, ltemodem.qmiClient.clientIds'
+        proc = subprocess.Popen([sys.executable, '-c', code], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        return proc.communicate()[0],proc.returncode
+
+    def testNoArgvNoState(self):
+        out,code = self.importWith(['test', 'QUECTOPT', 'PINGTARGET=', 'RUNDIR=' + self.runDir])
+        self.assertEqual(code, 0, out)
+        self.assertEqual(out.strip(), "['8.8.8.8', '1.1.1.1', '9.9.9.9'] False {} {}")
+
+    def testParseMacros(self):
+        saved = (ltemodem.pingTargets, ltemodem.probeQuorum, ltemodem.statePath, ltemodem.statusPath, ltemodem.spanPath)
+        try:
+            ltemodem.parseMacros(['test', 'PINGTARGET=192.0.2.1,192.0.2.2', 'RUNDIR=' + self.runDir])
+            self.assertEqual(ltemodem.pingTargets, ['192.0.2.1', '192.0.2.2'])
+            # Majority of the targets
+            self.assertEqual(ltemodem.probeQuorum, 2)
+
+            stateFile = ltemodem.StateFile(ltemodem.statePath)
+            stateFile.load()
+            self.assertEqual(stateFile.get('rtt'), 0.05)
+        finally:
+            ltemodem.pingTargets,ltemodem.probeQuorum,ltemodem.statePath,ltemodem.statusPath,ltemodem.spanPath = saved
+
+    def testEmptyPingTarget(self):
+        saved = ltemodem.pingTargets
+        try:
+            self.assertRaises(SystemExit, ltemodem.parseMacros, ['test', 'PINGTARGET=,'])
+        finally:
+            ltemodem.pingTargets = saved
+
+if __name__ == '__main__':
+    unittest.main()
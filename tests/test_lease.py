@@ -0,0 +1,86 @@
+# DHCP lease maintenance tests, T1 renew, T2 rebind and expiry with a fake renew exchange
+# Run from the repository root: python -m unittest discover -s tests
+
+import os, sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import ltemodem
+from ltemodem import ST_MONITOR
+
+# DHCP client renewing without any socket, renew result set by the test
+class FakeDhcpClient(ltemodem.DhcpClient):
+    def __init__(self):
+        ltemodem.DhcpClient.__init__(self, ltemodem.SysfsAttrs('nonexistent0'))
+        self.result = (None, 'No DHCPACK received')
+        self.calls = []         # rebind flag of each renew call
+
+    def renew(self, timeOut, rebind=False):
+        self.calls.append(rebind)
+        return self.result
+
+    # Lease obtained age sec ago
+    def setLease(self, addr, age):
+        self.lease = {'addr': addr, 'server': '10.64.0.1', 'leaseTime': 3600, 't1': 1800, 't2': 3150}
+        self.obtained = ltemodem.monotonicTime() - age
+        self.renewTime = self.obtained + self.lease['t1']
+
+class LeaseMaintainTest(unittest.TestCase):
+    def setUp(self):
+        self.saved = (ltemodem.dhcpClient, ltemodem.dhcpApply)
+        self.client = FakeDhcpClient()
+        self.applied = []
+        ltemodem.dhcpClient = self.client
+        ltemodem.dhcpApply = lambda lease: self.applied.append(lease['addr'])
+        self.sm = ltemodem.LteStateMachine(ltemodem.lteStateTable, ltemodem.qmicliSteps, ST_MONITOR)
+
+    def tearDown(self):
+        ltemodem.dhcpClient,ltemodem.dhcpApply = self.saved
+
+    def testNothingDue(self):
+        self.assertEqual(ltemodem.leaseMaintain(self.sm), True)
+        self.client.setLease('10.64.0.2', 100)
+        self.assertEqual(ltemodem.leaseMaintain(self.sm), True)
+        self.assertEqual(self.client.calls, [])
+
+    def testRenewT1(self):
+        self.client.setLease('10.64.0.2', 2000)
+        self.client.result = ({'addr': '10.64.0.2', 'leaseTime': 3600}, None)
+        self.assertEqual(ltemodem.leaseMaintain(self.sm), True)
+        # Unicast to the server, same address kept
+        self.assertEqual(self.client.calls, [False])
+        self.assertEqual(self.applied, [])
+        self.assertTrue('renewed' in self.sm.history[-1][4])
+
+    def testRebindT2(self):
+        self.client.setLease('10.64.0.2', 3200)
+        self.client.result = ({'addr': '10.64.0.9', 'leaseTime': 3600}, None)
+        self.assertEqual(ltemodem.leaseMaintain(self.sm), True)
+        self.assertEqual(self.client.calls, [True])
+        # Different address given on rebind, applied to wwan0
+        self.assertEqual(self.applied, ['10.64.0.9'])
+
+    def testExpired(self):
+        self.client.setLease('10.64.0.2', 3700)
+        self.assertEqual(ltemodem.leaseMaintain(self.sm), False)
+        self.assertEqual(self.client.calls, [])
+        self.assertEqual(self.sm.history[-1][4], 'DHCP lease 10.64.0.2 expired')
+
+    def testRenewFailed(self):
+        self.client.setLease('10.64.0.2', 2000)
+        self.assertEqual(ltemodem.leaseMaintain(self.sm), True)
+        self.assertTrue('renew FAILED!' in self.sm.history[-1][4])
+        # Retried after half of the time left until T2
+        self.assertTrue(570.0 <= self.client.renewRemain() <= 575.0)
+
+    def testNak(self):
+        # Lease dropped on DHCPNAK, obtain a new lease
+        self.client.setLease('10.64.0.2', 2000)
+        def nak(timeOut, rebind=False):
+            self.client.lease = None
+            return None,'DHCPNAK received'
+        self.client.renew = nak
+        self.assertEqual(ltemodem.leaseMaintain(self.sm), False)
+
+if __name__ == '__main__':
+    unittest.main()
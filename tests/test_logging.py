@@ -0,0 +1,58 @@
+# Queue log listener tests, duplicate suppression and stop
+# Run from the repository root: python -m unittest discover -s tests
+
+import os, sys
+import thread
+import logging
+import Queue
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from ltemodem import QueueListener
+
+# Log handler keeping the written messages
+class ListHandler(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+# Log record as queued by QueueHandler
+def logRecord(msg, level=logging.INFO):
+    return logging.makeLogRecord({'name': 'ltemodem.4g', 'levelno': level, 'msg': msg})
+
+class QueueListenerTest(unittest.TestCase):
+    def setUp(self):
+        self.handler = ListHandler()
+        self.queue = Queue.Queue(16)
+        self.listener = QueueListener(self.queue, self.handler, 300.0)
+
+    def testDuplicatesSummarized(self):
+        for msg in ['PING lost', 'PING lost', 'PING lost', 'PING OK']:
+            self.listener.handle(logRecord(msg))
+        self.assertEqual(self.handler.messages, ['PING lost', 'PING lost [repeated 2 times]', 'PING OK'])
+
+    def testSameMessageOtherLevel(self):
+        self.listener.handle(logRecord('PING lost'))
+        self.listener.handle(logRecord('PING lost', logging.ERROR))
+        self.assertEqual(self.handler.messages, ['PING lost', 'PING lost'])
+
+    def testDuplicatesFlushedPeriodically(self):
+        self.listener.dupFlush = 0.0
+        for msg in ['QMI channel FAILED!', 'QMI channel FAILED!', 'QMI channel FAILED!']:
+            self.listener.handle(logRecord(msg))
+        self.assertEqual(self.handler.messages, ['QMI channel FAILED!', 'QMI channel FAILED! [repeated 1 times]',
+                                                 'QMI channel FAILED! [repeated 1 times]'])
+
+    def testStopWriteQueued(self):
+        thread.start_new_thread(self.listener.run, ("[logListener]",))
+        for msg in ['STATE DHCP -> MONITOR', 'PING OK', 'PING OK']:
+            self.queue.put(logRecord(msg))
+        self.listener.stop()
+        self.assertTrue(self.listener.doneEvt.isSet())
+        self.assertEqual(self.handler.messages, ['STATE DHCP -> MONITOR', 'PING OK', 'PING OK [repeated 1 times]'])
+
+if __name__ == '__main__':
+    unittest.main()
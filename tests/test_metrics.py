@@ -0,0 +1,33 @@
+# Metrics histogram tests
+# Run from the repository root: python -m unittest discover -s tests
+
+import os, sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from ltemodem import Histogram
+
+class HistogramTest(unittest.TestCase):
+    def testRender(self):
+        histogram = Histogram([0.1, 1, 5])
+        for value in [0.05, 0.1, 0.5, 7.0]:
+            histogram.observe(value)
+        # Cumulative buckets, bucket upper bound inclusive
+        self.assertEqual(histogram.render('ltemodem_test_seconds', 'command="dhcp"'),
+                         ['ltemodem_test_seconds_bucket{command="dhcp",le="0.1"} 2',
+                          'ltemodem_test_seconds_bucket{command="dhcp",le="1"} 3',
+                          'ltemodem_test_seconds_bucket{command="dhcp",le="5"} 3',
+                          'ltemodem_test_seconds_bucket{command="dhcp",le="+Inf"} 4',
+                          'ltemodem_test_seconds_sum{command="dhcp"} 7.650000',
+                          'ltemodem_test_seconds_count{command="dhcp"} 4'])
+
+    def testRenderNoLabel(self):
+        histogram = Histogram([1])
+        self.assertEqual(histogram.render('ltemodem_test_seconds'),
+                         ['ltemodem_test_seconds_bucket{le="1"} 0',
+                          'ltemodem_test_seconds_bucket{le="+Inf"} 0',
+                          'ltemodem_test_seconds_sum 0.000000',
+                          'ltemodem_test_seconds_count 0'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+# wwan0 link event tests, rtnetlink messages built by hand, no netlink socket needed
+# Run from the repository root: python -m unittest discover -s tests
+
+import os, sys
+import time
+import struct
+import socket
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import ltemodem
+from ltemodem import packRtAttr
+from ltemodem import RTM_NEWLINK, RTM_DELLINK, RTM_NEWADDR, RTM_DELADDR, IFLA_IFNAME, IFA_LOCAL, IFA_LABEL
+from ltemodem import IFF_UP, IFF_LOWER_UP
+
+# RTM_NEWLINK/RTM_DELLINK payload, ifinfomsg then attributes
+def linkPayload(ifName, flags):
+    return struct.pack('=BxHiII', socket.AF_UNSPEC, 0, 5, flags, 0) + packRtAttr(IFLA_IFNAME, ifName + '\0')
+
+# RTM_NEWADDR/RTM_DELADDR payload, ifaddrmsg then attributes
+def addrPayload(ifName, addr):
+    return struct.pack('=BBBBI', socket.AF_INET, 24, 0, 0, 5) + packRtAttr(IFA_LOCAL, socket.inet_aton(addr)) + \
+           packRtAttr(IFA_LABEL, ifName + '\0')
+
+class LinkEventTest(unittest.TestCase):
+    def setUp(self):
+        self.monitor = ltemodem.NetlinkMonitor('wwan0')
+
+    def testCarrierLost(self):
+        self.monitor.linkMsg(RTM_NEWLINK, linkPayload('wwan0', IFF_UP | IFF_LOWER_UP))
+        self.assertEqual(self.monitor.takeLinkLost(), None)
+        self.monitor.linkMsg(RTM_NEWLINK, linkPayload('wwan0', IFF_UP))
+        self.assertEqual(self.monitor.takeLinkLost(), 'wwan0 carrier lost')
+        # Taken once
+        self.assertEqual(self.monitor.takeLinkLost(), None)
+
+    def testOtherInterface(self):
+        self.monitor.linkMsg(RTM_NEWLINK, linkPayload('wwan0', IFF_UP | IFF_LOWER_UP))
+        self.monitor.linkMsg(RTM_DELLINK, linkPayload('eth0', 0))
+        self.monitor.addrMsg(RTM_DELADDR, addrPayload('eth0', '192.168.1.2'))
+        self.assertEqual(self.monitor.takeLinkLost(), None)
+
+    def testLinkRemoved(self):
+        self.monitor.addrMsg(RTM_NEWADDR, addrPayload('wwan0', '10.64.0.2'))
+        self.monitor.linkMsg(RTM_DELLINK, linkPayload('wwan0', 0))
+        self.assertEqual(self.monitor.takeLinkLost(), 'wwan0 removed')
+        self.assertEqual(self.monitor.addrs, set())
+
+    def testAddressRemoved(self):
+        self.monitor.addrMsg(RTM_NEWADDR, addrPayload('wwan0', '10.64.0.2'))
+        self.assertEqual(self.monitor.addrs, set(['10.64.0.2']))
+        self.monitor.addrMsg(RTM_DELADDR, addrPayload('wwan0', '10.64.0.2'))
+        self.assertEqual(self.monitor.takeLinkLost(), 'wwan0 address 10.64.0.2 removed')
+
+    def testOwnRemoval(self):
+        self.monitor.expectRemoval(['10.64.0.2'])
+        self.monitor.addrMsg(RTM_DELADDR, addrPayload('wwan0', '10.64.0.2'))
+        self.assertEqual(self.monitor.takeLinkLost(), None)
+        # Only the expected removal ignored
+        self.monitor.addrMsg(RTM_DELADDR, addrPayload('wwan0', '10.64.0.2'))
+        self.assertEqual(self.monitor.takeLinkLost(), 'wwan0 address 10.64.0.2 removed')
+
+    def testLossBeforeSince(self):
+        self.monitor.setLinkLost('bearer disconnected')
+        # Caused before the monitoring started, dropped
+        self.assertEqual(self.monitor.takeLinkLost(ltemodem.monotonicTime() + 1), None)
+        self.assertEqual(self.monitor.takeLinkLost(), None)
+        self.monitor.setLinkLost('bearer disconnected')
+        self.assertEqual(self.monitor.takeLinkLost(ltemodem.monotonicTime() - 1), 'bearer disconnected')
+
+    def testWake(self):
+        # Nothing pending, wait the whole delay
+        startTime = time.time()
+        self.monitor.wait(0.1)
+        self.assertTrue(time.time() - startTime >= 0.09)
+
+        # Link loss wake up the wait at once, repeated wake up drained together
+        self.monitor.setLinkLost('wwan0 carrier lost')
+        self.monitor.wake()
+        startTime = time.time()
+        self.monitor.wait(5.0)
+        self.assertTrue(time.time() - startTime < 1.0)
+        startTime = time.time()
+        self.monitor.wait(0.1)
+        self.assertTrue(time.time() - startTime >= 0.09)
+
+if __name__ == '__main__':
+    unittest.main()
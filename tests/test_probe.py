@@ -0,0 +1,112 @@
+# Multi-target probe quorum decision tests, MONITOR state with a fake prober and fake wwan0 attributes
+# Run from the repository root: python -m unittest discover -s tests
+
+import os, sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import ltemodem
+from ltemodem import ST_MONITOR
+
+# ICMP prober answering from a fixed {target: RTT} table, missing targets lost
+class FakeProber(object):
+    def __init__(self):
+        self.replies = {}
+        self.probeCnt = 0
+
+    def probeMany(self, targets, timeOut):
+        self.probeCnt += 1
+        return dict([(a, self.replies.get(a)) for a in targets])
+
+    def lossPct(self):
+        return 0.0
+
+# wwan0 up with carrier, no traffic counters
+class FakeAttrs(object):
+    ifName = 'wwan0'
+
+    def __init__(self):
+        self.operState = 'up'
+
+    def linkState(self):
+        return self.operState,'1'
+
+    def read(self, name):
+        return None
+
+class QuorumTest(unittest.TestCase):
+    def setUp(self):
+        self.names = ['sysfsAttrs', 'icmpProber', 'trafficCounters', 'probeCadence', 'stateFile', 'dhcpClient',
+                      'recoveryLadder', 'pingTargets', 'probeQuorum', 'pingAttempt', 'lteModemStat']
+        self.saved = dict([(a, getattr(ltemodem, a)) for a in self.names])
+        self.attrs = FakeAttrs()
+        self.prober = FakeProber()
+        ltemodem.sysfsAttrs = self.attrs
+        ltemodem.icmpProber = self.prober
+        ltemodem.trafficCounters = ltemodem.TrafficCounters(self.attrs)
+        ltemodem.probeCadence = ltemodem.ProbeCadence(1.0, 30.0, 1.5, 2.0)
+        ltemodem.stateFile = ltemodem.StateFile('/nonexistent/ltemodem.state')
+        ltemodem.dhcpClient = ltemodem.DhcpClient(self.attrs)
+        ltemodem.recoveryLadder = ltemodem.RecoveryLadder([])
+        ltemodem.pingTargets = ['8.8.8.8', '1.1.1.1', '9.9.9.9']
+        ltemodem.probeQuorum = 2
+        ltemodem.pingAttempt = 0
+        self.sm = ltemodem.LteStateMachine(ltemodem.lteStateTable, ltemodem.qmicliSteps, ST_MONITOR)
+
+    def tearDown(self):
+        for name in self.names:
+            setattr(ltemodem, name, self.saved[name])
+
+    # One monitoring cycle, probe due right away
+    def cycle(self, linkLost=None):
+        ltemodem.probeCadence.reset()
+        self.sm.linkLost = linkLost
+        return ltemodem.stateMonitor(self.sm)
+
+    def testMinorityLost(self):
+        self.prober.replies = {'8.8.8.8': 0.05, '1.1.1.1': 0.07}
+        self.assertEqual(self.cycle(), None)
+        self.assertEqual(ltemodem.pingAttempt, 0)
+        self.assertEqual(ltemodem.lteModemStat, True)
+        # Median RTT kept as the last good RTT
+        self.assertEqual(ltemodem.stateFile.get('rtt'), 0.07)
+
+    def testQuorumLost(self):
+        self.prober.replies = {'8.8.8.8': 0.05}
+        for attempt in range(1, ltemodem.probeFailLimit):
+            self.assertEqual(self.cycle(), None)
+            self.assertEqual(ltemodem.pingAttempt, attempt)
+        # Failed probeFailLimit cycles in a row
+        self.assertEqual(self.cycle(), False)
+        self.assertEqual(self.sm.failCause, 'probe')
+        self.assertEqual(ltemodem.lteModemStat, False)
+
+    def testRecoveredBeforeLimit(self):
+        self.prober.replies = {}
+        self.assertEqual(self.cycle(), None)
+        self.assertEqual(ltemodem.pingAttempt, 1)
+        self.prober.replies = {'8.8.8.8': 0.05, '1.1.1.1': 0.05, '9.9.9.9': 0.05}
+        self.assertEqual(self.cycle(), None)
+        self.assertEqual(ltemodem.pingAttempt, 0)
+
+    def testQuorumOverride(self):
+        # QUORUM=1, any lost target counted as a failure
+        ltemodem.probeQuorum = 1
+        self.prober.replies = {'8.8.8.8': 0.05, '1.1.1.1': 0.05}
+        self.cycle()
+        self.assertEqual(ltemodem.pingAttempt, 1)
+
+    def testLinkLost(self):
+        # Link loss fail the state at once, without probing
+        self.assertEqual(self.cycle('wwan0 carrier lost'), False)
+        self.assertEqual(self.sm.failCause, 'link')
+        self.assertEqual(self.prober.probeCnt, 0)
+
+    def testSysfsLinkDown(self):
+        # Link loss missed by the netlink listener, caught from the sysfs operstate
+        self.attrs.operState = 'down'
+        self.assertEqual(self.cycle(), False)
+        self.assertEqual(self.sm.failCause, 'link')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,229 @@
+# QMUX/TLV codec and in-process QMI client tests
+# The client talk to a fake QMI endpoint on the other end of a socketpair, no modem or qmi-proxy needed
+# Run from the repository root: python -m unittest discover -s tests
+
+import os, sys
+import struct
+import socket
+import thread
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import ltemodem
+from ltemodem import qmiTlvPack, qmiTlvUnpack, qmiFramePack, qmiFrameUnpack, qmiFrameSplit, qmiResult
+from ltemodem import QMI_SVC_CTL, QMI_SVC_WDS, QMI_SVC_DMS, QMI_MSG_REQUEST, QMI_MSG_RESPONSE, QMI_MSG_INDICATION
+from ltemodem import QMI_CTL_ALLOCATE_CID, QMI_DMS_GET_OPERATING_MODE, QMI_WDS_PKT_SRVC_STATUS, QMI_TLV_RESULT
+from ltemodem import QMI_ERR_INVALID_CLIENT_ID, QMI_WDS_CONNECTED, QMI_WDS_DISCONNECTED
+
+# QMI result TLV, error None for success
+def resultTlv(error=None):
+    if error == None:
+        return (QMI_TLV_RESULT, struct.pack('<HH', 0, 0))
+    return (QMI_TLV_RESULT, struct.pack('<HH', 1, error))
+
+class QmiCodecTest(unittest.TestCase):
+    def testTlvRoundTrip(self):
+        tlvs = [(0x01, 'internet'), (0x10, ''), (0x11, '\x00\x01\x02')]
+        self.assertEqual(qmiTlvUnpack(qmiTlvPack(tlvs)), dict(tlvs))
+
+    def testTlvTruncated(self):
+        # Value shorter than its length, kept as received
+        self.assertEqual(qmiTlvUnpack(struct.pack('<BH', 0x01, 4) + 'ab'), {0x01: 'ab'})
+        self.assertEqual(qmiTlvUnpack('\x01\x00'), {})
+
+    def testCtlFrameRoundTrip(self):
+        frame = qmiFramePack(QMI_SVC_CTL, 0, QMI_MSG_REQUEST, 0x1FF, QMI_CTL_ALLOCATE_CID, [(0x01, chr(QMI_SVC_DMS))])
+        self.assertEqual(frame[0], '\x01')
+        self.assertEqual(struct.unpack('<H', frame[1:3])[0], len(frame) - 1)
+        # CTL transaction ID is 8 bits
+        self.assertEqual(qmiFrameUnpack(frame), (QMI_SVC_CTL, 0, QMI_MSG_REQUEST, 0xFF, QMI_CTL_ALLOCATE_CID, \
+                                                 {0x01: chr(QMI_SVC_DMS)}))
+
+    def testServiceFrameRoundTrip(self):
+        for msgType in (QMI_MSG_REQUEST, QMI_MSG_RESPONSE, QMI_MSG_INDICATION):
+            frame = qmiFramePack(QMI_SVC_WDS, 7, msgType, 0x1234, QMI_WDS_PKT_SRVC_STATUS, [resultTlv()])
+            self.assertEqual(qmiFrameUnpack(frame), (QMI_SVC_WDS, 7, msgType, 0x1234, QMI_WDS_PKT_SRVC_STATUS, \
+                                                     {QMI_TLV_RESULT: '\0' * 4}))
+
+    def testFrameSplit(self):
+        first = qmiFramePack(QMI_SVC_DMS, 1, QMI_MSG_RESPONSE, 1, QMI_DMS_GET_OPERATING_MODE, [resultTlv()])
+        second = qmiFramePack(QMI_SVC_DMS, 1, QMI_MSG_RESPONSE, 2, QMI_DMS_GET_OPERATING_MODE, [resultTlv()])
+        data = first + second
+
+        # Complete frames and the partial one kept for the next read
+        frames,rest = qmiFrameSplit(data[:-3])
+        self.assertEqual(frames, [first])
+        self.assertEqual(rest, second[:-3])
+        frames,rest = qmiFrameSplit(rest + data[-3:])
+        self.assertEqual(frames, [second])
+        self.assertEqual(rest, '')
+
+    def testFrameSplitResync(self):
+        frame = qmiFramePack(QMI_SVC_DMS, 1, QMI_MSG_RESPONSE, 1, QMI_DMS_GET_OPERATING_MODE, [resultTlv()])
+        frames,rest = qmiFrameSplit('\xff\x00garbage' + frame)
+        self.assertEqual(frames, [frame])
+        self.assertEqual(rest, '')
+
+    def testResult(self):
+        self.assertEqual(qmiResult(dict([resultTlv()])), (0, 0))
+        self.assertEqual(qmiResult(dict([resultTlv(14)])), (1, 14))
+        # Missing result TLV
+        self.assertEqual(qmiResult({}), (1, 0xFFFF))
+
+# Fake QMI endpoint, answer every request with handler(service, client ID, message ID, TLVs) -> response TLVs
+# Requests received kept as (service, client ID, message ID)
+class FakeEndpoint(object):
+    def __init__(self, sock, handler):
+        self.sock = sock
+        self.handler = handler
+        self.requests = []
+        self.nextCid = 1
+
+    def send(self, service, clientId, msgType, txnId, msgId, tlvs):
+        self.sock.sendall(qmiFramePack(service, clientId, msgType, txnId, msgId, tlvs))
+
+    def run(self, threadname):
+        rxBuf = ''
+        while True:
+            try:
+                data = self.sock.recv(4096)
+            except socket.error:
+                break
+            if data == '':
+                break
+            frames,rxBuf = qmiFrameSplit(rxBuf + data)
+            for frame in frames:
+                service,clientId,msgType,txnId,msgId,tlvs = qmiFrameUnpack(frame)
+                self.requests.append((service, clientId, msgId))
+                respTlvs = self.handler(service, clientId, msgId, tlvs)
+                self.send(service, clientId, QMI_MSG_RESPONSE, txnId, msgId, respTlvs)
+
+    # Default answers, new client ID on allocation and online operating mode
+    def answer(self, service, clientId, msgId, tlvs):
+        if service == QMI_SVC_CTL and msgId == QMI_CTL_ALLOCATE_CID:
+            cid = self.nextCid
+            self.nextCid += 1
+            return [resultTlv(), (0x01, tlvs[0x01] + chr(cid))]
+        if service == QMI_SVC_DMS and msgId == QMI_DMS_GET_OPERATING_MODE:
+            return [resultTlv(), (0x01, chr(0))]
+        return [resultTlv()]
+
+class QmiClientTest(unittest.TestCase):
+    def setUp(self):
+        self.sock,peer = socket.socketpair()
+        self.endpoint = FakeEndpoint(peer, self.answer)
+        self.client = ltemodem.QmiClient(ltemodem.QmiTransport('/nonexistent/cdc-wdm0', sock=self.sock))
+        self.errors = {}        # (service, client ID, message ID) -> QMI error code to answer once
+        thread.start_new_thread(self.endpoint.run, ("[fakeEndpoint]",))
+        thread.start_new_thread(self.client.run, ("[qmiClient]",))
+
+    def tearDown(self):
+        self.endpoint.sock.close()
+
+    def answer(self, service, clientId, msgId, tlvs):
+        error = self.errors.pop((service, clientId, msgId), None)
+        if error != None:
+            return [resultTlv(error)]
+        return self.endpoint.answer(service, clientId, msgId, tlvs)
+
+    def testAllocateAndRequest(self):
+        mode,err = self.client.getOperatingMode(2.0)
+        self.assertEqual(err, None)
+        self.assertEqual(mode, 0)
+        self.assertEqual(self.client.clientIds, {QMI_SVC_DMS: 1})
+
+        # Client ID reused for the next request
+        mode,err = self.client.getOperatingMode(2.0)
+        self.assertEqual(err, None)
+        self.assertEqual(self.endpoint.requests, [(QMI_SVC_CTL, 0, QMI_CTL_ALLOCATE_CID),
+                                                  (QMI_SVC_DMS, 1, QMI_DMS_GET_OPERATING_MODE),
+                                                  (QMI_SVC_DMS, 1, QMI_DMS_GET_OPERATING_MODE)])
+
+    def testProtocolError(self):
+        self.client.clientIds[QMI_SVC_DMS] = 3
+        self.errors[(QMI_SVC_DMS, 3, QMI_DMS_GET_OPERATING_MODE)] = 14
+        mode,err = self.client.getOperatingMode(2.0)
+        self.assertEqual(mode, None)
+        self.assertEqual(err.code, 14)
+
+    def testInvalidClientIdAllocatedAgain(self):
+        # Client ID from before a modem reset
+        self.client.clientIds[QMI_SVC_DMS] = 9
+        self.errors[(QMI_SVC_DMS, 9, QMI_DMS_GET_OPERATING_MODE)] = QMI_ERR_INVALID_CLIENT_ID
+        mode,err = self.client.getOperatingMode(2.0)
+        self.assertEqual(err, None)
+        self.assertEqual(self.client.clientIds, {QMI_SVC_DMS: 1})
+        self.assertEqual(self.endpoint.requests, [(QMI_SVC_DMS, 9, QMI_DMS_GET_OPERATING_MODE),
+                                                  (QMI_SVC_CTL, 0, QMI_CTL_ALLOCATE_CID),
+                                                  (QMI_SVC_DMS, 1, QMI_DMS_GET_OPERATING_MODE)])
+
+    def testTimeout(self):
+        self.client.clientIds[QMI_SVC_DMS] = 3
+        self.endpoint.handler = lambda service, clientId, msgId, tlvs: None
+        self.endpoint.send = lambda *args: None
+        mode,err = self.client.getOperatingMode(0.2)
+        self.assertEqual(mode, None)
+        self.assertEqual(err.code, None)
+
+    def testIndication(self):
+        received = []
+        done = threading.Event()
+        def handler(tlvs):
+            received.append(tlvs)
+            done.set()
+        self.client.addIndication(QMI_SVC_WDS, QMI_WDS_PKT_SRVC_STATUS, handler)
+        self.client.connected.wait(2.0)
+
+        self.endpoint.send(QMI_SVC_WDS, 1, QMI_MSG_INDICATION, 0, QMI_WDS_PKT_SRVC_STATUS, [(0x01, '\x01\x00')])
+        done.wait(2.0)
+        self.assertEqual(received, [{0x01: '\x01\x00'}])
+
+class QmiIndicationListenerTest(unittest.TestCase):
+    def setUp(self):
+        self.sock,peer = socket.socketpair()
+        self.endpoint = FakeEndpoint(peer, None)
+        self.endpoint.handler = self.endpoint.answer
+        self.client = ltemodem.QmiClient(ltemodem.QmiTransport('/nonexistent/cdc-wdm0', sock=self.sock))
+        # Bearer loss reported to a fresh link monitor instead of the daemon one
+        self.savedMonitor = ltemodem.linkMonitor
+        ltemodem.linkMonitor = ltemodem.NetlinkMonitor('wwan0')
+        self.listener = ltemodem.QmiIndicationListener(self.client, ltemodem.qmiBearerDown)
+        # Registered after the listener, set once the listener handled the indication
+        self.handled = threading.Event()
+        self.client.addIndication(QMI_SVC_WDS, QMI_WDS_PKT_SRVC_STATUS, lambda tlvs: self.handled.set())
+        thread.start_new_thread(self.endpoint.run, ("[fakeEndpoint]",))
+        thread.start_new_thread(self.client.run, ("[qmiClient]",))
+        self.client.connected.wait(2.0)
+
+    def tearDown(self):
+        ltemodem.linkMonitor = self.savedMonitor
+        self.endpoint.sock.close()
+
+    # Send packet service status indication and wait until handled
+    def indicate(self, connStat):
+        self.handled.clear()
+        self.endpoint.send(QMI_SVC_WDS, 1, QMI_MSG_INDICATION, 0, QMI_WDS_PKT_SRVC_STATUS, [(0x01, chr(connStat) + '\x00')])
+        self.assertTrue(self.handled.wait(2.0))
+
+    def testBearerDisconnected(self):
+        self.assertTrue(QMI_SVC_WDS in self.client.watchServices)
+        self.indicate(QMI_WDS_CONNECTED)
+        self.assertEqual(ltemodem.linkMonitor.takeLinkLost(), None)
+
+        self.indicate(QMI_WDS_DISCONNECTED)
+        self.assertEqual(ltemodem.linkMonitor.takeLinkLost(), 'bearer disconnected (QMI WDS packet service status)')
+
+    def testRepeatedDisconnectIgnored(self):
+        self.indicate(QMI_WDS_DISCONNECTED)
+        self.assertNotEqual(ltemodem.linkMonitor.takeLinkLost(), None)
+        self.indicate(QMI_WDS_DISCONNECTED)
+        self.assertEqual(ltemodem.linkMonitor.takeLinkLost(), None)
+
+        # Reported again once the bearer came back and dropped
+        self.indicate(QMI_WDS_CONNECTED)
+        self.indicate(QMI_WDS_DISCONNECTED)
+        self.assertNotEqual(ltemodem.linkMonitor.takeLinkLost(), None)
+
+if __name__ == '__main__':
+    unittest.main()
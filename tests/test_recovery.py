@@ -0,0 +1,89 @@
+# Recovery escalation ladder tests, rung actions return the result set by the test
+# Run from the repository root: python -m unittest discover -s tests
+
+import os, sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import ltemodem
+from ltemodem import ST_MONITOR, ST_DHCP, ST_TEARDOWN
+
+class RecoveryLadderTest(unittest.TestCase):
+    def setUp(self):
+        self.runDir = tempfile.mkdtemp()
+        self.saved = (ltemodem.stateFile, ltemodem.sysfsAttrs)
+        ltemodem.stateFile = ltemodem.StateFile(os.path.join(self.runDir, 'ltemodem.state'))
+        ltemodem.sysfsAttrs = ltemodem.SysfsAttrs('nonexistent0')
+        self.results = {}       # Rung name -> action result, failed when not set
+        self.tried = []
+        self.ladder = self.newLadder()
+
+    def tearDown(self):
+        ltemodem.stateFile,ltemodem.sysfsAttrs = self.saved
+        shutil.rmtree(self.runDir)
+
+    def newLadder(self):
+        rungs = [(a, lambda ladder, name=a: self.action(name), b) for a,b in [('dhcp-renew', ST_MONITOR),
+                                                                               ('wds-restart', ST_DHCP),
+                                                                               ('modem-reset', ST_TEARDOWN)]]
+        return ltemodem.RecoveryLadder(rungs)
+
+    def action(self, name):
+        self.tried.append(name)
+        return self.results.get(name, False)
+
+    def testCheapestFirst(self):
+        self.results['wds-restart'] = True
+        # Failed rung 1 escalated within the same attempt
+        self.assertEqual(self.ladder.escalate(1), ST_DHCP)
+        self.assertEqual(self.tried, ['dhcp-renew', 'wds-restart'])
+        self.assertEqual(self.ladder.rung, 2)
+        self.assertEqual(self.ladder.tryCnt, {'dhcp-renew': 1, 'wds-restart': 1})
+
+        # Not recovered, the next attempt start from the next rung
+        self.results['modem-reset'] = True
+        self.assertEqual(self.ladder.escalate(1), ST_TEARDOWN)
+        self.assertEqual(self.tried[2:], ['modem-reset'])
+
+    def testMinRung(self):
+        self.results['wds-restart'] = True
+        self.assertEqual(self.ladder.escalate(2), ST_DHCP)
+        self.assertEqual(self.tried, ['wds-restart'])
+
+    def testTopRung(self):
+        # Nothing more expensive left, stay on the top rung
+        self.assertEqual(self.ladder.escalate(1), ST_TEARDOWN)
+        self.assertEqual(self.ladder.escalate(1), ST_TEARDOWN)
+        self.assertEqual(self.tried, ['dhcp-renew', 'wds-restart', 'modem-reset', 'modem-reset'])
+
+    def testRecovered(self):
+        self.results['dhcp-renew'] = True
+        self.ladder.escalate(1)
+        # Outage started 10 sec ago on the monotonic clock
+        self.ladder.failTime -= 10.0
+        self.ladder.recovered()
+        self.assertEqual(self.ladder.mttr['dhcp-renew'][0], 1)
+        self.assertTrue(10.0 <= self.ladder.meanTime()['dhcp-renew'] < 11.0)
+        self.assertEqual((self.ladder.rung, self.ladder.failTime, self.ladder.attempt), (0, None, 0))
+        self.assertEqual(self.ladder.remain(), 0.0)
+
+        # Nothing to account without an outage
+        self.ladder.recovered()
+        self.assertEqual(self.ladder.mttr['dhcp-renew'][0], 1)
+
+    def testStateKept(self):
+        self.results['dhcp-renew'] = True
+        self.ladder.escalate(1)
+        self.ladder.recovered()
+
+        # Counters restored by the next daemon instance
+        ltemodem.stateFile.load()
+        ladder = self.newLadder()
+        ladder.loadState()
+        self.assertEqual(ladder.tryCnt, {'dhcp-renew': 1})
+        self.assertEqual(ladder.mttr.keys(), ['dhcp-renew'])
+
+if __name__ == '__main__':
+    unittest.main()
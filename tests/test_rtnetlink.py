@@ -0,0 +1,66 @@
+# rtnetlink attribute packing tests, no netlink socket needed
+# Run from the repository root: python -m unittest discover -s tests
+
+import os, sys
+import struct
+import socket
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import ltemodem
+from ltemodem import packRtAttr, parseRtAttrs
+from ltemodem import IFLA_IFNAME, IFA_LOCAL, RTM_NEWADDR, RTM_DELADDR, RTM_NEWROUTE, RTA_GATEWAY, RTA_OIF, RTA_PRIORITY
+from ltemodem import NLM_F_CREATE, NLM_F_REPLACE
+
+class RtAttrTest(unittest.TestCase):
+    def testPadding(self):
+        data = packRtAttr(IFLA_IFNAME, 'wwan0')
+        # Length field without the padding, the attribute padded to 4 bytes
+        self.assertEqual(struct.unpack('=HH', data[:4]), (9, IFLA_IFNAME))
+        self.assertEqual(len(data), 12)
+        self.assertEqual(len(packRtAttr(IFA_LOCAL, '\0' * 4)), 8)
+
+    def testRoundTrip(self):
+        data = packRtAttr(IFLA_IFNAME, 'wwan0\0') + packRtAttr(IFA_LOCAL, socket.inet_aton('10.64.0.2')) + \
+               packRtAttr(7, '')
+        self.assertEqual(parseRtAttrs(data), {IFLA_IFNAME: 'wwan0\0', IFA_LOCAL: socket.inet_aton('10.64.0.2'), 7: ''})
+
+    def testTruncated(self):
+        data = packRtAttr(IFLA_IFNAME, 'wwan0\0')
+        self.assertEqual(parseRtAttrs(data + '\x08\x00'), {IFLA_IFNAME: 'wwan0\0'})
+        # Attribute length past the end of the message
+        self.assertEqual(parseRtAttrs(struct.pack('=HH', 64, IFA_LOCAL) + '\0' * 4), {})
+
+# wwan0 attributes with a fixed interface index
+class FakeAttrs(object):
+    ifName = 'wwan0'
+
+    def index(self):
+        return 5
+
+class ConfigureTest(unittest.TestCase):
+    def setUp(self):
+        self.netlink = ltemodem.RtNetlink(FakeAttrs())
+        self.batches = []
+        self.netlink.batch = lambda name, msgs: self.batches.append(msgs)
+
+    def testConfigure(self):
+        self.netlink.configure('10.64.0.2', 24, '10.64.0.1', [('10.64.0.9', 24)])
+        msgs = self.batches[0]
+        self.assertEqual([a[0] for a in msgs], [RTM_DELADDR, RTM_NEWADDR, RTM_NEWROUTE])
+
+        # Default route with its own metric, replace the previous wwan0 one, never fail on another uplink route
+        msgType,flags,payload = msgs[2]
+        self.assertEqual(flags, NLM_F_CREATE | NLM_F_REPLACE)
+        self.assertEqual(struct.unpack('=BBBB', payload[:4]), (socket.AF_INET, 0, 0, 0))
+        attrs = parseRtAttrs(payload[12:])
+        self.assertEqual(attrs[RTA_GATEWAY], socket.inet_aton('10.64.0.1'))
+        self.assertEqual(attrs[RTA_OIF], struct.pack('=i', 5))
+        self.assertEqual(attrs[RTA_PRIORITY], struct.pack('=I', ltemodem.lteRouteMetric))
+
+    def testNoRouter(self):
+        self.netlink.configure('10.64.0.2', 24, None)
+        self.assertEqual([a[0] for a in self.batches[0]], [RTM_NEWADDR])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+# Session state file tests, written to a temporary directory
+# Run from the repository root: python -m unittest discover -s tests
+
+import os, sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import ltemodem
+
+class StateFileTest(unittest.TestCase):
+    def setUp(self):
+        self.runDir = tempfile.mkdtemp()
+        self.path = os.path.join(self.runDir, 'ltemodem.state')
+        self.stateFile = ltemodem.StateFile(self.path)
+        self.savedFsync = os.fsync
+
+    def tearDown(self):
+        os.fsync = self.savedFsync
+        shutil.rmtree(self.runDir)
+
+    def contents(self):
+        with open(self.path) as f:
+            return f.read()
+
+    def testRoundTrip(self):
+        self.stateFile.load()
+        self.assertEqual(self.stateFile.get('lease'), None)
+        self.stateFile.update('lease', {'addr': '10.64.0.2'})
+        self.stateFile.update('rtt', 0.05)
+
+        # Restored by the next daemon instance
+        stateFile = ltemodem.StateFile(self.path)
+        stateFile.load()
+        self.assertEqual(stateFile.get('lease'), {'addr': '10.64.0.2'})
+        self.assertEqual(stateFile.get('rtt'), 0.05)
+        self.assertEqual(os.listdir(self.runDir), ['ltemodem.state'])
+
+    def testNoFlush(self):
+        self.stateFile.update('rtt', 0.05, False)
+        self.assertFalse(os.path.exists(self.path))
+        self.assertEqual(self.stateFile.get('rtt'), 0.05)
+
+    def testWriteFailed(self):
+        self.stateFile.update('rtt', 0.05)
+        before = self.contents()
+
+        def fsyncFailed(fd):
+            raise OSError(5, 'Input/output error')
+        os.fsync = fsyncFailed
+        self.stateFile.data['rtt'] = 0.07
+        self.assertEqual(self.stateFile.save(), False)
+        # Previous state kept intact
+        self.assertEqual(self.contents(), before)
+
+    def testCorrupt(self):
+        for data in ['{"rtt":0.0', '[1, 2]', '']:
+            with open(self.path, 'w') as f:
+                f.write(data)
+            self.stateFile.data = {'rtt': 0.05}
+            self.stateFile.load()
+            self.assertEqual(self.stateFile.data, {})
+
+    def testMissingDir(self):
+        stateFile = ltemodem.StateFile(os.path.join(self.runDir, 'nonexistent', 'ltemodem.state'))
+        stateFile.load()
+        self.assertEqual(stateFile.data, {})
+        self.assertEqual(stateFile.save(), False)
+
+if __name__ == '__main__':
+    unittest.main()
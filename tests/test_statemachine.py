@@ -0,0 +1,69 @@
+# Table driven lifecycle state machine tests, handlers return the result set by the test
+# Run from the repository root: python -m unittest discover -s tests
+
+import os, sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import ltemodem
+
+# State : (timeout in sec, retries, next state on success, next state on failure)
+testTable = {'A' : (None, 1, 'B', 'FAIL'),
+             'B' : (5.0, 0, 'A', 'FAIL'),
+             'FAIL' : (None, 0, 'A', 'A')}
+
+class StateMachineTest(unittest.TestCase):
+    def setUp(self):
+        self.results = {}       # State -> handler result
+        handlers = dict([(a, lambda sm, state=a: self.results.get(state)) for a in testTable])
+        self.sm = ltemodem.LteStateMachine(testTable, handlers, 'A')
+
+    def testDone(self):
+        self.results['A'] = True
+        self.assertEqual(self.sm.step(), True)
+        self.assertEqual(self.sm.state, 'B')
+        when,fromState,toState,spent,cause = self.sm.history[-1]
+        self.assertEqual((fromState, toState, cause), ('A', 'B', 'done'))
+        self.assertTrue('A' in self.sm.latency)
+
+    def testRetriesExhausted(self):
+        self.results['A'] = False
+        # First failure retried on the next cycle
+        self.assertEqual(self.sm.step(), False)
+        self.assertEqual(self.sm.state, 'A')
+        self.assertEqual(self.sm.retryCnt, 1)
+        self.assertEqual(self.sm.step(), True)
+        self.assertEqual(self.sm.state, 'FAIL')
+        self.assertEqual(self.sm.history[-1][4], 'failed after 2 attempt')
+        self.assertEqual(self.sm.retryCnt, 0)
+
+    def testTimeout(self):
+        self.sm.state = 'B'
+        self.assertEqual(self.sm.step(), False)
+        # Stayed longer than the state timeout on the monotonic clock
+        self.sm.enterTime -= 6.0
+        self.assertEqual(self.sm.step(), True)
+        self.assertEqual(self.sm.state, 'FAIL')
+        self.assertEqual(self.sm.history[-1][4], 'timeout 5.0 sec')
+
+    def testJump(self):
+        self.results['A'] = 'FAIL'
+        self.assertEqual(self.sm.step(), True)
+        self.assertEqual(self.sm.state, 'FAIL')
+        self.assertEqual(self.sm.history[-1][4], 'jump')
+
+    def testLinkLostPassed(self):
+        seen = []
+        self.sm.handlers['A'] = lambda sm: seen.append(sm.linkLost)
+        self.sm.step('wwan0 carrier lost')
+        self.sm.step()
+        self.assertEqual(seen, ['wwan0 carrier lost', None])
+
+    def testEvent(self):
+        self.sm.event('DHCP lease 10.64.0.2 renewed')
+        when,fromState,toState,spent,cause = self.sm.history[-1]
+        self.assertEqual((fromState, toState, cause), ('A', 'A', 'DHCP lease 10.64.0.2 renewed'))
+        self.assertEqual(self.sm.state, 'A')
+
+if __name__ == '__main__':
+    unittest.main()
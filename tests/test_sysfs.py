@@ -0,0 +1,114 @@
+# sysfs attribute layer and raw IP step tests, attributes kept as plain files in a temporary directory
+# Run from the repository root: python -m unittest discover -s tests
+
+import os, sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import ltemodem
+from ltemodem import IFF_UP, ST_SET_RAW_IP
+
+# wwan0 attributes under a temporary directory instead of /sys/class/net/wwan0
+class TempAttrs(ltemodem.SysfsAttrs):
+    def __init__(self, root):
+        ltemodem.SysfsAttrs.__init__(self, 'wwan0')
+        self.root = root
+        self.ifUp = False       # qmi_wwan refuse raw_ip write while wwan0 UP
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    def present(self):
+        return True
+
+    def write(self, name, value, verify=True):
+        if name == 'qmi/raw_ip' and self.ifUp == True:
+            return 'write qmi/raw_ip FAILED, Device or resource busy'
+        return ltemodem.SysfsAttrs.write(self, name, value, verify)
+
+class SysfsAttrsTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.root, 'qmi'))
+        self.setAttr('qmi/raw_ip', 'N\n')
+        self.attrs = TempAttrs(self.root)
+
+    def tearDown(self):
+        self.attrs.close()
+        shutil.rmtree(self.root)
+
+    def setAttr(self, name, value):
+        with open(os.path.join(self.root, name), 'w') as f:
+            f.write(value)
+
+    def testRead(self):
+        self.assertEqual(self.attrs.read('qmi/raw_ip'), 'N')
+        self.assertEqual(self.attrs.read('carrier'), None)
+        # Descriptor kept open, the next read see the new value
+        self.setAttr('qmi/raw_ip', 'Y\n')
+        self.assertEqual(self.attrs.read('qmi/raw_ip'), 'Y')
+        self.assertEqual(self.attrs.fds.keys(), ['qmi/raw_ip'])
+
+    def testWriteVerify(self):
+        self.assertEqual(self.attrs.write('qmi/raw_ip', 'Y'), None)
+        self.assertEqual(self.attrs.read('qmi/raw_ip'), 'Y')
+        self.assertTrue(self.attrs.write('qmi/missing/raw_ip', 'Y').startswith('write qmi/missing/raw_ip FAILED'))
+
+    def testIndex(self):
+        self.assertEqual(self.attrs.index(), None)
+        self.setAttr('ifindex', '5\n')
+        self.assertEqual(self.attrs.index(), 5)
+
+class RawIpStepTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.root, 'qmi'))
+        with open(os.path.join(self.root, 'qmi/raw_ip'), 'w') as f:
+            f.write('N\n')
+        self.attrs = TempAttrs(self.root)
+        self.linkDownCnt = 0
+        self.saved = (ltemodem.sysfsAttrs, ltemodem.ifaceFlags, ltemodem.linkDown, ltemodem.connectStart)
+        ltemodem.sysfsAttrs = self.attrs
+        ltemodem.ifaceFlags = lambda ifName: IFF_UP * self.attrs.ifUp
+        ltemodem.linkDown = self.linkDown
+        self.sm = ltemodem.LteStateMachine(ltemodem.lteStateTable, ltemodem.qmicliSteps, ST_SET_RAW_IP)
+
+    def tearDown(self):
+        ltemodem.sysfsAttrs,ltemodem.ifaceFlags,ltemodem.linkDown,ltemodem.connectStart = self.saved
+        self.attrs.close()
+        shutil.rmtree(self.root)
+
+    def linkDown(self):
+        self.linkDownCnt += 1
+        self.attrs.ifUp = False
+        return True
+
+    def testLinkAlreadyDown(self):
+        self.assertEqual(ltemodem.stateQmicliRawIp(self.sm), True)
+        self.assertEqual(self.attrs.read('qmi/raw_ip'), 'Y')
+        self.assertEqual(self.linkDownCnt, 0)
+
+    def testLinkUpTakenDownFirst(self):
+        # wwan0 left UP by the previous session
+        self.attrs.ifUp = True
+        self.assertEqual(ltemodem.stateQmicliRawIp(self.sm), True)
+        self.assertEqual(self.attrs.read('qmi/raw_ip'), 'Y')
+        self.assertEqual(self.linkDownCnt, 1)
+
+    def testLinkDownFailed(self):
+        self.attrs.ifUp = True
+        ltemodem.linkDown = lambda: False
+        self.assertEqual(ltemodem.stateQmicliRawIp(self.sm), False)
+        self.assertEqual(self.attrs.read('qmi/raw_ip'), 'N')
+
+    def testAlreadyEnabled(self):
+        self.attrs.ifUp = True
+        with open(os.path.join(self.root, 'qmi/raw_ip'), 'w') as f:
+            f.write('Y\n')
+        self.assertEqual(ltemodem.stateQmicliRawIp(self.sm), True)
+        self.assertEqual(self.linkDownCnt, 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+# Passive health detection tests, wwan0 traffic counters from fake attributes
+# Run from the repository root: python -m unittest discover -s tests
+
+import os, sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import ltemodem
+from ltemodem import ST_MONITOR
+
+# wwan0 up with carrier, statistics counters set by the test
+class FakeAttrs(object):
+    ifName = 'wwan0'
+
+    def __init__(self):
+        self.stats = {'rx_packets': 100, 'tx_packets': 100, 'rx_errors': 0}
+
+    def linkState(self):
+        return 'up','1'
+
+    def read(self, name):
+        if not name.startswith('statistics/') or name[11:] not in self.stats:
+            return None
+        return str(self.stats[name[11:]])
+
+# ICMP prober answering every target, each probe add the echo replies to the RX counter
+class FakeProber(object):
+    def __init__(self, attrs):
+        self.attrs = attrs
+        self.probeCnt = 0
+
+    def probeMany(self, targets, timeOut):
+        self.probeCnt += 1
+        self.attrs.stats['rx_packets'] += len(targets)
+        return dict.fromkeys(targets, 0.05)
+
+    def lossPct(self):
+        return 0.0
+
+class RxGrowingTest(unittest.TestCase):
+    def setUp(self):
+        self.attrs = FakeAttrs()
+        self.counters = ltemodem.TrafficCounters(self.attrs)
+
+    def testGrowing(self):
+        # Nothing to compare with on the first read
+        self.assertEqual(self.counters.rxGrowing(), False)
+        self.attrs.stats['rx_packets'] += 5
+        self.assertEqual(self.counters.rxGrowing(), True)
+        self.assertEqual(self.counters.rxGrowing(), False)
+
+    def testRxErrors(self):
+        self.counters.rxGrowing()
+        self.attrs.stats['rx_packets'] += 5
+        self.attrs.stats['rx_errors'] += 1
+        self.assertEqual(self.counters.rxGrowing(), False)
+
+    def testCountersMissing(self):
+        self.counters.rxGrowing()
+        del self.attrs.stats['rx_errors']
+        self.attrs.stats['rx_packets'] += 5
+        self.assertEqual(self.counters.rxGrowing(), False)
+        self.assertEqual(self.counters.last, None)
+
+class ProbeSkipTest(unittest.TestCase):
+    def setUp(self):
+        self.names = ['sysfsAttrs', 'icmpProber', 'trafficCounters', 'probeCadence', 'stateFile', 'dhcpClient',
+                      'recoveryLadder', 'pingTargets', 'probeQuorum', 'pingAttempt', 'lteModemStat']
+        self.saved = dict([(a, getattr(ltemodem, a)) for a in self.names])
+        self.attrs = FakeAttrs()
+        self.prober = FakeProber(self.attrs)
+        ltemodem.sysfsAttrs = self.attrs
+        ltemodem.icmpProber = self.prober
+        ltemodem.trafficCounters = ltemodem.TrafficCounters(self.attrs)
+        ltemodem.probeCadence = ltemodem.ProbeCadence(1.0, 30.0, 1.5, 2.0)
+        ltemodem.stateFile = ltemodem.StateFile('/nonexistent/ltemodem.state')
+        ltemodem.dhcpClient = ltemodem.DhcpClient(self.attrs)
+        ltemodem.recoveryLadder = ltemodem.RecoveryLadder([])
+        ltemodem.pingTargets = ['8.8.8.8', '1.1.1.1', '9.9.9.9']
+        ltemodem.probeQuorum = 2
+        ltemodem.pingAttempt = 0
+        self.sm = ltemodem.LteStateMachine(ltemodem.lteStateTable, ltemodem.qmicliSteps, ST_MONITOR)
+
+    def tearDown(self):
+        for name in self.names:
+            setattr(ltemodem, name, self.saved[name])
+
+    # One monitoring cycle, probe due right away
+    def cycle(self):
+        ltemodem.probeCadence.reset()
+        self.sm.linkLost = None
+        return ltemodem.stateMonitor(self.sm)
+
+    def testSkippedWhileReceiving(self):
+        self.cycle()
+        self.assertEqual(self.prober.probeCnt, 1)
+        self.attrs.stats['rx_packets'] += 10
+        self.cycle()
+        self.assertEqual(self.prober.probeCnt, 1)
+        self.assertEqual(ltemodem.trafficCounters.skipCnt, 1)
+        self.assertEqual(ltemodem.lteModemStat, True)
+        self.assertEqual(ltemodem.probeCadence.interval, 1.5)
+
+    def testOwnEchoRepliesNotCounted(self):
+        # Echo replies of the previous probe only, the network still probed
+        self.cycle()
+        self.cycle()
+        self.assertEqual(self.prober.probeCnt, 2)
+        self.assertEqual(ltemodem.trafficCounters.skipCnt, 0)
+
+    def testProbedWhileRecovering(self):
+        # Only a real probe reply prove the recovery worked
+        self.cycle()
+        ltemodem.recoveryLadder = ltemodem.RecoveryLadder([('dhcp-renew', lambda ladder: True, ST_MONITOR)])
+        # Outage in progress, first rung tried
+        ltemodem.recoveryLadder.rung = 1
+        ltemodem.recoveryLadder.failTime = ltemodem.monotonicTime()
+        self.attrs.stats['rx_packets'] += 10
+        self.cycle()
+        self.assertEqual(self.prober.probeCnt, 2)
+        self.assertEqual(ltemodem.trafficCounters.skipCnt, 0)
+        self.assertEqual(ltemodem.recoveryLadder.failTime, None)
+
+if __name__ == '__main__':
+    unittest.main()
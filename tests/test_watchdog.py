@@ -0,0 +1,66 @@
+# Per command deadline watchdog tests, real short lived commands in their own process group
+# Run from the repository root: python -m unittest discover -s tests
+
+import os, sys
+import time
+import thread
+import subprocess
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import ltemodem
+
+# Process state from /proc, None once reaped
+def procState(pid):
+    try:
+        with open('/proc/%d/stat' % pid) as f:
+            return f.read().rsplit(')', 1)[1].split()[0]
+    except IOError:
+        return None
+
+class CommandWatchdogTest(unittest.TestCase):
+    def setUp(self):
+        self.watchdog = ltemodem.CommandWatchdog()
+        thread.start_new_thread(self.watchdog.run, ("[cmdWatchdog]",))
+
+    def launch(self, cmd, timeout):
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, preexec_fn=os.setsid)
+        proc.cmdArgs = cmd
+        self.watchdog.register(proc, timeout)
+        return proc
+
+    def testKillAfterDeadline(self):
+        startTime = time.time()
+        proc = self.launch(['sleep', '10'], 0.2)
+        self.assertEqual(proc.wait(), -9)
+        self.assertTrue(time.time() - startTime < 2.0)
+        self.assertEqual(self.watchdog.unregister(proc), True)
+        self.assertEqual(self.watchdog.killCnt, 1)
+
+    def testExitBeforeDeadline(self):
+        proc = self.launch(['true'], 5.0)
+        self.assertEqual(proc.wait(), 0)
+        self.assertEqual(self.watchdog.unregister(proc), False)
+        self.assertEqual(self.watchdog.killCnt, 0)
+
+    def testNearestDeadlineFirst(self):
+        # The later command registered first must not delay the earlier deadline
+        slow = self.launch(['sleep', '10'], 5.0)
+        fast = self.launch(['sleep', '10'], 0.2)
+        self.assertEqual(fast.wait(), -9)
+        self.assertEqual(slow.poll(), None)
+        self.assertEqual(self.watchdog.unregister(slow), False)
+        slow.kill()
+        slow.wait()
+
+    def testProcessGroupKilled(self):
+        # Child of the command, e.g. qmicli started by qmi-network, killed together with it
+        proc = self.launch(['sh', '-c', 'sleep 10 & echo $!; wait'], 0.2)
+        child = int(proc.stdout.readline())
+        proc.wait()
+        time.sleep(0.1)
+        self.assertTrue(procState(child) in (None, 'Z'))
+        proc.stdout.close()
+
+if __name__ == '__main__':
+    unittest.main()